@@ -0,0 +1,165 @@
+import sys
+
+from argparse import ArgumentParser, Namespace
+
+from benchmarks import engine
+from benchmarks.results import Results
+
+
+def run(arguments: Namespace) -> int:
+    results: Results = Results()
+    engine.run(results=results, repeat=arguments.repeat, lengths=arguments.lengths)
+    if not arguments.skip_ui:
+        # Imported lazily, tkinter is not needed for the engine benchmarks
+        from benchmarks import ui
+
+        ui.run(results=results)
+
+    if arguments.output is not None:
+        results.save(path=arguments.output)
+    if arguments.baseline is not None:
+        return compare(baseline=Results.load(path=arguments.baseline), current=results, threshold=arguments.threshold)
+    return 0
+
+
+def load(arguments: Namespace) -> int:
+    # Imported lazily, the load test is not part of the regular benchmark run
+    from benchmarks import server
+
+    results: Results = Results()
+    server.run(
+        results=results, connections=arguments.connections, requests=arguments.requests, depth=arguments.depth,
+        path=arguments.unix, host=arguments.host, port=arguments.port,
+    )
+    if arguments.output is not None:
+        results.save(path=arguments.output)
+    return 0
+
+
+def startup(arguments: Namespace) -> int:
+    # Imported lazily, like the load test it is not part of the regular benchmark run
+    from benchmarks import startup
+
+    results: Results = Results()
+    over_budget: list[startup.OverBudget] = startup.run(results=results, skip_ui=arguments.skip_ui)
+    for measurement in over_budget:
+        print(f'OVER BUDGET {measurement.name}: {measurement.value:.2f} > {measurement.budget:.2f}')
+    if arguments.output is not None:
+        results.save(path=arguments.output)
+    return 1 if over_budget else 0
+
+
+def replay(arguments: Namespace) -> int:
+    # Imported lazily, like the load test it is not part of the regular benchmark run
+    from benchmarks import replay
+
+    if arguments.synthesize is not None:
+        with open(arguments.trace, 'wb') as file:
+            replay.synthesize(file=file, calculations=arguments.synthesize)
+
+    results: Results = Results()
+    with open(arguments.trace, 'rb') as file:
+        report = replay.run(results=results, file=file, speed=arguments.speed)
+    for mismatch in report.mismatches:
+        print(f'MISMATCH at event {mismatch.event}, {mismatch.expression}: recorded {mismatch.recorded}, replayed {mismatch.replayed}')
+    if arguments.output is not None:
+        results.save(path=arguments.output)
+    if arguments.baseline is not None and compare(
+        baseline=Results.load(path=arguments.baseline), current=results, threshold=arguments.threshold
+    ):
+        return 1
+    return 1 if report.mismatches else 0
+
+
+def columns(arguments: Namespace) -> int:
+    # Imported lazily, it needs NumPy and several GB of disk
+    from benchmarks import columns
+
+    results: Results = Results()
+    columns.run(results=results, size_gb=arguments.size_gb, directory=arguments.directory)
+    if arguments.output is not None:
+        results.save(path=arguments.output)
+    return 0
+
+
+def compare(baseline: Results, current: Results, threshold: float) -> int:
+    regressions = current.regressions(baseline=baseline, threshold=threshold)
+    for regression in regressions:
+        print(
+            f'REGRESSION {regression.name}: {regression.baseline.value:.2f} -> {regression.current.value:.2f} '
+            f'{regression.current.unit} ({regression.change:+.0%} worse)'
+        )
+    if not regressions:
+        print(f'No regressions beyond {threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def build_argument_parser() -> ArgumentParser:
+    parser: ArgumentParser = ArgumentParser(prog='python -m benchmarks', description='Calculator engine and UI benchmarks')
+    subparsers = parser.add_subparsers(title='commands', required=True)
+
+    run_parser: ArgumentParser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-o', '--output', help='store the results as a JSON baseline')
+    run_parser.add_argument('--baseline', help='compare the results against this JSON baseline')
+    run_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged as a regression (default: 0.1)')
+    run_parser.add_argument('--repeat', type=int, default=3, help='repetitions per measurement, the best one is kept')
+    run_parser.add_argument('--lengths', type=int, nargs='+', default=engine.EXPRESSION_LENGTHS, help='expression lengths in tokens')
+    run_parser.add_argument('--skip-ui', action='store_true', help='skip the Tk scenarios')
+    run_parser.set_defaults(handler=run)
+
+    load_parser: ArgumentParser = subparsers.add_parser(
+        'load', help='load test the calculator server, started on a temporary socket without an address'
+    )
+    load_parser.add_argument('-o', '--output', help='store the results as JSON')
+    load_parser.add_argument('--unix', metavar='PATH', help='Unix socket of a running server')
+    load_parser.add_argument('--host', default='127.0.0.1', help='TCP host of a running server (default: 127.0.0.1)')
+    load_parser.add_argument('--port', type=int, help='TCP port of a running server')
+    load_parser.add_argument('--connections', type=int, default=16, help='concurrent connections (default: 16)')
+    load_parser.add_argument('--requests', type=int, default=20_000, help='requests over all connections (default: 20000)')
+    load_parser.add_argument('--depth', type=int, default=32, help='requests in flight per connection (default: 32)')
+    load_parser.set_defaults(handler=load)
+
+    startup_parser: ArgumentParser = subparsers.add_parser(
+        'startup', help='measure import times and time to first frame against their budgets'
+    )
+    startup_parser.add_argument('-o', '--output', help='store the results as JSON')
+    startup_parser.add_argument('--skip-ui', action='store_true', help='skip the time to first frame')
+    startup_parser.set_defaults(handler=startup)
+
+    replay_parser: ArgumentParser = subparsers.add_parser('replay', help='replay a recorded keystroke trace and check its results')
+    replay_parser.add_argument('trace', help='trace recorded with python main.py --record-trace')
+    replay_parser.add_argument('-o', '--output', help='store the results as JSON')
+    replay_parser.add_argument('--baseline', help='compare the results against this JSON baseline')
+    replay_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged as a regression (default: 0.1)')
+    replay_parser.add_argument(
+        '--speed', type=float, help='replay at this multiple of the recorded pacing, as fast as possible when omitted'
+    )
+    replay_parser.add_argument(
+        '--synthesize', type=int, metavar='CALCULATIONS', help='first write a synthetic trace of this many calculations to the trace file'
+    )
+    replay_parser.set_defaults(handler=replay)
+
+    columns_parser: ArgumentParser = subparsers.add_parser(
+        'columns', help='measure the columnar evaluation of a synthetic data file against a per-row loop'
+    )
+    columns_parser.add_argument('-o', '--output', help='store the results as JSON')
+    columns_parser.add_argument('--size-gb', type=float, default=2.0, help='size of the synthetic float64 columns (default: 2)')
+    columns_parser.add_argument('--directory', help='where the synthetic files are written, the temporary directory when omitted')
+    columns_parser.set_defaults(handler=columns)
+
+    compare_parser: ArgumentParser = subparsers.add_parser('compare', help='compare two stored results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown flagged as a regression (default: 0.1)')
+    compare_parser.set_defaults(
+        handler=lambda arguments: compare(
+            baseline=Results.load(path=arguments.baseline), current=Results.load(path=arguments.current), threshold=arguments.threshold
+        )
+    )
+
+    return parser
+
+
+if __name__ == '__main__':
+    arguments: Namespace = build_argument_parser().parse_args()
+    sys.exit(arguments.handler(arguments))
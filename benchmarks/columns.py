@@ -0,0 +1,114 @@
+"""Throughput of the columnar evaluation of data files, against a per-row loop over the engine.
+
+Synthetic columns of a few GB in total are written as raw float64 files, and
+a smaller CSV file with the same rows. `python main.py columns` is run on each
+in a subprocess, whose peak memory shows it does not grow with the file size.
+The per-row loop evaluates the same expression row by row with the engine, on
+a sample of the rows as it would take hours over the whole file.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Optional
+
+import numpy as np
+
+from src.services.engine import evaluate
+from src.services.tokens import tokenize
+
+from benchmarks.results import Measurement, Results
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS: tuple[str, ...] = ('price', 'qty', 'tax')
+EXPRESSION: str = 'price*qty*(1+tax)-√(price)/ln(qty+2)'
+DEFAULT_SIZE_GB: float = 2.0
+CSV_ROWS: int = 2_000_000
+PER_ROW_ROWS: int = 200_000
+GENERATION_CHUNK_ROWS: int = 1 << 20
+
+
+def columns_chunk(rows: int, seed: int) -> dict[str, np.ndarray]:
+    generator: np.random.Generator = np.random.default_rng(seed=seed)
+    return {
+        'price': generator.uniform(0.5, 1000.0, size=rows).round(2),
+        'qty': generator.integers(1, 100, size=rows).astype(np.float64),
+        'tax': generator.choice([0.0, 0.07, 0.2], size=rows),
+    }
+
+
+def generate_binary(directory: str, rows: int) -> dict[str, str]:
+    paths: dict[str, str] = {column: os.path.join(directory, f'{column}.f64') for column in COLUMNS}
+    files = {column: open(path, 'wb') for column, path in paths.items()}
+    try:
+        for seed, start in enumerate(range(0, rows, GENERATION_CHUNK_ROWS)):
+            for column, values in columns_chunk(rows=min(GENERATION_CHUNK_ROWS, rows - start), seed=seed).items():
+                files[column].write(values.astype('<f8').tobytes())
+    finally:
+        for file in files.values():
+            file.close()
+    return paths
+
+
+def generate_csv(path: str, rows: int) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(','.join(COLUMNS) + '\n')
+        for seed, start in enumerate(range(0, rows, GENERATION_CHUNK_ROWS)):
+            chunk: dict[str, np.ndarray] = columns_chunk(rows=min(GENERATION_CHUNK_ROWS, rows - start), seed=seed)
+            np.savetxt(file, np.column_stack([chunk[column] for column in COLUMNS]), fmt='%.2f', delimiter=',')
+
+
+def evaluate_columns(arguments: list[str]) -> float:
+    """Seconds `python main.py columns` takes with `arguments`, its results discarded."""
+    started: float = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', 'columns', EXPRESSION, *arguments, '--binary', '-o', os.devnull], cwd=ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def per_row(paths: dict[str, str], rows: int) -> float:
+    """Seconds a Python loop evaluating the expression row by row with the engine takes over `rows` rows."""
+    columns: dict[str, list[float]] = {column: np.fromfile(path, dtype='<f8', count=rows).tolist() for column, path in paths.items()}
+    tokens: tuple[str, ...] = tuple(tokenize(text=EXPRESSION, variables=COLUMNS))
+    started: float = time.perf_counter()
+    for row in zip(*columns.values()):
+        try:
+            evaluate(tokens=tokens, variables=dict(zip(columns, row)))
+        except (ArithmeticError, ValueError):
+            pass
+    return time.perf_counter() - started
+
+
+def run(results: Results, size_gb: float = DEFAULT_SIZE_GB, directory: Optional[str] = None) -> None:
+    rows: int = int(size_gb * 2 ** 30) // (8 * len(COLUMNS))
+    with tempfile.TemporaryDirectory(dir=directory) as temporary:
+        paths: dict[str, str] = generate_binary(directory=temporary, rows=rows)
+        csv_path: str = os.path.join(temporary, 'columns.csv')
+        generate_csv(path=csv_path, rows=min(rows, CSV_ROWS))
+
+        seconds: float = evaluate_columns(
+            arguments=[argument for column, path in paths.items() for argument in ('--column', f'{column}={path}')]
+        )
+        results.add(
+            f'columns.binary.size={size_gb:g}GB.rows_per_second', Measurement(value=rows / seconds, unit='rows/s', higher_is_better=True)
+        )
+        results.add(
+            f'columns.binary.size={size_gb:g}GB.throughput',
+            Measurement(value=size_gb * 2 ** 30 / seconds / 2 ** 20, unit='MB/s', higher_is_better=True),
+        )
+
+        seconds = evaluate_columns(arguments=['--csv', csv_path])
+        results.add('columns.csv.rows_per_second', Measurement(value=min(rows, CSV_ROWS) / seconds, unit='rows/s', higher_is_better=True))
+        results.add(
+            'columns.csv.throughput', Measurement(value=os.path.getsize(csv_path) / seconds / 2 ** 20, unit='MB/s', higher_is_better=True)
+        )
+        # The largest resident set of both runs, in KB on Linux
+        results.add('columns.peak_memory', Measurement(value=resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, unit='MB'))
+
+        sample: int = min(rows, PER_ROW_ROWS)
+        results.add(
+            'columns.per_row_engine.rows_per_second',
+            Measurement(value=sample / per_row(paths=paths, rows=sample), unit='rows/s', higher_is_better=True),
+        )
@@ -0,0 +1,430 @@
+import gc
+import logging
+import random
+import time
+import tracemalloc
+
+from typing import Callable, Optional
+
+from src.services.batch_service import available_cores
+from src.services.bytecode import Program, compile_postfix
+from src.services.bytecode import run as run_program
+from src.services.calculator_service import CalculatorService, Token
+from src.services.engine import infix_to_postfix
+from src.services.parallel import evaluate_parallel
+from src.services.session import SessionPool
+from src.services.tokens import tokenize
+
+from benchmarks.results import Measurement, Results
+
+EXPRESSION_LENGTHS: list[int] = [10, 100, 1_000, 10_000, 100_000]
+# Concurrent sessions and the expression each one types in the session memory benchmark
+SESSIONS: int = 10_000
+SESSION_EXPRESSION: str = '12+3*(4,5-6)'
+# Length of the expression and number of edits made to it in the undo history benchmark
+HISTORY_LENGTH: int = 10_000
+HISTORY_STEPS: int = 5_000
+# Calculations in the log opened and searched by the calculation log benchmark
+LOG_RECORDS: int = 100_000
+# Independent terms of the expression evaluated across processes
+PARALLEL_TERMS: int = 10_000
+# Terms of the integer and rational expression evaluated exactly and with floats
+EXACT_TERMS: int = 1_000
+# Expressions plotted, and frames of the pan across their plot, in the plotting benchmark
+PLOT_EXPRESSIONS: tuple[str, ...] = ('tan(x)', 'sin(x*7)*x', '1/(x-3)+√(x)')
+PLOT_PAN_FRAMES: int = 240
+# Pixels panned per frame, a fast drag
+PLOT_PAN_PIXELS: int = 8
+
+# Backspace is not a token, it is represented by None in the keystroke streams
+BACKSPACE: Optional[Token] = None
+
+DIGITS: list[Token] = [token for token in Token if token.value.isdigit()]
+FUNCTIONS: list[Token] = [Token.sin, Token.cos, Token.tan, Token.sqrt, Token.log, Token.ln, Token.exp]
+OPERATORS: list[Token] = [Token.plus, Token.minus, Token.multiply, Token.divide, Token.power]
+
+
+class KeystrokeGenerator:
+    """Deterministic keystrokes typing a well-formed expression.
+
+    Covers digits, decimals, negate, nested parenthesis, π, every scientific function and
+    every operator, with backspaces that are immediately retyped. Operands are kept small
+    and positive so the expression does not stop evaluating after a domain error. With
+    `variables`, half of the π become the variable x.
+    """
+
+    def __init__(self, seed: int, max_depth: int = 4, variables: bool = False) -> None:
+        self.random: random.Random = random.Random(seed)
+        self.max_depth: int = max_depth
+        self.variables: bool = variables
+        self.keys: list[Optional[Token]] = []
+
+    def press(self, key: Token) -> None:
+        self.keys.append(key)
+        # Backspace and retype some of the digits
+        if key in DIGITS and self.random.random() < 0.05:
+            self.keys += [BACKSPACE, key]
+
+    def number(self) -> None:
+        self.press(self.random.choice(DIGITS[1:]))
+        for _ in range(self.random.randint(0, 2)):
+            self.press(self.random.choice(DIGITS))
+        if self.random.random() < 0.2:
+            self.press(Token.decimal)
+            self.press(self.random.choice(DIGITS))
+
+    def term(self, depth: int) -> None:
+        choice: float = self.random.random()
+        if choice < 0.15 and depth < self.max_depth:
+            self.press(Token.parenthesis)
+            self.expression(depth=depth + 1, terms=self.random.randint(2, 4))
+            self.press(Token.parenthesis)
+        elif choice < 0.25:
+            function: Token = self.random.choice(FUNCTIONS)
+            self.press(function)
+            if function == Token.exp:
+                self.press(self.random.choice(DIGITS))
+            else:
+                self.number()
+            self.press(Token.parenthesis)
+        elif choice < 0.3:
+            self.press(Token.variable if self.variables and self.random.random() < 0.5 else Token.pi)
+        elif choice < 0.4:
+            self.number()
+            self.press(Token.negate)
+            self.press(Token.parenthesis)
+        else:
+            self.number()
+
+    def expression(self, depth: int, terms: int) -> None:
+        self.term(depth=depth)
+        for _ in range(terms - 1):
+            operator: Token = self.random.choice(OPERATORS)
+            self.press(operator)
+            if operator == Token.power:
+                self.press(Token.two)
+            elif operator == Token.divide:
+                # A plain number never divides by zero, unlike ln(1) or (5-5)
+                self.number()
+            else:
+                self.term(depth=depth)
+
+
+def keystroke_stream(length: int, seed: int = 0, variables: bool = False) -> list[Optional[Token]]:
+    """Deterministic keystrokes of a complete expression, a few keys longer than `length`."""
+    generator: KeystrokeGenerator = KeystrokeGenerator(seed=seed, variables=variables)
+    generator.expression(depth=0, terms=1)
+    while len(generator.keys) < length:
+        generator.press(Token.plus)
+        generator.expression(depth=0, terms=4)
+    return generator.keys
+
+
+def press(calculator: CalculatorService, key: Optional[Token]) -> None:
+    if key is BACKSPACE:
+        calculator.backspace_expression()
+    else:
+        calculator.send_token(token=key)
+
+
+def type_stream(calculator: CalculatorService, stream: list[Optional[Token]]) -> list[float]:
+    """Press every key followed by the live preview, as the buttons do, returning each latency."""
+    latencies: list[float] = []
+    for key in stream:
+        started: float = time.perf_counter()
+        press(calculator=calculator, key=key)
+        calculator.preview_result()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def best_of(repeat: int, function: Callable[[], float]) -> float:
+    return min(function() for _ in range(repeat))
+
+
+def benchmark_keystrokes(results: Results, length: int, repeat: int) -> None:
+    runs: list[list[float]] = []
+    for _ in range(repeat):
+        runs.append(type_stream(calculator=CalculatorService(), stream=keystroke_stream(length=length)))
+    latencies: list[float] = min(runs, key=sum)
+    results.add(f'keystroke.length={length}.mean', Measurement(value=sum(latencies) / len(latencies) * 1e6, unit='us'))
+    results.add(f'keystroke.length={length}.p50', Measurement(value=percentile(latencies, q=0.5) * 1e6, unit='us'))
+    results.add(f'keystroke.length={length}.p99', Measurement(value=percentile(latencies, q=0.99) * 1e6, unit='us'))
+
+
+def benchmark_evaluation(results: Results, length: int, repeat: int) -> None:
+    calculator: CalculatorService = CalculatorService()
+    for key in keystroke_stream(length=length):
+        press(calculator=calculator, key=key)
+    iterations: int = max(1, 10_000 // length)
+
+    def cold() -> float:
+        started: float = time.perf_counter()
+        for _ in range(iterations):
+            calculator.compiled_expressions.clear()
+            calculator.evalutate_expression()
+        return (time.perf_counter() - started) / iterations
+
+    def warm() -> float:
+        started: float = time.perf_counter()
+        for _ in range(iterations):
+            calculator.evalutate_expression()
+        return (time.perf_counter() - started) / iterations
+
+    results.add(
+        f'evaluate.length={length}.cold', Measurement(value=1 / best_of(repeat=repeat, function=cold), unit='eval/s', higher_is_better=True)
+    )
+    results.add(
+        f'evaluate.length={length}.cached',
+        Measurement(value=1 / best_of(repeat=repeat, function=warm), unit='eval/s', higher_is_better=True),
+    )
+
+
+def benchmark_memory(results: Results, length: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        calculator: CalculatorService = CalculatorService()
+        type_stream(calculator=calculator, stream=keystroke_stream(length=length))
+        calculator.evalutate_expression()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    results.add(f'memory.length={length}.peak', Measurement(value=peak / 1024, unit='KiB'))
+
+
+def benchmark_history(results: Results) -> None:
+    """Memory per edit to a long expression, history and expression growth included, and latency of undoing and redoing the edits."""
+    calculator: CalculatorService = CalculatorService()
+    for key in keystroke_stream(length=HISTORY_LENGTH):
+        press(calculator=calculator, key=key)
+    calculator.history.undo_steps.clear()
+    stream: list[Optional[Token]] = keystroke_stream(length=HISTORY_STEPS, seed=1)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for key in stream[:HISTORY_STEPS]:
+            press(calculator=calculator, key=key)
+        memory, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    steps: int = len(calculator.history.undo_steps)
+    results.add(f'history.length={HISTORY_LENGTH}.step_memory', Measurement(value=memory / steps, unit='B'))
+
+    latencies: list[float] = []
+    for restore in [calculator.undo] * steps + [calculator.redo] * steps:
+        started: float = time.perf_counter()
+        restore()
+        latencies.append(time.perf_counter() - started)
+    results.add(f'history.length={HISTORY_LENGTH}.restore.p50', Measurement(value=percentile(latencies, q=0.5) * 1e6, unit='us'))
+    results.add(f'history.length={HISTORY_LENGTH}.restore.p99', Measurement(value=percentile(latencies, q=0.99) * 1e6, unit='us'))
+
+
+def benchmark_calculation_log(results: Results, repeat: int) -> None:
+    """Open a log of many calculations, read the recent ones, search it and warm a calculator from it."""
+    import os
+    import tempfile
+
+    from src.services.calculation_log import CalculationLog
+
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, 'history')
+        with CalculationLog(path=path) as log:
+            for i in range(LOG_RECORDS):
+                log.append(
+                    expression=f'{i % 997}*sin({i % 90})+{i % 13}^2', result=i * 0.5, scientific_mode=bool(i % 2), timestamp=float(i)
+                )
+
+        def opening() -> float:
+            started: float = time.perf_counter()
+            CalculationLog(path=path).close()
+            return time.perf_counter() - started
+
+        def searching(log: CalculationLog, query: str) -> float:
+            started: float = time.perf_counter()
+            log.search(query=query)
+            return time.perf_counter() - started
+
+        results.add(f'log.records={LOG_RECORDS}.open', Measurement(value=best_of(repeat=repeat, function=opening) * 1e3, unit='ms'))
+        with CalculationLog(path=path) as log:
+            started: float = time.perf_counter()
+            log.recent(count=20)
+            results.add(f'log.records={LOG_RECORDS}.recent', Measurement(value=(time.perf_counter() - started) * 1e6, unit='us'))
+            results.add(f'log.records={LOG_RECORDS}.search.first', Measurement(value=searching(log=log, query='*sin(45)') * 1e3, unit='ms'))
+            results.add(
+                f'log.records={LOG_RECORDS}.search',
+                Measurement(value=best_of(repeat=repeat, function=lambda: searching(log=log, query='996*sin(')) * 1e6, unit='us'),
+            )
+            started = time.perf_counter()
+            CalculatorService().warm_up(expressions=log.frequent_expressions(count=32))
+            results.add(f'log.records={LOG_RECORDS}.warm_up', Measurement(value=(time.perf_counter() - started) * 1e3, unit='ms'))
+
+
+def benchmark_plotting(results: Results) -> None:
+    """Sample a plot, then pan across it frame by frame, each frame sampling what it exposes and computing the curve to draw."""
+    from src.services.plotting import Sampler, View
+
+    for text in PLOT_EXPRESSIONS:
+        sampler: Sampler = Sampler(program=compile_postfix(postfix=infix_to_postfix(infix=tuple(tokenize(text=text)))))
+        view: View = View(x_min=-360.0, x_max=360.0, y_min=-10.0, y_max=10.0, width=800, height=500)
+        started: float = time.perf_counter()
+        for _ in sampler.sample(view=view):
+            pass
+        sampler.polylines(view=view)
+        results.add(f'plot.{text}.first_frame', Measurement(value=(time.perf_counter() - started) * 1e3, unit='ms'))
+
+        latencies: list[float] = []
+        for _ in range(PLOT_PAN_FRAMES):
+            view = view.panned(dx=PLOT_PAN_PIXELS * (view.x_max - view.x_min) / view.width, dy=0.0)
+            started = time.perf_counter()
+            for _ in sampler.sample(view=view):
+                pass
+            sampler.polylines(view=view)
+            latencies.append(time.perf_counter() - started)
+        results.add(f'plot.{text}.pan_frame.p50', Measurement(value=percentile(latencies, q=0.5) * 1e3, unit='ms'))
+        results.add(f'plot.{text}.pan_frame.p99', Measurement(value=percentile(latencies, q=0.99) * 1e3, unit='ms'))
+
+
+def generated_tokens(length: int, seed: int = 0) -> tuple[str, ...]:
+    """Tokens of a generated expression using the variable x."""
+    calculator: CalculatorService = CalculatorService()
+    for key in keystroke_stream(length=length, seed=seed, variables=True):
+        press(calculator=calculator, key=key)
+    return tuple(calculator.expression.tokens)
+
+
+def outcome(program: Program, x: float) -> float | str:
+    try:
+        return run_program(program=program, variables={Token.variable: x})
+    except Exception as e:
+        return type(e).__name__
+
+
+def benchmark_optimizer(results: Results, length: int, repeat: int) -> None:
+    """Compile a generated expression using x, then run it for many values of x, with and without the optimization pass."""
+    postfix: list[str] = infix_to_postfix(infix=generated_tokens(length=length))
+    iterations: int = max(1, 10_000 // length)
+
+    for name, optimize in {'unoptimized': False, 'optimized': True}.items():
+        program: Program = compile_postfix(postfix=postfix, optimize=optimize)
+
+        def compiling() -> float:
+            started: float = time.perf_counter()
+            for _ in range(iterations):
+                compile_postfix(postfix=postfix, optimize=optimize)
+            return (time.perf_counter() - started) / iterations
+
+        def running() -> float:
+            started: float = time.perf_counter()
+            for i in range(iterations):
+                outcome(program=program, x=float(i))
+            return (time.perf_counter() - started) / iterations
+
+        results.add(
+            f'optimizer.length={length}.{name}.compile', Measurement(value=best_of(repeat=repeat, function=compiling) * 1e6, unit='us')
+        )
+        results.add(f'optimizer.length={length}.{name}.run', Measurement(value=best_of(repeat=repeat, function=running) * 1e6, unit='us'))
+
+
+def benchmark_exact(results: Results, repeat: int) -> None:
+    """Run a sum of integer products and quotients, and one of products alone, with exact numbers and with the same constants as floats."""
+    workloads: dict[str, str] = {
+        f'exact.terms={EXACT_TERMS}': '+'.join(
+            f'{term % 97 + 3}*{term % 13 + 2}' if term % 4 else f'{term % 89 + 11}/{term % 7 + 3}' for term in range(EXACT_TERMS)
+        ),
+        f'exact.integers.terms={EXACT_TERMS}': '+'.join(f'{term % 97 + 3}*{term % 13 + 2}' for term in range(EXACT_TERMS)),
+    }
+    for workload, text in workloads.items():
+        # Unoptimized, as the optimizer would fold the whole expression at compile time
+        exact: Program = compile_postfix(postfix=infix_to_postfix(infix=tuple(tokenize(text=text))), optimize=False)
+        programs: dict[str, Program] = {
+            'exact': exact, 'float': exact._replace(constants=tuple(float(constant) for constant in exact.constants)),
+        }
+
+        for name, program in programs.items():
+            def running() -> float:
+                started: float = time.perf_counter()
+                run_program(program=program)
+                return time.perf_counter() - started
+
+            results.add(f'{workload}.{name}', Measurement(value=best_of(repeat=repeat, function=running) * 1e6, unit='us'))
+
+
+def benchmark_parallel(results: Results, repeat: int) -> None:
+    """Evaluate a sum of large powers serially and across 2, 4... processes up to the available cores."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    tokens: tuple[str, ...] = tuple(tokenize(text='+'.join(f'{term % 89 + 11}^{term % 100 + 50}' for term in range(PARALLEL_TERMS))))
+
+    def serial() -> float:
+        started: float = time.perf_counter()
+        # Compiled every time, like the spans sent to the workers
+        run_program(program=compile_postfix(postfix=infix_to_postfix(infix=tokens)))
+        return time.perf_counter() - started
+
+    results.add(f'parallel.terms={PARALLEL_TERMS}.serial', Measurement(value=best_of(repeat=repeat, function=serial) * 1e3, unit='ms'))
+
+    # A single worker evaluates serially
+    workers: int = 2
+    while workers <= available_cores():
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+
+            def parallel() -> float:
+                started: float = time.perf_counter()
+                evaluate_parallel(tokens=tokens, executor=executor, workers=workers)
+                return time.perf_counter() - started
+
+            # Start the worker processes before timing
+            parallel()
+            results.add(
+                f'parallel.terms={PARALLEL_TERMS}.workers={workers}',
+                Measurement(value=best_of(repeat=repeat, function=parallel) * 1e3, unit='ms'),
+            )
+        workers *= 2
+
+
+def benchmark_sessions(results: Results) -> None:
+    """Memory per session of a pool of compact sessions, and of as many calculator services."""
+    pool: SessionPool = SessionPool(max_sessions=SESSIONS)
+    factories: dict[str, Callable[[int], object]] = {
+        'session_pool': lambda i: pool.get(session_id=str(i)),
+        'calculator_service': lambda _: CalculatorService(),
+    }
+    for name, factory in factories.items():
+        gc.collect()
+        tracemalloc.start()
+        try:
+            sessions: list[object] = []
+            for i in range(SESSIONS):
+                session = factory(i)
+                session.insert_text(text=SESSION_EXPRESSION)
+                sessions.append(session)
+            current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results.add(f'memory.sessions.{name}.per_session', Measurement(value=current / SESSIONS, unit='B'))
+
+
+def run(results: Results, repeat: int, lengths: list[int] = EXPRESSION_LENGTHS) -> None:
+    # Malformed intermediate expressions are expected, their warnings would only add noise
+    logging.disable(logging.WARNING)
+    try:
+        for length in lengths:
+            benchmark_keystrokes(results=results, length=length, repeat=repeat)
+            benchmark_evaluation(results=results, length=length, repeat=repeat)
+            benchmark_memory(results=results, length=length)
+            benchmark_optimizer(results=results, length=length, repeat=repeat)
+        benchmark_sessions(results=results)
+        benchmark_history(results=results)
+        benchmark_calculation_log(results=results, repeat=repeat)
+        benchmark_exact(results=results, repeat=repeat)
+        benchmark_parallel(results=results, repeat=repeat)
+        benchmark_plotting(results=results)
+    finally:
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,82 @@
+"""Replay of recorded keystroke traces, as load tests of the calculator service.
+
+A trace recorded with `python main.py --record-trace PATH` is replayed
+headlessly, as fast as possible or at a multiple of its recorded pacing. The
+latency of every action is reported as percentiles, and the results of the
+calculations are checked against the recorded ones.
+"""
+import logging
+import random
+
+from typing import BinaryIO
+
+from src.services.calculator_service import CalculatorService
+from src.services.tokens import Token
+from src.services.trace import ReplayReport, TraceEvent, TraceRecorder, calculation_outcome, read_trace, replay
+
+from benchmarks.engine import BACKSPACE, keystroke_stream, percentile
+from benchmarks.results import Measurement, Results
+
+PERCENTILES: dict[str, float] = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99, 'max': 1.0}
+# Pacing of synthetic traces, a fast typist
+SYNTHETIC_KEY_INTERVAL_SECONDS: float = 0.15
+
+
+def run(results: Results, file: BinaryIO, speed: float | None = None) -> ReplayReport:
+    events: list[TraceEvent] = read_trace(file=file)
+    # Malformed intermediate expressions are expected, their warnings would only add noise
+    logging.disable(logging.WARNING)
+    try:
+        report: ReplayReport = replay(events=events, speed=speed)
+    finally:
+        logging.disable(logging.NOTSET)
+    for action, latencies in sorted(report.latencies.items()):
+        for name, q in PERCENTILES.items():
+            results.add(f'replay.{action}.{name}', Measurement(value=percentile(latencies, q=q) * 1e6, unit='us'))
+    results.add('replay.mismatches', Measurement(value=len(report.mismatches), unit='results'))
+    print(f'Replayed {len(events)} events in {report.seconds:.2f} s, {report.checked_results} results checked')
+    return report
+
+
+def synthesize(file: BinaryIO, calculations: int, seed: int = 0) -> None:
+    """Record a deterministic trace of `calculations` generated expressions, each calculated then cleared, some with undo and redo."""
+    generator: random.Random = random.Random(seed)
+    clock: list[float] = [0.0]
+
+    def tick() -> float:
+        clock[0] += SYNTHETIC_KEY_INTERVAL_SECONDS
+        return clock[0]
+
+    recorder: TraceRecorder = TraceRecorder(file=file, clock=tick)
+    calculator: CalculatorService = CalculatorService()
+    logging.disable(logging.WARNING)
+    try:
+        for calculation in range(calculations):
+            keys: list[str] = [
+                '⌫' if key is BACKSPACE else key.value
+                for key in keystroke_stream(length=generator.randint(5, 80), seed=seed + calculation)
+            ]
+            if generator.random() < 0.2:
+                keys += ['↶', '↶', '↷']
+            if generator.random() < 0.05:
+                keys.append('SCI')
+            for key in [*keys, '=', 'C']:
+                recorder.record_key(key=key)
+                match key:
+                    case '⌫':
+                        calculator.backspace_expression()
+                    case '↶':
+                        calculator.undo()
+                    case '↷':
+                        calculator.redo()
+                    case 'SCI':
+                        calculator.toggle_mode()
+                    case '=':
+                        recorder.record_result(outcome=calculation_outcome(calculator=calculator))
+                    case 'C':
+                        calculator.clear_expression()
+                    case _:
+                        calculator.send_token(token=Token(key))
+    finally:
+        logging.disable(logging.NOTSET)
+        recorder.close()
@@ -0,0 +1,72 @@
+import json
+import platform
+
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+
+class Measurement(NamedTuple):
+    value: float
+    unit: str
+    higher_is_better: bool = False
+
+
+class Regression(NamedTuple):
+    name: str
+    baseline: Measurement
+    current: Measurement
+
+    @property
+    def change(self) -> float:
+        """Relative change towards the worse direction, 0.1 meaning 10% worse."""
+        if self.baseline.value == 0:
+            return 0.0
+        ratio: float = self.current.value / self.baseline.value
+        return (1 / ratio - 1) if self.baseline.higher_is_better else (ratio - 1)
+
+
+class Results:
+
+    def __init__(self, measurements: dict[str, Measurement] | None = None, environment: dict[str, Any] | None = None) -> None:
+        self.measurements: dict[str, Measurement] = measurements or {}
+        self.environment: dict[str, Any] = environment or {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'recorded_at': datetime.now(tz=timezone.utc).isoformat(timespec='seconds'),
+        }
+
+    def add(self, name: str, measurement: Measurement) -> None:
+        self.measurements[name] = measurement
+        print(f'{name:<40} {measurement.value:>14.2f} {measurement.unit}', flush=True)
+
+    def save(self, path: str) -> None:
+        with open(path, mode='w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'environment': self.environment,
+                    'measurements': {name: measurement._asdict() for name, measurement in self.measurements.items()},
+                },
+                file,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'Results':
+        with open(path, encoding='utf-8') as file:
+            data: dict[str, Any] = json.load(file)
+        return cls(
+            measurements={name: Measurement(**measurement) for name, measurement in data['measurements'].items()},
+            environment=data['environment'],
+        )
+
+    def regressions(self, baseline: 'Results', threshold: float) -> list[Regression]:
+        """Measurements that got worse than `baseline` by more than `threshold` (0.1 for 10%)."""
+        regressions: list[Regression] = []
+        for name, current in self.measurements.items():
+            if name in baseline.measurements:
+                regression: Regression = Regression(name=name, baseline=baseline.measurements[name], current=current)
+                if regression.change > threshold:
+                    regressions.append(regression)
+        return regressions
@@ -0,0 +1,130 @@
+"""Load test of the JSON-lines calculator server.
+
+Each connection keeps up to `depth` requests in flight, mixing one-shot
+evaluations with a session typing an expression key by key. Without an
+address a server is started in a subprocess on a temporary Unix socket.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from src.services.tokens import Token
+
+from benchmarks.results import Measurement, Results
+
+DEFAULT_CONNECTIONS: int = 16
+DEFAULT_REQUESTS: int = 20_000
+DEFAULT_DEPTH: int = 32
+SERVER_START_TIMEOUT_SECONDS: float = 10.0
+
+# One-shot expressions, the last one is long enough to be evaluated by a worker process
+EXPRESSIONS: list[str] = ['1+2*3', '2,5*sin(30)+π', '(1+2)^3/4-√(9)', '+'.join(['ln(2)*3'] * 60)]
+SESSION_KEYS: list[Token] = [
+    Token.one, Token.two, Token.plus, Token.three, Token.multiply, Token.parenthesis, Token.four, Token.decimal, Token.five,
+]
+
+
+def workload(connection: int) -> Iterator[dict[str, Any]]:
+    """Endless requests of one connection: a one-shot evaluation after every key its session types."""
+    session: str = f'load-{connection}'
+    while True:
+        yield {'op': 'clear_expression', 'session': session}
+        for i, key in enumerate(SESSION_KEYS):
+            yield {'op': 'send_token', 'session': session, 'token': key.value}
+            yield {'op': 'evaluate', 'expression': EXPRESSIONS[i % len(EXPRESSIONS)]}
+        yield {'op': 'evaluate_expression', 'session': session}
+
+
+async def run_connection(
+    connection: int, requests: int, depth: int, latencies: list[float], path: Optional[str], host: str, port: int
+) -> int:
+    """Send `requests` pipelined requests and record the latency of each one, returning how many failed."""
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path=path)
+    else:
+        reader, writer = await asyncio.open_connection(host=host, port=port)
+
+    in_flight: asyncio.Semaphore = asyncio.Semaphore(value=depth)
+    sent_at: list[float] = []
+
+    async def send() -> None:
+        for request, _ in zip(workload(connection=connection), range(requests)):
+            await in_flight.acquire()
+            sent_at.append(time.perf_counter())
+            writer.write(json.dumps(request).encode() + b'\n')
+            await writer.drain()
+
+    sender: asyncio.Task[None] = asyncio.create_task(send())
+    errors: int = 0
+    # Responses come back in request order
+    for i in range(requests):
+        response: dict[str, Any] = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - sent_at[i])
+        errors += 'error' in response
+        in_flight.release()
+
+    await sender
+    writer.close()
+    await writer.wait_closed()
+    return errors
+
+
+async def load(connections: int, requests: int, depth: int, path: Optional[str], host: str, port: int) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    started: float = time.perf_counter()
+    errors: list[int] = await asyncio.gather(*(
+        run_connection(
+            connection=connection, requests=requests // connections, depth=depth, latencies=latencies, path=path, host=host, port=port
+        )
+        for connection in range(connections)
+    ))
+    return latencies, sum(errors), time.perf_counter() - started
+
+
+@contextmanager
+def spawned_server() -> Iterator[str]:
+    """Run `main.py serve` on a temporary Unix socket and yield its path."""
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, 'calculator.sock')
+        main: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+        server: subprocess.Popen[bytes] = subprocess.Popen([sys.executable, main, 'serve', '--unix', path])
+        try:
+            deadline: float = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+            while not os.path.exists(path):
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('The calculator server did not start')
+                time.sleep(0.05)
+            yield path
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def run(
+    results: Results,
+    connections: int = DEFAULT_CONNECTIONS,
+    requests: int = DEFAULT_REQUESTS,
+    depth: int = DEFAULT_DEPTH,
+    path: Optional[str] = None,
+    host: str = '127.0.0.1',
+    port: Optional[int] = None,
+) -> None:
+    if path is None and port is None:
+        with spawned_server() as spawned_path:
+            return run(results=results, connections=connections, requests=requests, depth=depth, path=spawned_path)
+
+    latencies, errors, elapsed = asyncio.run(
+        load(connections=connections, requests=requests, depth=depth, path=path, host=host, port=port or 0)
+    )
+    latencies.sort()
+    results.add('server.throughput', Measurement(value=len(latencies) / elapsed, unit='req/s', higher_is_better=True))
+    results.add('server.latency.p50', Measurement(value=latencies[len(latencies) // 2] * 1e3, unit='ms'))
+    results.add('server.latency.p99', Measurement(value=latencies[int(len(latencies) * 0.99)] * 1e3, unit='ms'))
+    results.add('server.errors', Measurement(value=errors, unit='requests'))
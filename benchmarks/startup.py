@@ -0,0 +1,118 @@
+"""Cold start benchmark, checked against budgets.
+
+Import times come from `python -X importtime` in fresh interpreters, the best
+of several runs. Time to first frame is measured from spawning the process
+until the window has been drawn, and until the work deferred after it is done.
+"""
+import os
+import subprocess
+import sys
+import time
+
+from typing import NamedTuple, Optional
+
+from benchmarks.results import Measurement, Results
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_RUNS: int = 7
+
+# Cumulative import time budgets, in milliseconds, of the modules headless uses and the application start from
+IMPORT_BUDGETS_MS: dict[str, float] = {
+    'src.services.engine': 30.0,
+    'src.services.calculator_service': 40.0,
+    'src.components.application': 80.0,
+}
+# Modules the headless ones must not load, whatever the machine
+HEADLESS_FORBIDDEN_MODULES: tuple[str, ...] = ('tkinter', 'logging', 'json', 'numpy', 'dataclasses', 'asyncio')
+# Modules each budgeted one must not load, the application needs tkinter and nothing more before its first frame
+FORBIDDEN_MODULES: dict[str, tuple[str, ...]] = {
+    'src.services.engine': HEADLESS_FORBIDDEN_MODULES,
+    'src.services.calculator_service': HEADLESS_FORBIDDEN_MODULES,
+    'src.components.application': tuple(name for name in HEADLESS_FORBIDDEN_MODULES if name != 'tkinter'),
+}
+FIRST_FRAME_BUDGET_MS: float = 500.0
+
+FIRST_FRAME_SCRIPT: str = '''
+from src.components.application import Application
+
+app = Application(history_path=None)
+while not app.winfo_viewable():
+    app.update()
+app.update_idletasks()
+print('frame', flush=True)
+while not app.started:
+    app.update()
+print('started', flush=True)
+app.destroy()
+'''
+
+
+class OverBudget(NamedTuple):
+    name: str
+    value: float
+    budget: float
+
+
+def import_time(module: str) -> float:
+    """Best cumulative import time of `module` in fresh interpreters, in milliseconds."""
+    timings: list[float] = []
+    for _ in range(IMPORT_RUNS):
+        process: subprocess.CompletedProcess[str] = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        for line in process.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            _, cumulative, name = line.split('|')
+            if name.strip() == module:
+                timings.append(int(cumulative) / 1e3)
+    return min(timings)
+
+
+def loaded_modules(module: str) -> set[str]:
+    process: subprocess.CompletedProcess[str] = subprocess.run(
+        [sys.executable, '-c', f'import sys, {module}; print(" ".join(sys.modules))'], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return set(process.stdout.split())
+
+
+def first_frame() -> Optional[tuple[float, float]]:
+    """Seconds from spawning the application until its first frame and until it is fully started, None without a display."""
+    started: float = time.perf_counter()
+    process: subprocess.Popen[str] = subprocess.Popen(
+        [sys.executable, '-c', FIRST_FRAME_SCRIPT], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    with process:
+        if process.stdout.readline() != 'frame\n':
+            return None
+        frame: float = time.perf_counter() - started
+        if process.stdout.readline() != 'started\n':
+            return None
+        return frame, time.perf_counter() - started
+
+
+def run(results: Results, skip_ui: bool = False) -> list[OverBudget]:
+    """Record the startup measurements and return those over their budget."""
+    over_budget: list[OverBudget] = []
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        milliseconds: float = import_time(module=module)
+        results.add(f'startup.import.{module}', Measurement(value=milliseconds, unit='ms'))
+        if milliseconds > budget:
+            over_budget.append(OverBudget(name=f'startup.import.{module}', value=milliseconds, budget=budget))
+
+        forbidden: set[str] = {name for name in loaded_modules(module=module) if name.split('.')[0] in FORBIDDEN_MODULES[module]}
+        results.add(f'startup.import.{module}.forbidden_modules', Measurement(value=len(forbidden), unit='modules'))
+        if forbidden:
+            print(f'{module} loads {", ".join(sorted(forbidden))}')
+            over_budget.append(OverBudget(name=f'startup.import.{module}.forbidden_modules', value=len(forbidden), budget=0))
+
+    if not skip_ui:
+        timings: Optional[tuple[float, float]] = first_frame()
+        if timings is None:
+            print('No display, skipping the time to first frame')
+        else:
+            frame, started = timings
+            results.add('startup.first_frame', Measurement(value=frame * 1e3, unit='ms'))
+            results.add('startup.started', Measurement(value=started * 1e3, unit='ms'))
+            if frame * 1e3 > FIRST_FRAME_BUDGET_MS:
+                over_budget.append(OverBudget(name='startup.first_frame', value=frame * 1e3, budget=FIRST_FRAME_BUDGET_MS))
+    return over_budget
@@ -0,0 +1,132 @@
+import logging
+import time
+
+from statistics import median
+
+from tkinter import Misc, TclError
+
+from src.components.action import Action
+from src.components.application import Application
+from src.components.button import SendTokenButton, ToggleModeButton
+
+from src.services.calculator_service import Token
+
+from benchmarks.results import Measurement, Results
+
+ROUND_TRIPS: int = 200
+# Expression lengths, in characters, at which the display refresh is timed
+DISPLAY_LENGTHS: tuple[int, ...] = (100, 10_000, 100_000)
+PLOT_EXPRESSION: str = 'sin(x*7)*x'
+PLOT_PAN_FRAMES: int = 240
+# Pixels dragged per frame, a fast pan
+PLOT_PAN_PIXELS: int = 8
+FRAME_BUDGET_MS: float = 1000 / 60
+
+
+def descendants(widget: Misc) -> list[Misc]:
+    return [descendant for child in widget.winfo_children() for descendant in (child, *descendants(widget=child))]
+
+
+def wait_for_result(app: Application) -> None:
+    while app.displayed_job_id != app.evaluation_worker.last_job_id:
+        app.update()
+
+
+def benchmark_send_token_round_trip(results: Results, app: Application) -> None:
+    """Time a SendTokenButton press until its result is displayed."""
+    buttons: list[SendTokenButton] = [widget for widget in descendants(widget=app.keyboard) if isinstance(widget, SendTokenButton)]
+    one: SendTokenButton = next(button for button in buttons if button.cget('text') == Token.one)
+    plus: SendTokenButton = next(button for button in buttons if button.cget('text') == Token.plus)
+
+    latencies: list[float] = []
+    for i in range(ROUND_TRIPS):
+        started: float = time.perf_counter()
+        (plus if i % 2 else one).invoke()
+        wait_for_result(app=app)
+        latencies.append(time.perf_counter() - started)
+
+    results.add('ui.send_token_round_trip.median', Measurement(value=median(latencies) * 1e6, unit='us'))
+    results.add('ui.send_token_round_trip.max', Measurement(value=max(latencies) * 1e6, unit='us'))
+
+
+def benchmark_toggle_mode(results: Results, app: Application) -> None:
+    """Time switching between the basic and scientific layouts until the window is redrawn."""
+    latencies: list[float] = []
+    for _ in range(ROUND_TRIPS):
+        toggle: ToggleModeButton = next(
+            widget for widget in descendants(widget=app.keyboard) if isinstance(widget, ToggleModeButton) and widget.winfo_ismapped()
+        )
+        started: float = time.perf_counter()
+        toggle.invoke()
+        app.update()
+        latencies.append(time.perf_counter() - started)
+
+    results.add('ui.toggle_mode.median', Measurement(value=median(latencies) * 1e6, unit='us'))
+    results.add('ui.toggle_mode.max', Measurement(value=max(latencies) * 1e6, unit='us'))
+
+
+def benchmark_display_refresh(results: Results, app: Application) -> None:
+    """Time rendering the expression label, which should not depend on the expression length."""
+    for length in DISPLAY_LENGTHS:
+        app.calculator.clear_expression()
+        app.calculator.insert_text(text='1+' * (length // 2))
+        latencies: list[float] = []
+        for _ in range(ROUND_TRIPS):
+            started: float = time.perf_counter()
+            app.display.refresh_expression()
+            app.update_idletasks()
+            latencies.append(time.perf_counter() - started)
+
+        results.add(f'ui.display_refresh.{length}.median', Measurement(value=median(latencies) * 1e6, unit='us'))
+    app.calculator.clear_expression()
+
+
+def benchmark_plot_pan(results: Results, app: Application) -> None:
+    """Time dragging the plot, each frame handling one motion event and drawing before the next."""
+    if not app.calculator.scientific_mode:
+        app.press(key=Action.toggle_mode)
+    app.calculator.clear_expression()
+    app.calculator.insert_text(text=PLOT_EXPRESSION)
+    app.request_refresh()
+    app.update()
+    while app.plot.sampling is not None:
+        app.update()
+
+    x: int = app.plot.winfo_width() // 2
+    y: int = app.plot.winfo_height() // 2
+    latencies: list[float] = []
+    for _ in range(PLOT_PAN_FRAMES):
+        # Pressed again every frame, so the pointer stays inside the plot
+        app.plot.event_generate('<ButtonPress-1>', x=x, y=y)
+        started: float = time.perf_counter()
+        app.plot.event_generate('<B1-Motion>', x=x - PLOT_PAN_PIXELS, y=y)
+        app.update()
+        latencies.append(time.perf_counter() - started)
+        app.plot.event_generate('<ButtonRelease-1>', x=x - PLOT_PAN_PIXELS, y=y)
+
+    results.add('ui.plot_pan_frame.median', Measurement(value=median(latencies) * 1e3, unit='ms'))
+    results.add('ui.plot_pan_frame.max', Measurement(value=max(latencies) * 1e3, unit='ms'))
+    results.add(
+        'ui.plot_pan_frame.over_budget', Measurement(value=sum(latency * 1e3 > FRAME_BUDGET_MS for latency in latencies), unit='frames')
+    )
+    app.calculator.clear_expression()
+    app.press(key=Action.toggle_mode)
+
+
+def run(results: Results) -> None:
+    try:
+        app: Application = Application(history_path=None)
+    except TclError as e:
+        print(f'Skipping UI benchmarks, Tk is not available: {e}')
+        return
+
+    logging.disable(logging.WARNING)
+    try:
+        app.update()
+        benchmark_send_token_round_trip(results=results, app=app)
+        benchmark_toggle_mode(results=results, app=app)
+        benchmark_display_refresh(results=results, app=app)
+        benchmark_plot_pan(results=results, app=app)
+    finally:
+        logging.disable(logging.NOTSET)
+        app.destroy()
@@ -1,13 +1,166 @@
+import sys
 
+from argparse import ArgumentParser, FileType, Namespace
 from logging import Logger, getLogger
 
-from src.components.application import Application
-
 logger: Logger = getLogger(name=__name__)
 
-if __name__ == '__main__':
-    app: Application = Application()
+
+def run_application(arguments: Namespace) -> None:
+    # Imported here so the headless commands never load tkinter
+    from src.components.application import Application
+
+    from src.services.calculation_log import DEFAULT_HISTORY_PATH
+
+    app: Application = Application(history_path=None if arguments.no_history else arguments.history or DEFAULT_HISTORY_PATH)
+    if arguments.metrics is not None:
+        app.enable_metrics()
+    if arguments.record_trace is not None:
+        from src.services.trace import TraceRecorder
+
+        app.trace_recorder = TraceRecorder(file=open(arguments.record_trace, 'wb'))
     try:
         app.mainloop()
     except Exception:
         logger.exception(msg='Fatal error occurred when running calculator application')
+    finally:
+        if arguments.metrics is not None:
+            metrics_format: str = 'prometheus' if arguments.metrics.endswith('.prom') else 'json'
+            with open(arguments.metrics, 'w', encoding='utf-8') as file:
+                file.write(app.calculator.dump_metrics(format=metrics_format))
+        if app.trace_recorder is not None:
+            app.trace_recorder.close()
+
+
+def run_batch(arguments: Namespace) -> None:
+    from src.services.batch_service import evaluate_files
+
+    evaluate_files(
+        inputs=arguments.files or [sys.stdin], output=arguments.output, chunk_size=arguments.chunk_size, workers=arguments.workers
+    )
+
+
+def run_columns(arguments: Namespace) -> None:
+    from src.services.columnar import (
+        compile_columns_expression,
+        evaluate_chunks,
+        read_binary_chunks,
+        read_csv_chunks,
+        read_csv_header,
+        write_binary,
+        write_text
+    )
+
+    try:
+        if arguments.column:
+            paths: dict[str, str] = dict(column.split('=', 1) for column in arguments.column)
+            program = compile_columns_expression(text=arguments.expression, columns=paths)
+            chunks = read_binary_chunks(paths=paths, chunk_rows=arguments.chunk_rows)
+        else:
+            header: list[str] = read_csv_header(file=arguments.csv, delimiter=arguments.delimiter)
+            program = compile_columns_expression(text=arguments.expression, columns=header)
+            chunks = read_csv_chunks(
+                file=arguments.csv, header=header, columns=program.variables, chunk_rows=arguments.chunk_rows, delimiter=arguments.delimiter
+            )
+
+        write = write_binary if arguments.binary else write_text
+        results = evaluate_chunks(program=program, chunks=chunks)
+        if not arguments.output:
+            # Standard output is left open, for whatever runs after
+            write(results=results, output=sys.stdout.buffer if arguments.binary else sys.stdout)
+            return
+        with open(arguments.output, 'wb') if arguments.binary else open(arguments.output, 'w', encoding='utf-8') as output:
+            write(results=results, output=output)
+    except ValueError as e:
+        sys.exit(f'error: {e}')
+
+
+def run_history(arguments: Namespace) -> None:
+    from src.services.calculation_log import DEFAULT_HISTORY_PATH, CalculationLog, Record
+
+    with CalculationLog(path=arguments.history or DEFAULT_HISTORY_PATH) as log:
+        records: list[Record] = (
+            log.search(query=arguments.query, prefix=arguments.prefix, limit=arguments.limit)
+            if arguments.query
+            else log.recent(count=arguments.limit)
+        )
+        for record in records:
+            print(f'{record.expression} = {record.result}')
+
+
+def run_server(arguments: Namespace) -> None:
+    import asyncio
+
+    from src.services.server import serve
+
+    try:
+        asyncio.run(serve(host=arguments.host, port=arguments.port, path=arguments.unix, workers=arguments.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_argument_parser() -> ArgumentParser:
+    parser: ArgumentParser = ArgumentParser(description='Calculator')
+    parser.add_argument(
+        '--metrics', metavar='PATH',
+        help='time the evaluation pipeline and dump the metrics to this file on exit, '
+        'in the Prometheus text format for .prom files and as JSON otherwise',
+    )
+    parser.add_argument('--history', help='calculation log file (default: ~/.calculator_history)')
+    parser.add_argument('--no-history', action='store_true', help='do not record calculations')
+    parser.add_argument(
+        '--record-trace', metavar='PATH',
+        help='record the keys pressed and the results calculated to this file, to be replayed with python -m benchmarks replay',
+    )
+    parser.set_defaults(handler=run_application)
+    subparsers = parser.add_subparsers(title='commands')
+
+    batch_parser: ArgumentParser = subparsers.add_parser('batch', help='evaluate one expression per line without starting the UI')
+    batch_parser.add_argument('files', nargs='*', type=FileType(mode='r', encoding='utf-8'), help='input files, stdin when omitted')
+    batch_parser.add_argument(
+        '-o', '--output', type=FileType(mode='w', encoding='utf-8'), default=sys.stdout, help='output file, stdout when omitted'
+    )
+    batch_parser.add_argument('--chunk-size', type=int, default=1024, help='lines sent to a worker at a time')
+    batch_parser.add_argument('--workers', type=int, default=None, help='worker processes, the available cores when omitted')
+    batch_parser.set_defaults(handler=run_batch)
+
+    columns_parser: ArgumentParser = subparsers.add_parser(
+        'columns', help='evaluate an expression over the columns of a data file, one result per row'
+    )
+    columns_parser.add_argument('expression', help="expression using column names as variables, e.g. 'price*qty*(1+tax)'")
+    columns_parser.add_argument(
+        '--csv', type=FileType(mode='r', encoding='utf-8'), default=sys.stdin, help='CSV file with a header row, stdin when omitted'
+    )
+    columns_parser.add_argument(
+        '--column', action='append', metavar='NAME=PATH',
+        help='raw little-endian float64 file of a column, instead of a CSV file, repeated per column',
+    )
+    columns_parser.add_argument('--delimiter', default=',', help='CSV field delimiter (default: ,)')
+    columns_parser.add_argument('-o', '--output', help='output file, stdout when omitted')
+    columns_parser.add_argument(
+        '--binary', action='store_true', help='write the results as raw float64 values, nan where they failed, rather than text lines'
+    )
+    columns_parser.add_argument('--chunk-rows', type=int, default=65536, help='rows evaluated at a time (default: 65536)')
+    columns_parser.set_defaults(handler=run_columns)
+
+    history_parser: ArgumentParser = subparsers.add_parser('history', help='print recorded calculations, newest first')
+    history_parser.add_argument('query', nargs='?', help='only calculations whose expression contains this text')
+    history_parser.add_argument('--prefix', action='store_true', help='only calculations whose expression starts with the query')
+    history_parser.add_argument('--limit', type=int, default=20, help='calculations printed at most (default: 20)')
+    history_parser.set_defaults(handler=run_history)
+
+    serve_parser: ArgumentParser = subparsers.add_parser('serve', help='serve the calculator engine as JSON lines over a socket')
+    serve_parser.add_argument('--unix', metavar='PATH', help='listen on this Unix socket instead of TCP')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='TCP host (default: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=8765, help='TCP port (default: 8765)')
+    serve_parser.add_argument(
+        '--workers', type=int, default=None, help='worker processes for long evaluations, the available cores when omitted'
+    )
+    serve_parser.set_defaults(handler=run_server)
+
+    return parser
+
+
+if __name__ == '__main__':
+    arguments: Namespace = build_argument_parser().parse_args()
+    arguments.handler(arguments)
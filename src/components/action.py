@@ -0,0 +1,10 @@
+from enum import StrEnum
+
+
+class Action(StrEnum):
+    toggle_mode: str = 'SCI'
+    clear: str = 'C'
+    backspace: str = '⌫'
+    calculate: str = '='
+    undo: str = '↶'
+    redo: str = '↷'
@@ -1,14 +1,36 @@
+from __future__ import annotations
 
 from functools import cached_property
-from typing import Any
+from typing import TYPE_CHECKING, Any, Optional
 
 from tkinter import *
 from tkinter import ttk
 
 from src.components.display import Display
-from src.components.keyboard import Keyboard
+from src.components.keyboard import CHARACTER_KEYS, CLOSE_PARENTHESIS_CHARACTER, KEYSYM_KEYS, SHORTCUT_KEYS, Action, Key, Keyboard
 
-from src.services.calculator_service import CalculatorService
+from src.services.budget import BudgetGuard
+from src.services.calculator_service import CalculatorService, EvaluationTask, Token
+from src.services.engine import ends_operand
+from src.services.evaluation_worker import EvaluationWorker
+
+from src.utils.lazy_logger import LazyLogger
+
+# Modules the first frame does not need are imported where they are first used
+if TYPE_CHECKING:
+    from src.components.plot import Plot
+
+    from src.services.calculation_log import CalculationLog
+    from src.services.trace import TraceRecorder
+
+    from src.utils.metrics import Metrics
+
+EVALUATION_POLL_INTERVAL_MS: int = 16
+# Expressions from the calculation log compiled once the window is up, within a few frames of CPU time
+WARM_UP_EXPRESSIONS: int = 32
+WARM_UP_MAX_SECONDS: float = 0.05
+
+logger: LazyLogger = LazyLogger(name=__name__)
 
 
 class Application(Tk):
@@ -17,6 +39,10 @@ class Application(Tk):
     def calculator(self) -> CalculatorService:
         return CalculatorService()
 
+    @cached_property
+    def evaluation_worker(self) -> EvaluationWorker:
+        return EvaluationWorker()
+
     @cached_property
     def display(self) -> Display:
         return Display(master=self)
@@ -25,9 +51,29 @@ class Application(Tk):
     def keyboard(self) -> Keyboard:
         return Keyboard(master=self)
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
+    @cached_property
+    def plot(self) -> Plot:
+        from src.components.plot import Plot
+
+        return Plot(master=self)
+
+    def __init__(self, *args: Any, history_path: Optional[str] = None, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
+        # Calculation log file, calculations are not recorded without one
+        self.history_path: Optional[str] = history_path
+        # Set once the work deferred until after the first frame is done
+        self.started: bool = False
+        # Job evaluating the expression committed by the calculate key, and its tokens
+        self.calculation_job_id: int = 0
+        self.calculation_tokens: tuple[str, ...] = ()
+        self.displayed_job_id: int = 0
+        self.polling_evaluations: bool = False
+        self.refresh_pending: bool = False
+        self.full_evaluation_pending: bool = False
+        # Records the keys pressed and the calculated results when set, pasted text is not recorded
+        self.trace_recorder: Optional[TraceRecorder] = None
+
         style = ttk.Style(master=self)
 
         style.configure('TButton', font=('Arial', 16))
@@ -39,9 +85,169 @@ class Application(Tk):
         self.title(string='Calculator')
 
         self.rowconfigure(index=0, weight=0)
-        self.rowconfigure(index=1, weight=1)
+        self.rowconfigure(index=1, weight=0)
+        self.rowconfigure(index=2, weight=1)
 
         self.columnconfigure(index=0, weight=1)
 
+        # The plot, in row 1, is only shown in scientific mode
         self.display.grid(row=0, column=0, sticky='nsew')
-        self.keyboard.grid(row=1, column=0, sticky='nsew')
+        self.keyboard.grid(row=2, column=0, sticky='nsew')
+
+        self.bind(sequence='<Key>', func=self._on_key)
+        for sequence, key in SHORTCUT_KEYS.items():
+            self.bind(sequence=sequence, func=lambda event, key=key: self._on_shortcut(key=key))
+        self.bind(sequence='<Control-v>', func=self._on_paste)
+        self.bind(sequence='<<Paste>>', func=self._on_paste)
+
+        # Work the first frame does not need waits until it is drawn
+        self.bind(sequence='<Expose>', func=self._on_first_expose)
+
+    def enable_metrics(self) -> Metrics:
+        """Time the calculator pipeline and the display label updates."""
+        metrics: Metrics = self.calculator.enable_metrics()
+        for stage, method in {'display_expression': 'set_current_expression_label_text', 'display_result': 'set_result_label_text'}.items():
+            setattr(self.display, method, metrics.instrument(stage=stage, function=getattr(self.display, method)))
+        return metrics
+
+    def press(self, key: Key) -> None:
+        """Apply `key` to the calculator, as its button would, and schedule a refresh of the display."""
+        if self.trace_recorder is not None:
+            self.trace_recorder.record_key(key=key)
+        match key:
+            case Action.toggle_mode:
+                self.calculator.toggle_mode()
+                self.keyboard.refresh_layout()
+                self.refresh_plot()
+            case Action.clear:
+                self.calculator.clear_expression()
+                self.request_refresh()
+            case Action.backspace:
+                self.calculator.backspace_expression()
+                self.request_refresh()
+            case Action.calculate:
+                self.request_refresh(full_evaluation=True)
+            case Action.undo:
+                if self.calculator.undo():
+                    self.request_refresh()
+            case Action.redo:
+                if self.calculator.redo():
+                    self.request_refresh()
+            case _:
+                self.calculator.send_token(token=key)
+                self.request_refresh()
+
+    def request_refresh(self, full_evaluation: bool = False) -> None:
+        """Refresh the expression label and evaluate it once Tk is idle.
+
+        Requests made before then, e.g. by key repeat or a burst of input, are
+        coalesced into a single label update and evaluation.
+        """
+        self.full_evaluation_pending = self.full_evaluation_pending or full_evaluation
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after_idle(self._refresh)
+
+    def refresh_plot(self) -> None:
+        """Show the plot of the expression in scientific mode, sharing the space below the display with the keyboard, hide it otherwise."""
+        if self.calculator.scientific_mode:
+            self.rowconfigure(index=1, weight=1)
+            self.plot.grid(row=1, column=0, sticky='nsew')
+            self.plot.refresh_expression()
+        elif 'plot' in self.__dict__:
+            # Only once it was created, the first time scientific mode was shown
+            self.rowconfigure(index=1, weight=0)
+            self.plot.grid_remove()
+
+    def evaluate(self, task: EvaluationTask) -> int:
+        """Evaluate `task` off the main thread and show its result once it is ready, returning its job id."""
+        job_id: int = self.evaluation_worker.submit(task=task)
+        if not self.polling_evaluations:
+            self.polling_evaluations = True
+            self.after(EVALUATION_POLL_INTERVAL_MS, self._poll_evaluations)
+        return job_id
+
+    def _poll_evaluations(self) -> None:
+        while not self.evaluation_worker.outcomes.empty():
+            outcome = self.evaluation_worker.outcomes.get()
+            # Outcomes of superseded keystrokes are dropped
+            if outcome.job_id == self.evaluation_worker.last_job_id:
+                self.displayed_job_id = outcome.job_id
+                result: int | float = self.calculator.accept_result(outcome=outcome.outcome)
+                self.display.set_result_label_text(text=result)
+                if outcome.job_id == self.calculation_job_id:
+                    if not isinstance(outcome.outcome, Exception):
+                        self.calculator.record_calculation(tokens=self.calculation_tokens, result=result)
+                    if self.trace_recorder is not None:
+                        self.trace_recorder.record_result(outcome=outcome.outcome if isinstance(outcome.outcome, Exception) else result)
+
+        if self.displayed_job_id == self.evaluation_worker.last_job_id:
+            self.polling_evaluations = False
+        else:
+            self.after(EVALUATION_POLL_INTERVAL_MS, self._poll_evaluations)
+
+    def _refresh(self) -> None:
+        full_evaluation: bool = self.full_evaluation_pending
+        self.refresh_pending = self.full_evaluation_pending = False
+
+        self.display.refresh_expression()
+        if self.calculator.scientific_mode:
+            self.plot.refresh_expression()
+        if full_evaluation:
+            self.calculation_tokens = tuple(self.calculator.expression.tokens)
+            self.calculation_job_id = self.evaluate(task=self.calculator.evaluation_task())
+        else:
+            self.evaluate(task=self.calculator.preview_task())
+
+    def _open_log(self) -> Optional[CalculationLog]:
+        if self.history_path is None:
+            return None
+        from src.services.calculation_log import CalculationLog
+
+        try:
+            return CalculationLog(path=self.history_path)
+        except (OSError, ValueError) as e:
+            logger.warning(msg=f'Calculations will not be recorded, cannot open {self.history_path}: {e}')
+            return None
+
+    def _on_first_expose(self, event: Event) -> None:
+        self.unbind(sequence='<Expose>')
+        # Queued after the redraws the first expose events schedule
+        self.after_idle(self._finish_startup)
+
+    def _finish_startup(self) -> None:
+        self.keyboard.create_hidden_layouts()
+        self.calculator.log = self._open_log()
+        if self.calculator.log is not None:
+            # Compiled for the operation limits of the worker's evaluations, on the UI thread for a bounded time
+            guard: BudgetGuard = BudgetGuard(budget=self.evaluation_worker.budget._replace(max_seconds=WARM_UP_MAX_SECONDS))
+            self.calculator.warm_up(expressions=self.calculator.log.frequent_expressions(count=WARM_UP_EXPRESSIONS), guard=guard)
+        self.started = True
+
+    def _on_key(self, event: Event) -> None:
+        if event.char == CLOSE_PARENTHESIS_CHARACTER:
+            # The parenthesis key would open one instead
+            if self.calculator.number_of_open_parenthesis > 0 and ends_operand(token=self.calculator.last_element):
+                self.press(key=Token.parenthesis)
+            return
+        key: Key | None = KEYSYM_KEYS.get(event.keysym) or CHARACTER_KEYS.get(event.char)
+        if key is not None:
+            self.press(key=key)
+
+    def _on_shortcut(self, key: Key) -> str:
+        self.press(key=key)
+        # Stop the class bindings from handling the key again
+        return 'break'
+
+    def _on_paste(self, event: Event) -> str:
+        try:
+            text: str = self.clipboard_get()
+            self.calculator.insert_text(text=text)
+        except (TclError, ValueError) as e:
+            logger.warning(msg=f'Cannot paste the clipboard: {e}')
+        else:
+            if self.trace_recorder is not None:
+                self.trace_recorder.record_paste(text=text)
+            self.request_refresh()
+        # Stop the class bindings from handling the paste again
+        return 'break'
@@ -8,6 +8,8 @@ from tkinter import ttk
 
 from src.services.calculator_service import Token
 
+from .action import Action
+
 if TYPE_CHECKING:
     from src.components.application import Application
 
@@ -17,9 +19,7 @@ class BackspaceButton(ttk.Button):
     def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
 
         def command() -> None:
-            application.calculator.backspace_expression()
-            application.display.set_current_expression_label_text(text=application.calculator.get_expression())
-            application.display.set_result_label_text(text=application.calculator.evalutate_expression())
+            application.press(key=Action.backspace)
 
         super().__init__(*args, style='clear.TButton', command=command, **kwargs)
 
@@ -29,7 +29,7 @@ class CalculateButton(ttk.Button):
     def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
 
         def command() -> None:
-            application.display.set_result_label_text(text=application.calculator.evalutate_expression())
+            application.press(key=Action.calculate)
 
         super().__init__(*args, style='calculate.TButton', command=command, **kwargs)
 
@@ -39,20 +39,26 @@ class ClearButton(ttk.Button):
     def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
 
         def command() -> None:
-            application.calculator.clear_expression()
-            application.display.set_current_expression_label_text(text=application.calculator.get_expression())
-            application.display.set_result_label_text(text=application.calculator.evalutate_expression())
+            application.press(key=Action.clear)
 
         super().__init__(*args, style='clear.TButton', command=command, **kwargs)
 
 
+class RedoButton(ttk.Button):
+
+    def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
+
+        def command() -> None:
+            application.press(key=Action.redo)
+
+        super().__init__(*args, command=command, **kwargs)
+
+
 class SendTokenButton(ttk.Button):
     def __init__(self, *args: Any, application: Application, token: Token, **kwargs: Any) -> None:
 
         def command() -> None:
-            application.calculator.send_token(token=token)
-            application.display.set_current_expression_label_text(text=application.calculator.get_expression())
-            application.display.set_result_label_text(text=application.calculator.evalutate_expression())
+            application.press(key=token)
 
         super().__init__(*args, text=token.value, command=command, **kwargs)
 
@@ -61,7 +67,16 @@ class ToggleModeButton(ttk.Button):
     def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
 
         def command() -> None:
-            application.calculator.toggle_mode()
-            application.keyboard.refresh_layout()
+            application.press(key=Action.toggle_mode)
 
         super().__init__(*args, text='SCI', command=command, **kwargs)
+
+
+class UndoButton(ttk.Button):
+
+    def __init__(self, *args: Any, application: Application, **kwargs: Any) -> None:
+
+        def command() -> None:
+            application.press(key=Action.undo)
+
+        super().__init__(*args, command=command, **kwargs)
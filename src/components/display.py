@@ -15,12 +15,32 @@ RESULT_LABEL_FONT_SIZE: int = 32
 
 DEFAULT_LABEL_PADDING: tuple[int, int, int, int] = (10, 10, 10, 10)
 
+# Characters shown before the expression label has been laid out and its width is known
+DEFAULT_EXPRESSION_CHARACTERS: int = 32
+# Characters scrolled per mouse wheel notch
+SCROLL_STEP_CHARACTERS: int = 4
+ELLIPSIS: str = '…'
+
 
 class Display(Frame):
+    """Shows the expression being typed and the latest result.
+
+    Only the part of the expression that fits the label is handed to Tk, so
+    rendering costs the same however long the expression grows. The hidden
+    rest is elided with an ellipsis and can be scrolled with the mouse wheel.
+    """
+
+    @cached_property
+    def current_expression_font(self) -> font.Font:
+        return font.Font(size=CURRENT_EXPRESSION_LABEL_FONT_SIZE)
+
+    @cached_property
+    def character_width(self) -> int:
+        return max(1, self.current_expression_font.measure(text='0'))
 
     @cached_property
     def current_expression_label(self) -> ttk.Label:
-        return ttk.Label(master=self, text='', anchor='e', font=font.Font(size=CURRENT_EXPRESSION_LABEL_FONT_SIZE), padding=DEFAULT_LABEL_PADDING)
+        return ttk.Label(master=self, text='', anchor='e', font=self.current_expression_font, padding=DEFAULT_LABEL_PADDING)
 
     @cached_property
     def result_label(self) -> ttk.Label:
@@ -29,6 +49,9 @@ class Display(Frame):
     def __init__(self, master: Application, *args: Any, **kwargs: Any) -> None:
         super().__init__(master=master, *args, **kwargs)
 
+        self.scroll_offset: int = 0
+        self.rendered_width: int = 0
+
         self.rowconfigure(index=0, minsize=CURRENT_EXPRESSION_LABEL_FONT_SIZE, weight=1)
         self.rowconfigure(index=1, minsize=RESULT_LABEL_FONT_SIZE, weight=1)
 
@@ -37,6 +60,51 @@ class Display(Frame):
         self.current_expression_label.grid(row=0, column=0, sticky='nsew')
         self.result_label.grid(row=1, column=0, sticky='nsew')
 
+        self.current_expression_label.bind(sequence='<Configure>', func=self._on_resize)
+        self.current_expression_label.bind(sequence='<MouseWheel>', func=self._on_scroll)
+        self.current_expression_label.bind(sequence='<Button-4>', func=self._on_scroll)
+        self.current_expression_label.bind(sequence='<Button-5>', func=self._on_scroll)
+
+    @property
+    def expression_width(self) -> int:
+        """Width in pixels available to the expression text, 0 until the label is laid out."""
+        left, _, right, _ = DEFAULT_LABEL_PADDING
+        width: int = self.current_expression_label.winfo_width() - left - right
+        return width if width > 0 else 0
+
+    def refresh_expression(self, scroll_offset: int = 0) -> None:
+        """Render the window of the expression that ends `scroll_offset` characters before its end."""
+        calculator = self.master.calculator
+        width: int = self.expression_width
+        characters: int = width // self.character_width if width else DEFAULT_EXPRESSION_CHARACTERS
+        length: int = calculator.get_expression_length()
+
+        self.scroll_offset = max(0, min(scroll_offset, length - characters))
+        self.rendered_width = width
+        text: str = calculator.get_expression_window(characters=characters, offset=self.scroll_offset)
+        hidden_before: bool = length - self.scroll_offset > len(text)
+        hidden_after: bool = self.scroll_offset > 0
+
+        # Characters wider than the measured one may still overflow, trim them one at a time
+        while text:
+            shown: str = (ELLIPSIS if hidden_before else '') + text + (ELLIPSIS if hidden_after else '')
+            if not width or self.current_expression_font.measure(text=shown) <= width:
+                break
+            text = text[1:]
+            hidden_before = True
+        else:
+            shown = ''
+
+        self.set_current_expression_label_text(text=shown)
+
+    def _on_resize(self, event: Event) -> None:
+        if self.expression_width != self.rendered_width:
+            self.refresh_expression(scroll_offset=self.scroll_offset)
+
+    def _on_scroll(self, event: Event) -> None:
+        towards_start: bool = event.num == 4 or event.delta > 0
+        self.refresh_expression(scroll_offset=self.scroll_offset + (SCROLL_STEP_CHARACTERS if towards_start else -SCROLL_STEP_CHARACTERS))
+
     def set_current_expression_label_text(self, text: str) -> None:
         self.current_expression_label.config(text=text)
 
@@ -1,4 +1,3 @@
-
 from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any
@@ -8,121 +7,145 @@ from tkinter import ttk
 
 from src.services.calculator_service import Token
 
-from .button import BackspaceButton, CalculateButton, ClearButton, SendTokenButton, ToggleModeButton
+from .action import Action
+from .button import BackspaceButton, CalculateButton, ClearButton, RedoButton, SendTokenButton, ToggleModeButton, UndoButton
 
 if TYPE_CHECKING:
     from src.components.application import Application
 
 
+Key = Token | Action
+Layout = tuple[tuple[Key, ...], ...]
+
+# The last key of a row shorter than the layout spans the remaining columns
+BASIC_LAYOUT: Layout = (
+    (Action.toggle_mode, Action.clear, Action.backspace, Token.parenthesis),
+    (Token.seven, Token.eight, Token.nine, Token.divide),
+    (Token.four, Token.five, Token.six, Token.multiply),
+    (Token.one, Token.two, Token.three, Token.minus),
+    (Token.negate, Token.zero, Token.decimal, Token.plus),
+    (Action.undo, Action.redo, Action.calculate),
+)
+
+SCIENTIFIC_LAYOUT: Layout = (
+    (Action.toggle_mode, Token.sin, Token.cos, Token.tan, Token.sqrt),
+    (Action.clear, Token.log, Token.ln, Token.exp, Token.power),
+    (Token.seven, Token.eight, Token.nine, Token.divide, Action.backspace),
+    (Token.four, Token.five, Token.six, Token.multiply, Token.parenthesis),
+    (Token.one, Token.two, Token.three, Token.minus, Token.pi),
+    (Token.negate, Token.zero, Token.decimal, Token.plus),
+    (Action.undo, Action.redo, Action.calculate),
+)
+
+LAYOUTS: dict[bool, Layout] = {False: BASIC_LAYOUT, True: SCIENTIFIC_LAYOUT}
+
+# Physical keys, by the character they type and by the name of those that type none
+CHARACTER_KEYS: dict[str, Key] = {
+    **{token.value: token for token in (
+        Token.zero, Token.one, Token.two, Token.three, Token.four, Token.five, Token.six, Token.seven, Token.eight, Token.nine,
+        Token.plus, Token.minus, Token.multiply, Token.divide, Token.power, Token.decimal, Token.variable,
+    )},
+    '.': Token.decimal,
+    '(': Token.parenthesis,
+    'p': Token.pi,
+    'r': Token.sqrt,
+    's': Token.sin,
+    'c': Token.cos,
+    't': Token.tan,
+    'l': Token.log,
+    'n': Token.ln,
+    'e': Token.exp,
+    '=': Action.calculate,
+}
+
+KEYSYM_KEYS: dict[str, Key] = {
+    'Return': Action.calculate,
+    'KP_Enter': Action.calculate,
+    'BackSpace': Action.backspace,
+    'Escape': Action.clear,
+    'Delete': Action.backspace,
+}
+
+# Typed character that only closes a parenthesis, pressing the parenthesis key when that would close one
+CLOSE_PARENTHESIS_CHARACTER: str = ')'
+
+# Key combinations, by Tk event sequence, as they are not told apart by their keysym and character
+SHORTCUT_KEYS: dict[str, Key] = {
+    '<Control-z>': Action.undo,
+    '<Control-y>': Action.redo,
+    '<Control-Z>': Action.redo,
+}
+
+
 class Keyboard(Frame):
 
+    @property
+    def layout(self) -> Layout:
+        return LAYOUTS[self.master.calculator.scientific_mode]
+
     @property
     def number_of_rows(self) -> int:
-        return 6 if self.master.calculator.scientific_mode else 5
+        return len(self.layout)
 
     @property
     def number_of_columns(self) -> int:
-        return 5 if self.master.calculator.scientific_mode else 4
+        return max(len(row) for row in self.layout)
 
     def __init__(self, master: Application, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, master=master, **kwargs)
-        self._create_layout()
-
-    def _create_layout(self) -> None:
-        # Clear existing buttons
-        for widget in self.winfo_children():
-            widget.destroy()
-
-        if self.master.calculator.scientific_mode:
-            buttons: list[ttk.Button] = [
-                # first row
-                ToggleModeButton(application=self.master, master=self),
-                SendTokenButton(application=self.master, token=Token.sin, master=self),
-                SendTokenButton(application=self.master, token=Token.cos, master=self),
-                SendTokenButton(application=self.master, token=Token.tan, master=self),
-                SendTokenButton(application=self.master, token=Token.sqrt, master=self),
-
-                # second row
-                ClearButton(application=self.master, text='C', master=self),
-                SendTokenButton(application=self.master, token=Token.log, master=self),
-                SendTokenButton(application=self.master, token=Token.ln, master=self),
-                SendTokenButton(application=self.master, token=Token.exp, master=self),
-                SendTokenButton(application=self.master, token=Token.power, master=self),
-
-                # third row
-                SendTokenButton(application=self.master, token=Token.seven, master=self),
-                SendTokenButton(application=self.master, token=Token.eight, master=self),
-                SendTokenButton(application=self.master, token=Token.nine, master=self),
-                SendTokenButton(application=self.master, token=Token.divide, master=self),
-                BackspaceButton(application=self.master, text='⌫', master=self),
-
-                # fourth row
-                SendTokenButton(application=self.master, token=Token.four, master=self),
-                SendTokenButton(application=self.master, token=Token.five, master=self),
-                SendTokenButton(application=self.master, token=Token.six, master=self),
-                SendTokenButton(application=self.master, token=Token.multiply, master=self),
-                SendTokenButton(application=self.master, token=Token.parenthesis, master=self),
-
-                # fifth row
-                SendTokenButton(application=self.master, token=Token.one, master=self),
-                SendTokenButton(application=self.master, token=Token.two, master=self),
-                SendTokenButton(application=self.master, token=Token.three, master=self),
-                SendTokenButton(application=self.master, token=Token.minus, master=self),
-                SendTokenButton(application=self.master, token=Token.pi, master=self),
-
-                # sixth row
-                SendTokenButton(application=self.master, token=Token.negate, master=self),
-                SendTokenButton(application=self.master, token=Token.zero, master=self),
-                SendTokenButton(application=self.master, token=Token.decimal, master=self),
-                SendTokenButton(application=self.master, token=Token.plus, master=self),
-                CalculateButton(application=self.master, text='=', master=self),
-            ]
-        else:
-            buttons: list[ttk.Button] = [
-                # first row
-                ToggleModeButton(application=self.master, master=self),
-                ClearButton(application=self.master, text='C', master=self),
-                BackspaceButton(application=self.master, text='⌫', master=self),
-                SendTokenButton(application=self.master, token=Token.parenthesis, master=self),
-
-                # second row
-                SendTokenButton(application=self.master, token=Token.seven, master=self),
-                SendTokenButton(application=self.master, token=Token.eight, master=self),
-                SendTokenButton(application=self.master, token=Token.nine, master=self),
-                SendTokenButton(application=self.master, token=Token.divide, master=self),
-
-                # third row
-                SendTokenButton(application=self.master, token=Token.four, master=self),
-                SendTokenButton(application=self.master, token=Token.five, master=self),
-                SendTokenButton(application=self.master, token=Token.six, master=self),
-                SendTokenButton(application=self.master, token=Token.multiply, master=self),
-
-                # fourth row
-                SendTokenButton(application=self.master, token=Token.one, master=self),
-                SendTokenButton(application=self.master, token=Token.two, master=self),
-                SendTokenButton(application=self.master, token=Token.three, master=self),
-                SendTokenButton(application=self.master, token=Token.minus, master=self),
-
-                # fifth row
-                SendTokenButton(application=self.master, token=Token.negate, master=self),
-                SendTokenButton(application=self.master, token=Token.zero, master=self),
-                SendTokenButton(application=self.master, token=Token.decimal, master=self),
-                SendTokenButton(application=self.master, token=Token.plus, master=self),
-            ]
-            # Add calculate button for basic mode
-            buttons.append(CalculateButton(application=self.master, text='=', master=self))
-
-        for row in range(self.number_of_rows):
-            self.rowconfigure(index=row, weight=1)
-
-        for column in range(self.number_of_columns):
-            self.columnconfigure(index=column, weight=1)
-
-        for row in range(self.number_of_rows):
-            for column in range(self.number_of_columns):
-                idx = (self.number_of_columns * row) + column
-                if idx < len(buttons):
-                    buttons[idx].grid(row=row, column=column, sticky='nsew')
+
+        self.rowconfigure(index=0, weight=1)
+        self.columnconfigure(index=0, weight=1)
+
+        # Layout frames by scientific mode, each built the first time it is shown
+        self.layout_frames: dict[bool, Frame] = {}
+        self.refresh_layout()
+
+    def _create_button(self, master: Frame, key: Key) -> ttk.Button:
+        match key:
+            case Action.toggle_mode:
+                return ToggleModeButton(application=self.master, master=master)
+            case Action.clear:
+                return ClearButton(application=self.master, text=key.value, master=master)
+            case Action.backspace:
+                return BackspaceButton(application=self.master, text=key.value, master=master)
+            case Action.calculate:
+                return CalculateButton(application=self.master, text=key.value, master=master)
+            case Action.undo:
+                return UndoButton(application=self.master, text=key.value, master=master)
+            case Action.redo:
+                return RedoButton(application=self.master, text=key.value, master=master)
+        return SendTokenButton(application=self.master, token=key, master=master)
+
+    def _create_layout(self, layout: Layout) -> Frame:
+        frame: Frame = Frame(master=self)
+        number_of_columns: int = max(len(row) for row in layout)
+
+        for row in range(len(layout)):
+            frame.rowconfigure(index=row, weight=1)
+
+        for column in range(number_of_columns):
+            frame.columnconfigure(index=column, weight=1)
+
+        for row, keys in enumerate(layout):
+            for column, key in enumerate(keys):
+                columnspan: int = number_of_columns - column if column == len(keys) - 1 else 1
+                self._create_button(master=frame, key=key).grid(row=row, column=column, columnspan=columnspan, sticky='nsew')
+
+        return frame
 
     def refresh_layout(self) -> None:
-        self._create_layout()
+        scientific_mode: bool = self.master.calculator.scientific_mode
+        if scientific_mode not in self.layout_frames:
+            self.layout_frames[scientific_mode] = self._create_layout(layout=LAYOUTS[scientific_mode])
+
+        for mode, frame in self.layout_frames.items():
+            if mode != scientific_mode:
+                frame.grid_remove()
+        self.layout_frames[scientific_mode].grid(row=0, column=0, sticky='nsew')
+
+    def create_hidden_layouts(self) -> None:
+        """Build the layouts not shown yet, so switching to them later is instant."""
+        for scientific_mode, layout in LAYOUTS.items():
+            if scientific_mode not in self.layout_frames:
+                self.layout_frames[scientific_mode] = self._create_layout(layout=layout)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import time
+
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+from tkinter import *
+
+from src.services.budget import BudgetGuard
+from src.services.engine import compile_expression
+from src.services.plotting import Sampler, View
+
+if TYPE_CHECKING:
+    from src.components.application import Application
+
+DEFAULT_VIEW: View = View(x_min=-10.0, x_max=10.0, y_min=-10.0, y_max=10.0, width=1, height=1)
+# Sampling done per frame before Tk gets to draw and handle input, well within 60 fps
+FRAME_BUDGET_SECONDS: float = 0.008
+# View scaled per mouse wheel notch
+ZOOM_FACTOR: float = 1.25
+
+CURVE_COLOR: str = 'blue'
+AXIS_COLOR: str = 'gray'
+
+
+class Plot(Canvas):
+    """Graphs the expression over `x` across the visible range, panned by dragging and zoomed with the mouse wheel.
+
+    Sampling runs a frame's worth at a time between Tk events, redrawing as it
+    goes, so the window stays responsive however costly the expression is. The
+    curve's line items are reused from one redraw to the next, only their
+    coordinates change.
+    """
+
+    def __init__(self, master: Application, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, master=master, background='white', highlightthickness=0, **kwargs)
+
+        self.view: View = DEFAULT_VIEW
+        self.tokens: Optional[tuple[str, ...]] = None
+        self.sampler: Optional[Sampler] = None
+        self.sampling: Optional[Iterator[None]] = None
+        self.sampling_pending: bool = False
+        self.redraw_pending: bool = False
+        self.drag_origin: tuple[int, int] = (0, 0)
+
+        self.axis_items: tuple[int, int] = (self.create_line(0, 0, 0, 0, fill=AXIS_COLOR), self.create_line(0, 0, 0, 0, fill=AXIS_COLOR))
+        # Line items of the curve, one per unbroken piece, those past the pieces drawn are hidden
+        self.curve_items: list[int] = []
+        self.shown_curve_items: int = 0
+
+        self.bind(sequence='<Configure>', func=self._on_resize)
+        self.bind(sequence='<ButtonPress-1>', func=self._on_drag_start)
+        self.bind(sequence='<B1-Motion>', func=self._on_drag)
+        self.bind(sequence='<MouseWheel>', func=self._on_zoom)
+        self.bind(sequence='<Button-4>', func=self._on_zoom)
+        self.bind(sequence='<Button-5>', func=self._on_zoom)
+
+    def refresh_expression(self) -> None:
+        """Graph the current expression, when it changed."""
+        tokens: tuple[str, ...] = tuple(self.master.calculator.expression.tokens)
+        if tokens == self.tokens:
+            return
+        self.tokens = tokens
+        try:
+            # Through the shared cache, which the evaluation workers use too, and within the budget of an evaluation
+            self.sampler = Sampler(program=compile_expression(tokens=tokens, guard=BudgetGuard())) if tokens else None
+        except (ArithmeticError, ValueError, IndexError):
+            # Expressions being typed are often incomplete, the last complete one stays until the next is
+            return
+        self.request_redraw()
+
+    def request_redraw(self) -> None:
+        """Redraw once Tk is idle, then sample what the view is missing, coalescing requests made before then."""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _redraw(self) -> None:
+        self.redraw_pending = False
+        # A new expression keeps the previous curve until its first samples are drawn, rather than flashing an empty plot
+        if self.sampler is None or len(self.sampler):
+            self._draw()
+        self.sampling = self.sampler.sample(view=self.view) if self.sampler is not None else None
+        if self.sampling is not None and not self.sampling_pending:
+            self.sampling_pending = True
+            self.after_idle(self._sample)
+
+    def _sample(self) -> None:
+        self.sampling_pending = False
+        if self.sampling is None:
+            return
+        deadline: float = time.perf_counter() + FRAME_BUDGET_SECONDS
+        for _ in self.sampling:
+            if time.perf_counter() > deadline:
+                self.sampling_pending = True
+                # A timer rather than an idle callback, so pending input events are handled first
+                self.after(1, self._sample)
+                break
+        else:
+            self.sampling = None
+        self._draw()
+
+    def _draw(self) -> None:
+        view: View = self.view
+        x_axis, y_axis = self.axis_items
+        y: float = view.y_max * view.height / (view.y_max - view.y_min)
+        x: float = -view.x_min * view.width / (view.x_max - view.x_min)
+        self.coords(x_axis, 0, y, view.width, y)
+        self.coords(y_axis, x, 0, x, view.height)
+
+        polylines: list[list[float]] = self.sampler.polylines(view=view) if self.sampler is not None else []
+        for index in range(len(polylines), self.shown_curve_items):
+            self.itemconfigure(self.curve_items[index], state='hidden')
+        for index, coordinates in enumerate(polylines):
+            if index == len(self.curve_items):
+                self.curve_items.append(self.create_line(*coordinates, fill=CURVE_COLOR, width=2))
+                continue
+            self.coords(self.curve_items[index], *coordinates)
+            if index >= self.shown_curve_items:
+                self.itemconfigure(self.curve_items[index], state='normal')
+        self.shown_curve_items = len(polylines)
+
+    def _on_resize(self, event: Event) -> None:
+        # Keep the scale of the x axis, and the y range
+        x_max: float = self.view.x_max
+        if self.view.width > 1:
+            x_max = self.view.x_min + (self.view.x_max - self.view.x_min) * event.width / self.view.width
+        self.view = self.view._replace(x_max=x_max, width=event.width, height=event.height)
+        self.request_redraw()
+
+    def _on_drag_start(self, event: Event) -> None:
+        self.drag_origin = (event.x, event.y)
+
+    def _on_drag(self, event: Event) -> None:
+        view: View = self.view
+        origin_x, origin_y = self.drag_origin
+        self.drag_origin = (event.x, event.y)
+        self.view = view.panned(
+            dx=(origin_x - event.x) * (view.x_max - view.x_min) / view.width,
+            dy=(event.y - origin_y) * (view.y_max - view.y_min) / view.height,
+        )
+        self.request_redraw()
+
+    def _on_zoom(self, event: Event) -> None:
+        view: View = self.view
+        zoom_in: bool = event.num == 4 or event.delta > 0
+        self.view = view.zoomed(
+            x=view.x_min + event.x * (view.x_max - view.x_min) / view.width,
+            y=view.y_max - event.y * (view.y_max - view.y_min) / view.height,
+            factor=1 / ZOOM_FACTOR if zoom_in else ZOOM_FACTOR,
+        )
+        self.request_redraw()
@@ -0,0 +1,66 @@
+import os
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional, TextIO
+
+from src.services.engine import evaluate_text
+
+DEFAULT_CHUNK_SIZE: int = 1024
+
+
+def available_cores() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def evaluate_line(line: str) -> str:
+    # Each worker process has its own engine cache, so repeated formulas are compiled once per process
+    try:
+        return str(evaluate_text(text=line))
+    except Exception as e:
+        return f'error: {type(e).__name__}: {e}'
+
+
+def evaluate_lines(lines: list[str]) -> list[str]:
+    return [evaluate_line(line=line) for line in lines]
+
+
+def chunked(lines: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    chunk: list[str] = []
+    for line in lines:
+        chunk.append(line.rstrip('\r\n'))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate_stream(lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None) -> Iterator[str]:
+    """Evaluate one expression per line, yielding one result per line in input order.
+
+    Chunks of lines are spread over a process pool. At most two chunks per worker
+    are in flight at any time, so memory stays bounded however long the input is.
+    """
+    workers = workers or available_cores()
+    if workers == 1:
+        for chunk in chunked(lines=lines, chunk_size=chunk_size):
+            yield from evaluate_lines(lines=chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[Future[list[str]]] = deque()
+        for chunk in chunked(lines=lines, chunk_size=chunk_size):
+            pending.append(executor.submit(evaluate_lines, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def evaluate_files(inputs: Iterable[TextIO], output: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: Optional[int] = None) -> None:
+    lines: Iterator[str] = (line for stream in inputs for line in stream)
+    for result in evaluate_stream(lines=lines, chunk_size=chunk_size, workers=workers):
+        output.write(result + '\n')
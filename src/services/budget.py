@@ -0,0 +1,35 @@
+import time
+
+from functools import partial
+from threading import Event
+from typing import NamedTuple, Optional
+
+from src.services.operations import DEFAULT_MAX_EXACT_BITS, DEFAULT_MAX_RESULT_BITS, BudgetExceededError, power
+
+DEFAULT_MAX_SECONDS: float = 2.0
+
+
+class EvaluationCancelledError(Exception):
+    pass
+
+
+class EvaluationBudget(NamedTuple):
+    max_seconds: float = DEFAULT_MAX_SECONDS
+    max_result_bits: int = DEFAULT_MAX_RESULT_BITS
+    max_exact_bits: int = DEFAULT_MAX_EXACT_BITS
+
+
+class BudgetGuard:
+    """Checked periodically by a running evaluation to enforce its budget and cancellation."""
+
+    def __init__(self, budget: EvaluationBudget = EvaluationBudget(), cancelled: Optional[Event] = None) -> None:
+        self.budget: EvaluationBudget = budget
+        self.cancelled: Optional[Event] = cancelled
+        self.deadline: float = time.thread_time() + budget.max_seconds
+        self.power = partial(power, max_result_bits=budget.max_result_bits, max_exact_bits=budget.max_exact_bits)
+
+    def check(self) -> None:
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise EvaluationCancelledError('Evaluation was cancelled')
+        if time.thread_time() > self.deadline:
+            raise BudgetExceededError(f'Evaluation took more than {self.budget.max_seconds} seconds of CPU time')
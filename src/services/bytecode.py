@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+import math
+
+from array import array
+from fractions import Fraction
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterable, Mapping, NamedTuple, Optional
+
+from src.services.operations import DEFAULT_MAX_EXACT_BITS, DEFAULT_MAX_RESULT_BITS, FUNCTIONS, OPERATORS, Number, parse_number
+from src.services.tokens import OPERATORS_TOKENS, SCIENTIFIC_FUNCTIONS, Token
+
+if TYPE_CHECKING:
+    from src.services.budget import BudgetGuard
+
+# Each instruction is a single int: the opcode in the low bits and, for
+# LOAD_CONST, LOAD_VARIABLE and the slot instructions, the index into the
+# constants, variables or slots table in the remaining ones.
+OPCODE_BITS: int = 4
+OPCODE_MASK: int = (1 << OPCODE_BITS) - 1
+
+LOAD_CONST: int = 0
+
+# Binary operators
+ADD: int = 1
+SUBTRACT: int = 2
+MULTIPLY: int = 3
+DIVIDE: int = 4
+POWER: int = 5
+
+# Scientific functions
+SIN: int = 6
+COS: int = 7
+TAN: int = 8
+SQRT: int = 9
+LOG: int = 10
+LN: int = 11
+EXP: int = 12
+
+LOAD_VARIABLE: int = 13
+
+# A subexpression used more than once is evaluated once, stored in a slot and loaded back
+LOAD_SLOT: int = 14
+STORE_SLOT: int = 15
+
+# Instructions executed between two checks of a budget guard
+GUARD_CHECK_INTERVAL: int = 4096
+# Quotients of exact values whose numerator and denominator fit in this many bits are kept as int pairs by `run`
+SMALL_EXACT_BITS: int = 62
+
+BINARY_OPCODES: dict[str, int] = {
+    Token.plus: ADD,
+    Token.minus: SUBTRACT,
+    Token.multiply: MULTIPLY,
+    Token.divide: DIVIDE,
+    Token.power: POWER,
+}
+
+UNARY_OPCODES: dict[str, int] = {
+    Token.sin: SIN,
+    Token.cos: COS,
+    Token.tan: TAN,
+    Token.sqrt: SQRT,
+    Token.log: LOG,
+    Token.ln: LN,
+    Token.exp: EXP,
+}
+
+# Operation implementations indexed by opcode, the loads have none
+OPERATIONS: list[Optional[Callable[..., Number]]] = [
+    {
+        **{opcode: OPERATORS[token] for token, opcode in BINARY_OPCODES.items()},
+        **{opcode: FUNCTIONS[token] for token, opcode in UNARY_OPCODES.items()},
+    }.get(opcode) for opcode in range(EXP + 1)
+]
+
+
+# Node of the expression graph built by `compile_postfix`: (LOAD_CONST, constant index),
+# (LOAD_VARIABLE, variable index), (unary opcode, operand id) or (binary opcode, left id, right id)
+Node = tuple[int, ...]
+
+
+class Program(NamedTuple):
+    code: array
+    constants: tuple[Number, ...]
+    variables: tuple[str, ...] = ()
+    slots: int = 0
+    # Whether the expression divides, only quotients turn exact values into rationals
+    divides: bool = False
+
+
+def compile_postfix(postfix: list[str], optimize: bool = True, guard: Optional[BudgetGuard] = None) -> Program:
+    """Compile a postfix token list, as built by `infix_to_postfix`, into a `Program`.
+
+    With `optimize`, the expression is first turned into a graph where identical
+    subexpressions are a single node, constant subexpressions are folded and the
+    identities x*1, 1*x, x/1, x^1, x+0, 0+x and x-0 are dropped. Constants are
+    folded with the operations `run` uses under `guard`, bounded by the same size
+    budgets, so the program must be run under a guard with the limits of
+    `operation_limits(guard)`. An operation that would raise is left to run time
+    so the error surfaces there. The identities differ from running the program
+    in one case only: x+0 and 0+x keep the sign of an x of -0.0.
+    """
+    if optimize:
+        return _compile_graph(postfix=postfix, operations=guarded_operations(guard=guard) if guard is not None else OPERATIONS)
+
+    code: array = array('i')
+    constants: list[Number] = []
+    constant_indexes: dict[str, int] = {}
+    variables: list[str] = []
+    depth: int = 0
+
+    for token in postfix:
+        # Check if token is a number (digit or contains comma for decimal)
+        if token.isdigit() or token == 'π' or ',' in token:
+            index: int = constant_indexes.get(token, -1)
+            if index == -1:
+                index = constant_indexes[token] = len(constants)
+                constants.append(parse_number(value=token))
+            code.append((index << OPCODE_BITS) | LOAD_CONST)
+            depth += 1
+        elif token in SCIENTIFIC_FUNCTIONS:
+            if depth < 1:
+                raise ValueError(f'Missing operand for {token}')
+            code.append(UNARY_OPCODES[token])
+        elif token in OPERATORS_TOKENS:
+            if depth < 2:
+                raise ValueError(f'Missing operand for {token}')
+            code.append(BINARY_OPCODES[token])
+            depth -= 1
+        elif token.isidentifier():
+            # x, or a named variable such as a column of a data file
+            if token not in variables:
+                variables.append(token)
+            code.append((variables.index(token) << OPCODE_BITS) | LOAD_VARIABLE)
+            depth += 1
+
+    if depth != 1:
+        raise ValueError('Expression does not reduce to a single value')
+    return Program(code=code, constants=tuple(constants), variables=tuple(variables), divides=Token.divide in postfix)
+
+
+def _compile_graph(postfix: list[str], operations: list[Optional[Callable[..., Number]]]) -> Program:
+    nodes: list[Node] = []
+    node_ids: dict[Node, int] = {}
+    # Operations using each node, a node used more than once gets a slot
+    uses: list[int] = []
+    constants: list[Number] = []
+    # Keyed by type and sign too, as 1 == 1.0 and 0.0 == -0.0
+    constant_ids: dict[tuple[Number, type, float], int] = {}
+    variables: list[str] = []
+    # Operands are 1-tuples holding the value while they are constants still to be folded, and node ids once they are not
+    stack: list[tuple[Number] | int] = []
+
+    def node_id(operand: tuple[Number] | int) -> int:
+        if type(operand) is int:
+            return operand
+        value: Number = operand[0]
+        key: tuple[Number, type, float] = (value, type(value), math.copysign(1.0, value) if type(value) is float else 1.0)
+        constant_id: int = constant_ids.get(key, -1)
+        if constant_id == -1:
+            constant_id = constant_ids[key] = add(node=(LOAD_CONST, len(constants)))
+            constants.append(value)
+        return constant_id
+
+    def add(node: Node) -> int:
+        existing: int = node_ids.get(node, -1)
+        if existing != -1:
+            return existing
+        for operand in node[1:] if node[0] != LOAD_CONST and node[0] != LOAD_VARIABLE else ():
+            uses[operand] += 1
+        node_ids[node] = len(nodes)
+        nodes.append(node)
+        uses.append(0)
+        return len(nodes) - 1
+
+    for token in postfix:
+        if token.isdigit() or token == 'π' or ',' in token:
+            stack.append((parse_number(value=token),))
+        elif token in SCIENTIFIC_FUNCTIONS:
+            if len(stack) < 1:
+                raise ValueError(f'Missing operand for {token}')
+            opcode: int = UNARY_OPCODES[token]
+            operand: tuple[Number] | int = stack[-1]
+            folded: Optional[tuple[Number]] = _fold(operation=operations[opcode], operands=operand) if type(operand) is tuple else None
+            stack[-1] = add(node=(opcode, node_id(operand=operand))) if folded is None else folded
+        elif token in OPERATORS_TOKENS:
+            if len(stack) < 2:
+                raise ValueError(f'Missing operand for {token}')
+            opcode = BINARY_OPCODES[token]
+            right: tuple[Number] | int = stack.pop()
+            left: tuple[Number] | int = stack[-1]
+            left_constant: bool = type(left) is tuple
+            right_constant: bool = type(right) is tuple
+            folded = _fold(operation=operations[opcode], operands=left + right) if left_constant and right_constant else None
+            if folded is not None:
+                stack[-1] = folded
+            elif right_constant and (right[0] == 1 and opcode in (MULTIPLY, DIVIDE, POWER) or right[0] == 0 and opcode in (ADD, SUBTRACT)):
+                stack[-1] = left
+            elif left_constant and (left[0] == 1 and opcode == MULTIPLY or left[0] == 0 and opcode == ADD):
+                stack[-1] = right
+            else:
+                stack[-1] = add(node=(opcode, node_id(operand=left), node_id(operand=right)))
+        elif token.isidentifier():
+            # x, or a named variable such as a column of a data file
+            if token not in variables:
+                variables.append(token)
+            stack.append(add(node=(LOAD_VARIABLE, variables.index(token))))
+
+    if len(stack) != 1:
+        raise ValueError('Expression does not reduce to a single value')
+    root: int = node_id(operand=stack[0])
+    code, slots = _emit(nodes=nodes, uses=uses, root=root)
+    return Program(code=code, constants=tuple(constants), variables=tuple(variables), slots=slots, divides=Token.divide in postfix)
+
+
+def _fold(operation: Callable[..., Number], operands: tuple[Number, ...]) -> Optional[tuple[Number]]:
+    try:
+        return (operation(*operands),)
+    except (ArithmeticError, ValueError):
+        return None
+
+
+def guarded_operations(guard: BudgetGuard) -> list[Optional[Callable[..., Number]]]:
+    """Operation implementations indexed by opcode, bounded by the size budgets of `guard`."""
+    operations: list[Optional[Callable[..., Number]]] = list(OPERATIONS)
+    for token, opcode in BINARY_OPCODES.items():
+        operations[opcode] = partial(OPERATORS[token], max_exact_bits=guard.budget.max_exact_bits)
+    operations[POWER] = guard.power
+    return operations
+
+
+def operation_limits(guard: Optional[BudgetGuard]) -> tuple[int, int]:
+    """Largest power result and exact value, in bits, the operations run under `guard` allow; programs compiled for one are keyed by it."""
+    if guard is None:
+        return DEFAULT_MAX_RESULT_BITS, DEFAULT_MAX_EXACT_BITS
+    return guard.budget.max_result_bits, guard.budget.max_exact_bits
+
+
+def _emit(nodes: list[Node], uses: list[int], root: int) -> tuple[array, int]:
+    """Code of the graph from `root` and its number of slots, every operation used more than once is stored in one."""
+    code: array = array('i')
+    append = code.append
+    slots: dict[int, int] = {}
+
+    # Post-order walk without recursion, as the graph can be as deep as the expression is long
+    walk: list[tuple[int, bool]] = [(root, False)]
+    while walk:
+        node_id, operands_emitted = walk.pop()
+        node: Node = nodes[node_id]
+        opcode: int = node[0]
+        if opcode == LOAD_CONST or opcode == LOAD_VARIABLE:
+            append((node[1] << OPCODE_BITS) | opcode)
+        elif node_id in slots:
+            append((slots[node_id] << OPCODE_BITS) | LOAD_SLOT)
+        elif not operands_emitted:
+            walk.append((node_id, True))
+            walk.extend((operand, False) for operand in reversed(node[1:]))
+        else:
+            append(opcode)
+            if uses[node_id] > 1:
+                slots[node_id] = len(slots)
+                append((slots[node_id] << OPCODE_BITS) | STORE_SLOT)
+    return code, len(slots)
+
+
+def run(program: Program, variables: Optional[Mapping[str, float]] = None, guard: Optional[BudgetGuard] = None) -> Number:
+    """Execute `program` on an explicit value stack, without recursion.
+
+    With a `guard`, its budget and cancellation are checked every `GUARD_CHECK_INTERVAL`
+    instructions, powers are bounded by its result size budget and exact values by its
+    exact size budget.
+    """
+    try:
+        values: list[Number] = [(variables or {})[name] for name in program.variables]
+    except KeyError as e:
+        raise NameError(f'Variable {e.args[0]} has no value') from None
+    stack: list[Number | tuple[int, int]] = []
+    slots: list[Number | tuple[int, int]] = [0] * program.slots
+    max_exact_bits: int = guard.budget.max_exact_bits if guard is not None else DEFAULT_MAX_EXACT_BITS
+    # Other programs make no rationals, they are left the plain loop whose float arithmetic is faster
+    execute: Callable[..., None] = (
+        partial(_execute_exact, small=1 << min(SMALL_EXACT_BITS, max_exact_bits))
+        if program.divides and any(type(constant) is not float for constant in program.constants) else _execute
+    )
+
+    if guard is None:
+        execute(code=program.code, constants=program.constants, values=values, slots=slots, operations=OPERATIONS, stack=stack)
+    else:
+        operations: list[Optional[Callable[..., Number]]] = guarded_operations(guard=guard)
+        for start in range(0, len(program.code), GUARD_CHECK_INTERVAL):
+            guard.check()
+            execute(
+                code=program.code[start:start + GUARD_CHECK_INTERVAL],
+                constants=program.constants,
+                values=values,
+                slots=slots,
+                operations=operations,
+                stack=stack,
+            )
+
+    return _number(value=stack[0])
+
+
+def _execute(
+    code: Iterable[int],
+    constants: tuple[Number, ...],
+    values: list[Number],
+    slots: list[Number],
+    operations: list[Optional[Callable[..., Number]]],
+    stack: list[Number],
+) -> None:
+    push = stack.append
+    pop = stack.pop
+
+    for instruction in code:
+        opcode: int = instruction & OPCODE_MASK
+        if opcode == LOAD_CONST:
+            push(constants[instruction >> OPCODE_BITS])
+        elif opcode <= POWER:
+            right: Number = pop()
+            stack[-1] = operations[opcode](stack[-1], right)
+        elif opcode <= EXP:
+            stack[-1] = operations[opcode](stack[-1])
+        elif opcode == LOAD_VARIABLE:
+            push(values[instruction >> OPCODE_BITS])
+        elif opcode == LOAD_SLOT:
+            push(slots[instruction >> OPCODE_BITS])
+        else:
+            slots[instruction >> OPCODE_BITS] = stack[-1]
+
+
+def _execute_exact(
+    code: Iterable[int],
+    constants: tuple[Number, ...],
+    values: list[Number],
+    slots: list[Number | tuple[int, int]],
+    operations: list[Optional[Callable[..., Number]]],
+    stack: list[Number | tuple[int, int]],
+    small: int,
+) -> None:
+    """`_execute`, with the quotients of ints below `small` kept as (numerator, denominator) pairs.
+
+    Fraction arithmetic costs several times float arithmetic, mostly in creating
+    and normalizing Fraction instances. Pairs are combined inline and reduced only
+    when they outgrow `small`, and turned into a `Number` when an operation other
+    than +, -, * and / uses them. Below `small` the exact size budget cannot be
+    exceeded, so the results are those of the operations.
+    """
+    push = stack.append
+    pop = stack.pop
+
+    for instruction in code:
+        opcode: int = instruction & OPCODE_MASK
+        if opcode == LOAD_CONST:
+            push(constants[instruction >> OPCODE_BITS])
+        elif opcode <= POWER:
+            right: Number | tuple[int, int] = pop()
+            left: Number | tuple[int, int] = stack[-1]
+            if type(left) is tuple or type(right) is tuple:
+                stack[-1] = _pair_operation(opcode=opcode, left=left, right=right, small=small, operation=operations[opcode])
+            elif opcode == DIVIDE and type(left) is int and type(right) is int and right and abs(left) < small and abs(right) < small:
+                # A new rational, left unreduced
+                stack[-1] = (left, right) if right > 0 else (-left, -right)
+            else:
+                stack[-1] = operations[opcode](left, right)
+        elif opcode <= EXP:
+            operand: Number | tuple[int, int] = stack[-1]
+            stack[-1] = operations[opcode](operand if type(operand) is not tuple else _number(value=operand))
+        elif opcode == LOAD_VARIABLE:
+            push(values[instruction >> OPCODE_BITS])
+        elif opcode == LOAD_SLOT:
+            push(slots[instruction >> OPCODE_BITS])
+        else:
+            slots[instruction >> OPCODE_BITS] = stack[-1]
+
+
+def _pair_operation(
+    opcode: int,
+    left: Number | tuple[int, int],
+    right: Number | tuple[int, int],
+    small: int,
+    operation: Callable[[Number, Number], Number],
+) -> Number | tuple[int, int]:
+    """`left` and `right`, one a (numerator, denominator) pair, combined as a pair while the result is small, by `operation` otherwise."""
+    if opcode == POWER or type(left) is not tuple and type(left) is not int or type(right) is not tuple and type(right) is not int:
+        return operation(_number(value=left), _number(value=right))
+    left_numerator, left_denominator = left if type(left) is tuple else (left, 1)
+    right_numerator, right_denominator = right if type(right) is tuple else (right, 1)
+    if opcode == ADD:
+        numerator: int = left_numerator * right_denominator + right_numerator * left_denominator
+        denominator: int = left_denominator * right_denominator
+    elif opcode == SUBTRACT:
+        numerator = left_numerator * right_denominator - right_numerator * left_denominator
+        denominator = left_denominator * right_denominator
+    elif opcode == MULTIPLY:
+        numerator = left_numerator * right_numerator
+        denominator = left_denominator * right_denominator
+    elif right_numerator:
+        numerator = left_numerator * right_denominator
+        denominator = left_denominator * right_numerator
+        if denominator < 0:
+            numerator, denominator = -numerator, -denominator
+    else:
+        # Division by zero, raised by the operation
+        return operation(_number(value=left), 0)
+
+    # Reduced only once they outgrow `small`, as the gcd costs more than the arithmetic
+    if not -small < numerator < small or denominator >= small:
+        divisor: int = math.gcd(numerator, denominator)
+        numerator //= divisor
+        denominator //= divisor
+        if not -small < numerator < small or denominator >= small:
+            return operation(_number(value=left), _number(value=right))
+    return numerator if denominator == 1 else (numerator, denominator)
+
+
+def _number(value: Number | tuple[int, int]) -> Number:
+    """`value`, when it is a (numerator, denominator) pair of `_execute_exact`, as an int or Fraction."""
+    if type(value) is not tuple:
+        return value
+    fraction: Fraction = Fraction(*value)
+    return fraction.numerator if fraction.denominator == 1 else fraction
@@ -0,0 +1,238 @@
+"""Append-only on-disk log of committed calculations, read through `mmap`.
+
+The file starts with `MAGIC` and holds one binary record per calculation:
+
+    crc32      u32   of everything after it in the record
+    expression u32   length in bytes
+    result     u32   length in bytes
+    timestamp  f64   seconds since the epoch
+    mode       u8    1 in scientific mode
+    expression and result, UTF-8
+
+Records are only ever appended, so opening the log scans their headers for
+their offsets and nothing else. A record torn by a crash can only be the last
+one, and is dropped when nothing follows it; a log corrupt anywhere else is
+left as it is and raises ValueError. Several processes can append to the same
+log, each picks up the records of the others as it appends its own. Records
+are decoded on demand, the most recently read are kept in a cache. The
+trigram index used by `search` is built the first time it is needed and kept
+up to date with appends.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from array import array
+from collections import Counter
+from logging import Logger, getLogger
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+from src.utils.lru_cache import LRUCache
+
+logger: Logger = getLogger(name=__name__)
+
+MAGIC: bytes = b'CALCLOG\x01'
+RECORD_HEADER: struct.Struct = struct.Struct('<IIIdB')
+# Bytes of the record header covered by its checksum, the checksum itself excluded
+CHECKSUMMED_HEADER: slice = slice(4, RECORD_HEADER.size)
+
+DEFAULT_HISTORY_PATH: str = os.path.join(os.path.expanduser('~'), '.calculator_history')
+RECENT_RECORDS_CACHE_SIZE: int = 256
+TRIGRAM: int = 3
+# Recent calculations counted when looking for the most frequently used expressions
+FREQUENT_EXPRESSIONS_WINDOW: int = 1_000
+
+
+class Record(NamedTuple):
+    expression: str
+    result: int | float
+    timestamp: float
+    scientific_mode: bool
+
+
+class CalculationLog:
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH) -> None:
+        self.path: str = path
+        self.records: LRUCache[int, Record] = LRUCache(maxsize=RECENT_RECORDS_CACHE_SIZE)
+        # Offset of every record, then the end of the last one
+        self._offsets: array = array('Q', [len(MAGIC)])
+        self._map: Optional[mmap.mmap] = None
+        self._trigrams: dict[str, array] = {}
+        self._indexed: int = 0
+
+        self._file: BinaryIO = open(path, 'a+b')
+        try:
+            size: int = self._file.seek(0, os.SEEK_END)
+            if size == 0:
+                self._file.write(MAGIC)
+                self._file.flush()
+            else:
+                self._map_file()
+                if self._map[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f'{path} is not a calculation log')
+                self._scan()
+        except BaseException:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __enter__(self) -> CalculationLog:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def append(self, expression: str, result: int | float, scientific_mode: bool, timestamp: Optional[float] = None) -> None:
+        encoded_expression: bytes = expression.encode()
+        encoded_result: bytes = str(result).encode()
+        header: bytes = RECORD_HEADER.pack(
+            0, len(encoded_expression), len(encoded_result), time.time() if timestamp is None else timestamp, scientific_mode
+        )
+        checksum: int = zlib.crc32(encoded_result, zlib.crc32(encoded_expression, zlib.crc32(header[CHECKSUMMED_HEADER])))
+        record: bytes = struct.pack('<I', checksum) + header[4:] + encoded_expression + encoded_result
+        self._file.write(record)
+        self._file.flush()
+        # Appends go to the end of the file, wherever other processes writing the same log left it
+        start: int = self._file.tell() - len(record)
+        if start != self._offsets[-1]:
+            self._map_file()
+            if self._scan_headers(start=self._offsets[-1], stop=start) != start:
+                raise ValueError(f'Records appended to {self.path} by another process are corrupt')
+        self._offsets.append(start + len(record))
+        if self._indexed == len(self) - 1:
+            self._index(index=self._indexed, expression=expression)
+            self._indexed += 1
+
+    def record(self, index: int) -> Record:
+        """The `index`-th record, oldest first, raising ValueError when it is corrupt."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('record index out of range')
+        record: Optional[Record] = self.records.get(key=index)
+        if record is None:
+            offset: int = self._offsets[index]
+            checksum, expression_length, result_length, timestamp, scientific_mode = RECORD_HEADER.unpack_from(self._mapped(), offset)
+            body: bytes = self._map[offset + RECORD_HEADER.size:self._offsets[index + 1]]
+            if zlib.crc32(body, zlib.crc32(self._map[offset + CHECKSUMMED_HEADER.start:offset + RECORD_HEADER.size])) != checksum:
+                raise ValueError(f'Record {index} of {self.path} is corrupt')
+            result: str = body[expression_length:].decode()
+            record = Record(
+                expression=body[:expression_length].decode(),
+                result=int(result) if result.lstrip('-').isdigit() else float(result),
+                timestamp=timestamp,
+                scientific_mode=bool(scientific_mode),
+            )
+            self.records.put(key=index, value=record)
+        return record
+
+    def recent(self, count: int) -> list[Record]:
+        """The last `count` records, newest first."""
+        return [self.record(index=index) for index in range(len(self) - 1, max(-1, len(self) - 1 - count), -1)]
+
+    def search(self, query: str, prefix: bool = False, limit: int = 50) -> list[Record]:
+        """Records whose expression contains `query`, or starts with it with `prefix`, newest first."""
+        candidates: Iterator[int] = reversed(range(len(self)))
+        if len(query) >= TRIGRAM:
+            self._update_index()
+            # Records with the rarest trigram of the query, each one is checked below anyway
+            candidates = reversed(
+                min((self._trigrams.get(query[i:i + TRIGRAM], array('I')) for i in range(len(query) - TRIGRAM + 1)), key=len)
+            )
+
+        found: list[Record] = []
+        for index in candidates:
+            if len(found) == limit:
+                break
+            record: Record = self.record(index=index)
+            if record.expression.startswith(query) if prefix else query in record.expression:
+                found.append(record)
+        return found
+
+    def frequent_expressions(self, count: int, window: int = FREQUENT_EXPRESSIONS_WINDOW) -> list[str]:
+        """The `count` expressions calculated most often among the last `window` records."""
+        expressions: Counter[str] = Counter(self._expression(index=index) for index in range(max(0, len(self) - window), len(self)))
+        return [expression for expression, _ in expressions.most_common(count)]
+
+    def _map_file(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _mapped(self) -> mmap.mmap:
+        """The file mapping, mapped again when records were appended past its end."""
+        if self._map is None or len(self._map) < self._offsets[-1]:
+            self._map_file()
+        return self._map
+
+    def _scan(self) -> None:
+        size: int = len(self._map)
+        offset: int = self._scan_headers(start=len(MAGIC), stop=size)
+        if offset != size:
+            # A crash while appending leaves a prefix of the last record, anything else is corruption the file is kept for
+            if any(self._valid_record(offset=start, stop=size) for start in range(offset + 1, size - RECORD_HEADER.size + 1)):
+                raise ValueError(f'{self.path} is corrupt at byte {offset}')
+            logger.warning(msg=f'Dropping the torn last record of {self.path}')
+            self._map.close()
+            self._map = None
+            self._file.truncate(offset)
+            self._file.seek(0, os.SEEK_END)
+        elif len(self) and not self._intact(index=len(self) - 1):
+            raise ValueError(f'The last record of {self.path} is corrupt')
+
+    def _scan_headers(self, start: int, stop: int) -> int:
+        """Add the offsets of the whole records from `start` to `stop`, returning where the last one ends."""
+        offset: int = start
+        while offset + RECORD_HEADER.size <= stop:
+            _, expression_length, result_length, _, _ = RECORD_HEADER.unpack_from(self._map, offset)
+            end: int = offset + RECORD_HEADER.size + expression_length + result_length
+            if end > stop:
+                break
+            self._offsets.append(end)
+            offset = end
+        return offset
+
+    def _valid_record(self, offset: int, stop: int) -> bool:
+        """Whether a whole record with a matching checksum starts at `offset`."""
+        checksum, expression_length, result_length, _, _ = RECORD_HEADER.unpack_from(self._map, offset)
+        end: int = offset + RECORD_HEADER.size + expression_length + result_length
+        return end <= stop and zlib.crc32(self._map[offset + CHECKSUMMED_HEADER.start:end]) == checksum
+
+    def _intact(self, index: int) -> bool:
+        try:
+            self.record(index=index)
+        except (ValueError, UnicodeDecodeError):
+            return False
+        return True
+
+    def _expression(self, index: int) -> str:
+        """Expression of a record, decoded without its result nor checksum."""
+        record: Optional[Record] = self.records.get(key=index)
+        if record is not None:
+            return record.expression
+        offset: int = self._offsets[index]
+        _, expression_length, _, _, _ = RECORD_HEADER.unpack_from(self._mapped(), offset)
+        start: int = offset + RECORD_HEADER.size
+        return self._map[start:start + expression_length].decode(errors='replace')
+
+    def _update_index(self) -> None:
+        while self._indexed < len(self):
+            self._index(index=self._indexed, expression=self._expression(index=self._indexed))
+            self._indexed += 1
+
+    def _index(self, index: int, expression: str) -> None:
+        for trigram in {expression[i:i + TRIGRAM] for i in range(len(expression) - TRIGRAM + 1)}:
+            self._trigrams.setdefault(trigram, array('I')).append(index)
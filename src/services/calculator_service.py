@@ -1,293 +1,264 @@
-
-import math
-
-from dataclasses import MISSING, dataclass, field
-from enum import StrEnum
-from logging import Logger, getLogger
-from typing import Optional, Self
-
-logger: Logger = getLogger(name=__name__)
-
-
-@dataclass
-class ExpressionTreeNode:
-    value: str = field(default=MISSING)
-    left: Optional[Self] = field(default=None)
-    right: Optional[Self] = field(default=None)
-
-
-class Token(StrEnum):
-
-    # Digits
-    zero: str = '0'
-    one: str = '1'
-    two: str = '2'
-    three: str = '3'
-    four: str = '4'
-    five: str = '5'
-    six: str = '6'
-    seven: str = '7'
-    eight: str = '8'
-    nine: str = '9'
-
-    # Operators
-    plus: str = '+'
-    minus: str = '-'
-    multiply: str = '*'
-    divide: str = '/'
-    negate: str = '+/-'
-
-    # Other
-    parenthesis: str = '()'
-    decimal: str = ','
-
-    # Scientific functions
-    sin: str = 'sin'
-    cos: str = 'cos'
-    tan: str = 'tan'
-    sqrt: str = '√'
-    power: str = '^'
-    log: str = 'log'
-    ln: str = 'ln'
-    exp: str = 'e^x'
-    pi: str = 'π'
-
-
-DIGIT_TOKENS: set[Token] = {token for token in Token if token.value.isdigit()}
-OPERATORS_TOKENS: set[Token] = {Token.plus, Token.minus, Token.multiply, Token.divide, Token.power}
-SCIENTIFIC_FUNCTIONS: set[Token] = {Token.sin, Token.cos, Token.tan, Token.sqrt, Token.log, Token.ln, Token.exp}
+from __future__ import annotations
+
+from functools import partial
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+from src.services.bytecode import Program, compile_postfix, run
+from src.services.engine import (
+    COMPILED_EXPRESSIONS_CACHE_SIZE,
+    CompiledExpressionKey,
+    Edit,
+    compile_expression,
+    edit_for_text,
+    edit_for_token,
+    infix_to_postfix,
+    normalize_result,
+)
+from src.services.expression_buffer import ExpressionBuffer
+from src.services.history import EditHistory, Step
+from src.services.incremental_parser import IncrementalParser
+from src.services.operations import BudgetExceededError
+from src.services.tokens import Token, tokenize
+
+from src.utils.lazy_logger import LazyLogger
+from src.utils.lru_cache import LRUCache
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from src.services.budget import BudgetGuard
+    from src.services.calculation_log import CalculationLog
+    from src.services.vectorized import BatchResult
+
+    from src.utils.metrics import Metrics
+
+# Created on first use, headless imports of the calculator do not load logging
+logger: LazyLogger = LazyLogger(name=__name__)
+
+EvaluationTask = Callable[[Optional['BudgetGuard']], float]
+
+# Pipeline stages timed once metrics are enabled, by name of the method implementing them
+INSTRUMENTED_STAGES: dict[str, str] = {
+    'send_token': 'send_token',
+    'infix_to_postfix': '_infix_to_postfix',
+    'compile': '_compile_postfix',
+    'run': '_run_program',
+    'preview': '_evaluate_state',
+}
 
 
 class CalculatorService:
 
-    def __init__(self) -> None:
-        self.expression: list[str] = []
+    def __init__(
+        self, compiled_expressions: Optional[LRUCache[CompiledExpressionKey, Program]] = None, log: Optional[CalculationLog] = None
+    ) -> None:
+        self.expression: ExpressionBuffer = ExpressionBuffer()
+        self.history: EditHistory = EditHistory()
+        self.compiled_expressions: LRUCache[CompiledExpressionKey, Program] = (
+            compiled_expressions if compiled_expressions is not None else LRUCache(maxsize=COMPILED_EXPRESSIONS_CACHE_SIZE)
+        )
+        # Evaluation tasks compile on worker threads while the UI thread warms up or previews
+        self.compiled_expressions_lock: Lock = Lock()
         self.last_result: float = 0.0
         self.scientific_mode: bool = False
+        self.metrics: Optional[Metrics] = None
+        self.log: Optional[CalculationLog] = log
 
     @property
     def last_element(self) -> str:
-        if len(self.expression) > 0:
-            return self.expression[-1]
-        return ''
+        return self.expression.last_element
 
     @property
     def number_of_open_parenthesis(self) -> int:
-        number_of_open_parenthesis: int = 0
-        for token in self.expression:
-            if token == '(':
-                number_of_open_parenthesis += 1
-            elif token == ')':
-                number_of_open_parenthesis -= 1
-        return number_of_open_parenthesis
+        return self.expression.depth
 
     def send_token(self, token: Token) -> None:
-        if token == Token.parenthesis:
-            if self.last_element == '':
-                self.expression += ['(']
-            elif self.last_element.isdigit():
-                if self.number_of_open_parenthesis == 0:
-                    self.expression += ['*', '(']
-                else:
-                    self.expression += [')']
-            else:
-                self.expression += ['(']
-        elif token == Token.pi:
-            if self.last_element == ')' or self.last_element.isdigit():
-                self.expression += ['*', 'π']
-            else:
-                self.expression += ['π']
-        elif token in SCIENTIFIC_FUNCTIONS:
-            if self.last_element == ')' or self.last_element.isdigit():
-                self.expression += ['*', token.value, '(']
-            else:
-                self.expression += [token.value, '(']
-        elif token == Token.negate:
-            if self.last_element.isdigit():
-                last_digit_index: int = -1
-                while self.expression[last_digit_index].isdigit() or self.expression[last_digit_index] == ',':
-                    last_digit_index += -1
-                    if last_digit_index == -len(self.expression):
-                        break
-                self.expression = self.expression[:last_digit_index-1] + '-(' + self.expression[last_digit_index:]
-            elif self.last_element == '(':
-                self.expression += ['-']
-            else:
-                self.expression += ['(-']
-        elif token == Token.decimal:
-            if self.last_element.isdigit():
-                is_decimal_number: bool = False
-                last_digit_index: int = -1
-                while last_digit_index > -len(self.expression):
-                    if self.expression[last_digit_index] == ',':
-                        is_decimal_number = True
-                        break
-                    elif not self.expression[last_digit_index].isdigit():
-                        break
-                    last_digit_index += -1
-                if is_decimal_number:
-                    logger.warning(msg='That will result in a invalid expression')
-                else:
-                    self.expression += [',']
-            else:
-                self.expression = ['0', ',']
-        elif token in DIGIT_TOKENS:
-            if self.last_element == ')':
-                self.expression += ['*', token.value]
-            else:
-                self.expression += [token.value]
-        elif token in OPERATORS_TOKENS:
-            if self.last_element == '' or self.last_element == '(':
-                logger.warning(msg='That will result in a invalid expression')
-            elif self.last_element in OPERATORS_TOKENS:
-                self.expression[-1] = token.value
-            else:
-                self.expression += [token.value]
+        edit: Optional[Edit] = edit_for_token(
+            token=token,
+            tokens=self.expression,
+            depth=self.expression.depth,
+            number_start=self.expression.number_start,
+            number_has_decimal=self.expression.number_has_decimal,
+        )
+        if edit is not None:
+            self._apply(edit=edit)
+
+    def insert_text(self, text: str) -> None:
+        """Append an expression written in calculator syntax, such as pasted text, in one go.
+
+        Raises ValueError, leaving the expression untouched, when `text` is not in calculator syntax.
+        """
+        self._apply(edit=edit_for_text(text=text, tokens=self.expression))
 
     def backspace_expression(self) -> None:
         if len(self.expression) > 0:
-            self.expression.pop()
+            self._apply(edit=Edit(start=len(self.expression) - 1, stop=len(self.expression), tokens=[]))
+
+    def undo(self) -> bool:
+        """Go back to the expression before the last edit, returning whether there was one."""
+        return self._restore(step=self.history.undo())
+
+    def redo(self) -> bool:
+        """Apply the last undone edit again, returning whether there was one."""
+        return self._restore(step=self.history.redo())
+
+    def _apply(self, edit: Edit) -> None:
+        if self.expression.tokens[edit.start:edit.stop] == edit.tokens:
+            # Nothing to undo, e.g. an operator replaced with itself
+            return
+        self.history.record(edit=edit)
+        self.expression.splice(start=edit.start, stop=edit.stop, tokens=edit.tokens)
+
+    def _restore(self, step: Optional[Step]) -> bool:
+        if step is None:
+            return False
+        # Only the tokens after the prefix both states share are replayed
+        self.expression.truncate(length=step.start)
+        self.expression.extend(tokens=step.version.tail(start=step.start))
+        return True
 
     def get_expression(self) -> str:
-        return ''.join(self.expression)
+        return self.expression.text
+
+    def get_expression_length(self) -> int:
+        return self.expression.text_length
+
+    def get_expression_window(self, characters: int, offset: int = 0) -> str:
+        """The last `characters` characters of the expression text, ending `offset` characters before its end."""
+        return self.expression.text_window(stop=self.expression.text_length - offset, characters=characters)
 
     def evalutate_expression(self) -> int | float:
-        try:
-            if len(self.expression) == 0:
-                self.last_result = 0.0
+        tokens: tuple[str, ...] = tuple(self.expression.tokens)
+        outcome: float | Exception = self._run_task(task=self.evaluation_task())
+        result: int | float = self.accept_result(outcome=outcome)
+        if not isinstance(outcome, Exception):
+            self.record_calculation(tokens=tokens, result=result)
+        return result
+
+    def preview_result(self) -> int | float:
+        """Same result as `evalutate_expression`, read from the incremental parser state."""
+        return self.accept_result(outcome=self._run_task(task=self.preview_task()))
+
+    def evaluation_task(self) -> EvaluationTask:
+        """Full evaluation of a snapshot of the current expression, which can run on another thread."""
+        tokens: tuple[str, ...] = tuple(self.expression.tokens)
+        if len(tokens) == 0:
+            return lambda guard=None: 0.0
+        return lambda guard=None: self._run_program(program=self.compile_expression(tokens=tokens, guard=guard), guard=guard)
+
+    def preview_task(self) -> EvaluationTask:
+        """Preview evaluation of the current parser state, which can run on another thread."""
+        if len(self.expression) == 0:
+            return lambda guard=None: 0.0
+        return partial(self._evaluate_state, self.expression.parser.state)
+
+    def accept_result(self, outcome: float | Exception) -> int | float:
+        """Record the outcome of an evaluation task, keeping the last result when it failed."""
+        if isinstance(outcome, Exception):
+            logger.warning(msg=f'Could not calculate result due to malformed expression. Reason: {outcome}')
+        else:
+            self.last_result = outcome
+        return self._normalize_result(value=self.last_result)
+
+    def record_calculation(self, tokens: tuple[str, ...], result: int | float) -> None:
+        """Append a committed calculation to the log, when there is one."""
+        if self.log is not None and tokens:
+            try:
+                self.log.append(expression=''.join(tokens), result=result, scientific_mode=self.scientific_mode)
+            except OSError as e:
+                logger.warning(msg=f'Could not record the calculation in {self.log.path}: {e}')
+
+    def warm_up(self, expressions: Iterable[str], guard: Optional[BudgetGuard] = None) -> int:
+        """Compile `expressions`, written in calculator syntax, ahead of their first evaluation and return how many were.
+
+        Programs are compiled for the operation limits of `guard`, as evaluations under
+        the same budget look them up, and compiling stops once its time is spent.
+        """
+        compiled: int = 0
+        for expression in expressions:
+            try:
+                if guard is not None:
+                    guard.check()
+            except BudgetExceededError:
+                break
+            try:
+                self.compile_expression(tokens=tuple(tokenize(text=expression)), guard=guard)
+            except (ArithmeticError, ValueError, IndexError, KeyError) as e:
+                logger.warning(msg=f'Could not compile {expression!r} ahead of time: {e}')
             else:
-                self.last_result = self._evaluate_expression_tree(
-                    node=self._postfix_to_tree(
-                        postfix=self._infix_to_postfix(
-                            infix=self.expression
-                        )
-                    )
-                )
-        except Exception as e:
-            logger.warning(msg=f'Could not calculate result due to malformed expression. Reason: {e}')
-        finally:
-            return self._normalize_result(value=self.last_result)
+                compiled += 1
+        return compiled
+
+    def evaluate_tokens(self, tokens: tuple[str, ...]) -> int | float:
+        """Evaluate `tokens` independently of the current expression, letting errors propagate."""
+        if len(tokens) == 0:
+            raise ValueError('Empty expression')
+        return self._normalize_result(value=self._run_program(program=self.compile_expression(tokens=tokens)))
+
+    def compile_expression(self, tokens: tuple[str, ...], guard: Optional[BudgetGuard] = None) -> Program:
+        # Through the service's own cache and its stages, so that metrics time them
+        return compile_expression(
+            tokens=tokens,
+            guard=guard,
+            cache=self.compiled_expressions,
+            lock=self.compiled_expressions_lock,
+            to_postfix=self._infix_to_postfix,
+            to_program=self._compile_postfix,
+        )
+
+    def evaluate_batch(self, values: np.ndarray) -> BatchResult:
+        """Evaluate the current expression for every value of `x` in one vectorized pass.
+
+        Requires NumPy. Elements whose evaluation fails are flagged in the returned
+        errors mask instead of raising.
+        """
+        from src.services.vectorized import run_vectorized
+
+        return run_vectorized(program=self.compile_expression(tokens=tuple(self.expression.tokens)), variables={Token.variable: values})
 
     def clear_expression(self) -> None:
-        self.expression = []
+        self._apply(edit=Edit(start=0, stop=len(self.expression), tokens=[]))
 
     def toggle_mode(self) -> None:
         self.scientific_mode = not self.scientific_mode
 
-    def _normalize_result(self, value: float) -> int | float:
-        return int(value) if value.is_integer() else value
+    def enable_metrics(self) -> Metrics:
+        """Start timing the pipeline stages, which are left untouched while metrics are disabled."""
+        # Imported here, metrics are off unless asked for
+        from src.utils.metrics import Metrics
 
-    @staticmethod
-    def _precedence(operator: str) -> int:
-        if operator in {Token.plus, Token.minus}:
-            return 1
-        elif operator in {Token.multiply, Token.divide}:
-            return 2
-        elif operator == Token.power:
-            return 3
-        elif operator in SCIENTIFIC_FUNCTIONS:
-            return 4
-        else:
-            return 5
-
-    def _infix_to_postfix(self, infix: list[str]) -> list[str]:
-        output_queue: list[str] = []
-        operator_stack: list[str] = []
-
-        i = 0
-        while i < len(infix):
-            token = infix[i]
-            
-            # Combine consecutive digits and commas into a single number
-            if token.isdigit():
-                number = token
-                i += 1
-                while i < len(infix) and (infix[i].isdigit() or infix[i] == ','):
-                    number += infix[i]
-                    i += 1
-                output_queue.append(number)
-                continue
-            elif token == 'π':
-                output_queue.append(token)
-            elif token == '(':
-                operator_stack.append(token)
-            elif token == ')':
-                while operator_stack[-1] != '(':
-                    output_queue.append(operator_stack.pop())
-                operator_stack.pop()
-            elif token in SCIENTIFIC_FUNCTIONS:
-                operator_stack.append(token)
-            elif token in OPERATORS_TOKENS:
-                operator_one: str = token
-                while operator_stack and operator_stack[-1] in OPERATORS_TOKENS:
-                    operator_two: str = operator_stack[-1]
-                    if (self._precedence(operator_one) <= self._precedence(operator_two) and operator_one != '-') or (self._precedence(operator_one) < self._precedence(operator_two) and operator_one == '-'):
-                        output_queue.append(operator_stack.pop())
-                    else:
-                        break
-                operator_stack.append(token)
-            
-            i += 1
-
-        while operator_stack:
-            output_queue.append(operator_stack.pop())
-
-        return output_queue
+        if self.metrics is None:
+            self.metrics = Metrics()
+            for stage, method in INSTRUMENTED_STAGES.items():
+                length: Optional[Callable[..., int]] = (lambda infix, guard=None: len(infix)) if stage == 'infix_to_postfix' else None
+                setattr(self, method, self.metrics.instrument(stage=stage, function=getattr(self, method), length=length))
+        return self.metrics
+
+    def disable_metrics(self) -> None:
+        if self.metrics is not None:
+            for method in INSTRUMENTED_STAGES.values():
+                delattr(self, method)
+            self.metrics = None
+
+    def metrics_snapshot(self) -> dict[str, Any]:
+        return self.metrics.snapshot() if self.metrics is not None else {}
+
+    def dump_metrics(self, format: str = 'json') -> str:
+        """Metrics as JSON or in the Prometheus text format."""
+        from src.utils.metrics import Metrics
+
+        return (self.metrics or Metrics()).dump(format=format)
+
+    _infix_to_postfix = staticmethod(infix_to_postfix)
+    _compile_postfix = staticmethod(compile_postfix)
+    _run_program = staticmethod(run)
+    _evaluate_state = staticmethod(IncrementalParser.evaluate)
+    _normalize_result = staticmethod(normalize_result)
 
     @staticmethod
-    def _postfix_to_tree(postfix: list[str]) -> ExpressionTreeNode:
-        stack: list[ExpressionTreeNode] = []
-        for token in postfix:
-            # Check if token is a number (digit or contains comma for decimal)
-            if token.isdigit() or token == 'π' or ',' in token:
-                stack.append(ExpressionTreeNode(value=token))
-            elif token in SCIENTIFIC_FUNCTIONS:
-                stack.append(
-                    ExpressionTreeNode(value=token, right=stack.pop())
-                )
-            elif token in OPERATORS_TOKENS:
-                stack.append(
-                    ExpressionTreeNode(value=token, left=stack.pop(), right=stack.pop())
-                )
-        return stack.pop()
-
-    def _evaluate_expression_tree(self, node: ExpressionTreeNode) -> float:
-        if node.left is None and node.right is None:
-            if node.value == 'π':
-                return math.pi
-            # Replace comma with dot for float conversion
-            return float(node.value.replace(',', '.'))
-
-        # Handle unary operators (scientific functions)
-        if node.left is None and node.right is not None:
-            right_result: float = self._evaluate_expression_tree(node=node.right)
-            match node.value:
-                case 'sin':
-                    return math.sin(math.radians(right_result))
-                case 'cos':
-                    return math.cos(math.radians(right_result))
-                case 'tan':
-                    return math.tan(math.radians(right_result))
-                case '√':
-                    return math.sqrt(right_result)
-                case 'log':
-                    return math.log10(right_result)
-                case 'ln':
-                    return math.log(right_result)
-                case 'e^x':
-                    return math.exp(right_result)
-
-        left_result: float = self._evaluate_expression_tree(node=node.left)
-        right_result: float = self._evaluate_expression_tree(node=node.right)
-
-        match node.value:
-            case Token.multiply:
-                return right_result * left_result
-            case Token.divide:
-                return right_result / left_result
-            case Token.plus:
-                return right_result + left_result
-            case Token.minus:
-                return right_result - left_result
-            case '^':
-                return right_result ** left_result
+    def _run_task(task: EvaluationTask) -> float | Exception:
+        try:
+            return task(None)
+        except Exception as e:
+            return e
@@ -0,0 +1,157 @@
+"""Evaluation of an expression over the columns of a data file, a chunk of rows at a time.
+
+The expression refers to columns by name, e.g. 'price*qty*(1+tax)'. Columns
+are read from a CSV file with a header row, or from raw binary files of
+little-endian float64 values, one per column, which are memory-mapped. Each
+chunk is evaluated column-wise by `run_vectorized`, and its results written
+before the next is read, so memory use depends on the chunk size only.
+Requires NumPy.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence, TextIO
+
+import numpy as np
+
+from src.services.bytecode import Program
+from src.services.engine import compile_expression
+from src.services.tokens import SCIENTIFIC_FUNCTIONS, Token, tokenize
+from src.services.vectorized import BatchResult, run_vectorized
+
+DEFAULT_CHUNK_ROWS: int = 1 << 16
+COLUMN_DTYPE: np.dtype = np.dtype('<f8')
+ERROR: str = 'error'
+
+
+class Chunk(NamedTuple):
+    rows: int
+    # The columns the expression uses, by name
+    columns: dict[str, np.ndarray]
+
+
+def compile_columns_expression(text: str, columns: Iterable[str]) -> Program:
+    """Compile `text` with the names of `columns` as variables, raising ValueError when it uses a variable that is not one of them."""
+    columns = set(columns)
+    # Other columns cannot be told apart from numbers and functions, nor used
+    names: list[str] = [column for column in columns if column.isidentifier() and column not in SCIENTIFIC_FUNCTIONS and column != Token.pi]
+    program: Program = compile_expression(tokens=tuple(tokenize(text=text, variables=names)))
+    unknown: list[str] = [name for name in program.variables if name not in columns]
+    if unknown:
+        raise ValueError(f'No column named {", ".join(unknown)}')
+    return program
+
+
+def read_csv_header(file: TextIO, delimiter: str = ',') -> list[str]:
+    """Column names of a CSV file, from its first line."""
+    return [name.strip().strip('"') for name in file.readline().rstrip('\r\n').split(delimiter)]
+
+
+def read_csv_chunks(
+    file: TextIO, header: Sequence[str], columns: Sequence[str], chunk_rows: int = DEFAULT_CHUNK_ROWS, delimiter: str = ','
+) -> Iterator[Chunk]:
+    """Chunks of the `columns` of a CSV file whose `header` was read, parsed as floats.
+
+    Empty lines are skipped, a value that is not a number raises ValueError.
+    """
+    indexes: list[int] = [list(header).index(column) for column in columns]
+    while chunk := list(islice(file, chunk_rows)):
+        lines: list[str] = [line for line in chunk if line.strip()]
+        if not lines:
+            # A chunk of empty lines has no rows to write
+            continue
+        if not indexes:
+            yield Chunk(rows=len(lines), columns={})
+            continue
+        values: np.ndarray = np.loadtxt(
+            lines, dtype=np.float64, delimiter=delimiter, usecols=indexes, comments=None, quotechar='"', ndmin=2
+        )
+        yield Chunk(rows=len(values), columns={column: values[:, i] for i, column in enumerate(columns)})
+
+
+def read_binary_chunks(paths: Mapping[str, str], chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Chunk]:
+    """Chunks of raw float64 column files, by column name, which must all have the same number of rows.
+
+    Files are memory-mapped and chunks are views of the mappings. The pages of a
+    chunk are released once the next one is requested, so the file cache rather
+    than the process holds the data.
+    """
+    files: list[BinaryIO] = []
+    maps: dict[str, Optional[mmap.mmap]] = {}
+    try:
+        for column, path in paths.items():
+            files.append(open(path, 'rb'))
+            size: int = os.fstat(files[-1].fileno()).st_size
+            if size % COLUMN_DTYPE.itemsize:
+                raise ValueError(f'{path} is not a float64 column, its size is not a multiple of {COLUMN_DTYPE.itemsize} bytes')
+            # Empty files cannot be mapped
+            maps[column] = mmap.mmap(files[-1].fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        sizes: set[int] = {len(mapping) if mapping is not None else 0 for mapping in maps.values()}
+        if len(sizes) > 1:
+            raise ValueError('Column files do not have the same number of rows')
+        rows: int = sizes.pop() // COLUMN_DTYPE.itemsize if sizes else 0
+
+        for start in range(0, rows, chunk_rows):
+            count: int = min(chunk_rows, rows - start)
+            columns: dict[str, np.ndarray] = {
+                column: np.frombuffer(mapping, dtype=COLUMN_DTYPE, count=count, offset=start * COLUMN_DTYPE.itemsize)
+                for column, mapping in maps.items()
+            }
+            yield Chunk(rows=count, columns=columns)
+            # Mappings cannot be closed while views of them exist, consumers drop their chunk before asking for the next
+            del columns
+            for mapping in maps.values():
+                _release(mapping=mapping, start=start * COLUMN_DTYPE.itemsize, stop=(start + count) * COLUMN_DTYPE.itemsize)
+    finally:
+        for mapping in maps.values():
+            if mapping is not None:
+                mapping.close()
+        for file in files:
+            file.close()
+
+
+def _release(mapping: mmap.mmap, start: int, stop: int) -> None:
+    # From the start of the page, a page shared with the next chunk is simply read again
+    start -= start % mmap.PAGESIZE
+    if hasattr(mapping, 'madvise') and hasattr(mmap, 'MADV_DONTNEED') and stop > start:
+        mapping.madvise(mmap.MADV_DONTNEED, start, stop - start)
+
+
+def evaluate_chunks(program: Program, chunks: Iterable[Chunk]) -> Iterator[BatchResult]:
+    """Results of `program` over each chunk, one per row."""
+    for chunk in chunks:
+        result: BatchResult = run_vectorized(program=program, variables=chunk.columns)
+        if result.values.shape != (chunk.rows,):
+            # An expression of no column has a single value
+            result = BatchResult(values=np.broadcast_to(result.values, chunk.rows), errors=np.broadcast_to(result.errors, chunk.rows))
+        # Results are new arrays, the chunk can be released before the next one is read
+        del chunk
+        yield result
+
+
+def write_text(results: Iterable[BatchResult], output: TextIO) -> int:
+    """Write one result per line, `ERROR` where it failed, returning the number of rows."""
+    rows: int = 0
+    for result in results:
+        lines: list[str] = list(map(repr, result.values.tolist()))
+        if not lines:
+            continue
+        for index in np.flatnonzero(result.errors).tolist():
+            lines[index] = ERROR
+        output.write('\n'.join(lines))
+        output.write('\n')
+        rows += len(lines)
+    return rows
+
+
+def write_binary(results: Iterable[BatchResult], output: BinaryIO) -> int:
+    """Write the results as a raw float64 column, nan where they failed, returning the number of rows."""
+    rows: int = 0
+    for result in results:
+        values: np.ndarray = np.where(result.errors, np.nan, result.values).astype(COLUMN_DTYPE, copy=False)
+        output.write(values.tobytes())
+        rows += len(values)
+    return rows
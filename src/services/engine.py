@@ -0,0 +1,247 @@
+"""Stateless parse and evaluate API shared by every calculator session.
+
+Nothing here keeps per-user state: editing rules take the tokens typed so far
+and return the `Edit` to apply, evaluation takes a token tuple. The compiled
+expressions cache is shared by the whole process and guarded by a lock, so
+every function can be called from any thread.
+"""
+from __future__ import annotations
+
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Mapping, NamedTuple, Optional, Sequence
+
+from src.services.bytecode import GUARD_CHECK_INTERVAL, Program, compile_postfix, operation_limits, run
+from src.services.operations import Number, normalize_number
+from src.services.tokens import DIGIT_TOKENS, OPERATORS_TOKENS, SCIENTIFIC_FUNCTIONS, SYMBOL_TOKENS, Token, precedence, tokenize
+
+from src.utils.lazy_logger import LazyLogger
+from src.utils.lru_cache import LRUCache
+
+if TYPE_CHECKING:
+    from src.services.budget import BudgetGuard
+
+logger: LazyLogger = LazyLogger(name=__name__)
+
+COMPILED_EXPRESSIONS_CACHE_SIZE: int = 256
+
+# Compiled programs are keyed by their tokens and the operation limits their constants were folded within
+CompiledExpressionKey = tuple[tuple[str, ...], tuple[int, int]]
+
+_compiled_expressions: LRUCache[CompiledExpressionKey, Program] = LRUCache(maxsize=COMPILED_EXPRESSIONS_CACHE_SIZE)
+_compiled_expressions_lock: Lock = Lock()
+
+
+class Edit(NamedTuple):
+    """Replace the tokens from `start` to `stop` with `tokens`."""
+    start: int
+    stop: int
+    tokens: list[str]
+
+
+def ends_operand(token: str) -> bool:
+    return token.isdigit() or token in SYMBOL_TOKENS or token == ')'
+
+
+def number_start(tokens: Sequence[str]) -> int:
+    """Index where the number ending at the last token starts, or -1 if there is none."""
+    start: int = len(tokens)
+    while start > 0 and (tokens[start - 1].isdigit() or tokens[start - 1] == ','):
+        start -= 1
+    return start if start < len(tokens) else -1
+
+
+def edit_for_token(token: Token, tokens: Sequence[str], depth: int, number_start: int, number_has_decimal: bool) -> Optional[Edit]:
+    """The edit pressing `token` makes to `tokens`, or None when it would make the expression invalid.
+
+    `depth` is the number of open parenthesis, `number_start` and `number_has_decimal`
+    describe the number ending at the last token, as returned by `number_start`.
+    """
+    length: int = len(tokens)
+    last_element: str = tokens[-1] if length else ''
+
+    if token == Token.parenthesis:
+        if ends_operand(token=last_element):
+            return Edit(start=length, stop=length, tokens=['*', '('] if depth == 0 else [')'])
+        return Edit(start=length, stop=length, tokens=['('])
+    if token in SYMBOL_TOKENS:
+        return Edit(start=length, stop=length, tokens=['*', token.value] if ends_operand(token=last_element) else [token.value])
+    if token in SCIENTIFIC_FUNCTIONS:
+        return Edit(start=length, stop=length, tokens=['*', token.value, '('] if ends_operand(token=last_element) else [token.value, '('])
+    if token == Token.negate:
+        if number_start != -1:
+            # Toggle the sign of the number being typed
+            if number_start >= 2 and tokens[number_start - 2] == '(' and tokens[number_start - 1] == '-':
+                return Edit(start=number_start - 2, stop=number_start, tokens=[])
+            return Edit(start=number_start, stop=number_start, tokens=['(', '-'])
+        if last_element == '(':
+            return Edit(start=length, stop=length, tokens=['-'])
+        if last_element == ')' or last_element in SYMBOL_TOKENS:
+            return Edit(start=length, stop=length, tokens=['*', '(', '-'])
+        return Edit(start=length, stop=length, tokens=['(', '-'])
+    if token == Token.decimal:
+        if (last_element.isdigit() and number_has_decimal) or last_element == ',':
+            logger.warning(msg='That will result in a invalid expression')
+            return None
+        if last_element.isdigit():
+            return Edit(start=length, stop=length, tokens=[','])
+        return Edit(start=length, stop=length, tokens=['*', '0', ','] if ends_operand(token=last_element) else ['0', ','])
+    if token in DIGIT_TOKENS:
+        if last_element == ')' or last_element in SYMBOL_TOKENS:
+            return Edit(start=length, stop=length, tokens=['*', token.value])
+        return Edit(start=length, stop=length, tokens=[token.value])
+    if token in OPERATORS_TOKENS:
+        if last_element == '' or last_element == '(':
+            logger.warning(msg='That will result in a invalid expression')
+            return None
+        if last_element in OPERATORS_TOKENS:
+            return Edit(start=length - 1, stop=length, tokens=[token.value])
+        return Edit(start=length, stop=length, tokens=[token.value])
+    return None
+
+
+def edit_for_text(text: str, tokens: Sequence[str]) -> Edit:
+    """The edit appending `text`, written in calculator syntax, to `tokens`.
+
+    Tokens are checked against the same rules as typing them, with the same
+    implicit multiplications and leading zeros, e.g. pasting π after 2 gives 2*π
+    and ',5' gives 0,5. Raises ValueError when `text` is not in calculator
+    syntax, or would make the expression invalid, e.g. '2++3' or an unmatched ')'.
+    """
+    length: int = len(tokens)
+    previous: str = tokens[-1] if length else ''
+    depth: int = sum(1 if token == '(' else -1 if token == ')' else 0 for token in tokens)
+    start: int = number_start(tokens=tokens)
+    has_decimal: bool = start != -1 and ',' in tokens[start:]
+    inserted: list[str] = []
+    for token in tokenize(text=text):
+        if previous in SCIENTIFIC_FUNCTIONS and token != '(':
+            raise ValueError(f'{previous!r} must be followed by \'(\'')
+        if token in OPERATORS_TOKENS:
+            # Negative numbers are typed as (-
+            if previous in OPERATORS_TOKENS or previous == '' or previous == '(' and token != Token.minus:
+                raise ValueError(f'{token!r} cannot follow {previous or "the start of the expression"!r}')
+        elif token == ')':
+            if depth == 0:
+                raise ValueError(f'{token!r} does not close an open parenthesis')
+            if not ends_operand(token=previous):
+                raise ValueError(f'{token!r} cannot follow {previous!r}')
+            depth -= 1
+        elif token == ',':
+            if has_decimal:
+                raise ValueError('A number cannot have two decimal points')
+            if not previous.isdigit():
+                inserted.extend(['*', '0'] if ends_operand(token=previous) else ['0'])
+            has_decimal = True
+        elif token.isdigit():
+            if previous == ')' or previous in SYMBOL_TOKENS:
+                inserted.append(Token.multiply.value)
+        else:
+            if ends_operand(token=previous) or previous == ',':
+                inserted.append(Token.multiply.value)
+            depth += token == '('
+        if not token.isdigit() and token != ',':
+            has_decimal = False
+        inserted.append(token)
+        previous = token
+    return Edit(start=length, stop=length, tokens=inserted)
+
+
+def infix_to_postfix(infix: Sequence[str], guard: Optional[BudgetGuard] = None) -> list[str]:
+    output_queue: list[str] = []
+    operator_stack: list[str] = []
+    next_guard_check: int = 0
+
+    i = 0
+    while i < len(infix):
+        token = infix[i]
+
+        if guard is not None and i >= next_guard_check:
+            guard.check()
+            next_guard_check = i + GUARD_CHECK_INTERVAL
+
+        # Combine consecutive digits and commas into a single number
+        if token.isdigit():
+            number = token
+            i += 1
+            while i < len(infix) and (infix[i].isdigit() or infix[i] == ','):
+                number += infix[i]
+                i += 1
+            output_queue.append(number)
+            continue
+        elif token in SYMBOL_TOKENS:
+            output_queue.append(token)
+        elif token == '(':
+            operator_stack.append(token)
+        elif token == ')':
+            while operator_stack[-1] != '(':
+                output_queue.append(operator_stack.pop())
+            operator_stack.pop()
+            if operator_stack and operator_stack[-1] in SCIENTIFIC_FUNCTIONS:
+                output_queue.append(operator_stack.pop())
+        elif token in SCIENTIFIC_FUNCTIONS:
+            operator_stack.append(token)
+        elif token in OPERATORS_TOKENS:
+            # A minus opening a group negates its operand, as in (-5)
+            if token == '-' and (i == 0 or infix[i - 1] == '('):
+                output_queue.append('0')
+            operator_one: str = token
+            while operator_stack and operator_stack[-1] in OPERATORS_TOKENS:
+                operator_two: str = operator_stack[-1]
+                if precedence(operator_one) <= precedence(operator_two):
+                    output_queue.append(operator_stack.pop())
+                else:
+                    break
+            operator_stack.append(token)
+        elif token.isidentifier():
+            # A named variable, such as a column of a data file
+            output_queue.append(token)
+
+        i += 1
+
+    while operator_stack:
+        output_queue.append(operator_stack.pop())
+
+    return output_queue
+
+
+def compile_expression(
+    tokens: tuple[str, ...],
+    guard: Optional[BudgetGuard] = None,
+    cache: LRUCache[CompiledExpressionKey, Program] = _compiled_expressions,
+    lock: Lock = _compiled_expressions_lock,
+    to_postfix: Callable[..., list[str]] = infix_to_postfix,
+    to_program: Callable[..., Program] = compile_postfix,
+) -> Program:
+    """The program of `tokens`, for running under `guard`, whose constants are folded within its budget.
+
+    Programs are kept in `cache`, the process-wide one by default, which `lock`
+    guards. `to_postfix` and `to_program` stand for `infix_to_postfix` and
+    `compile_postfix`, e.g. to time them.
+    """
+    key: CompiledExpressionKey = (tokens, operation_limits(guard=guard))
+    with lock:
+        program: Optional[Program] = cache.get(key=key)
+    if program is None:
+        postfix: list[str] = to_postfix(infix=tokens, guard=guard)
+        if guard is not None:
+            guard.check()
+        program = to_program(postfix=postfix, guard=guard)
+        with lock:
+            cache.put(key=key, value=program)
+    return program
+
+
+def normalize_result(value: Number) -> int | float:
+    return normalize_number(value=value)
+
+
+def evaluate(tokens: tuple[str, ...], variables: Optional[Mapping[str, float]] = None, guard: Optional[BudgetGuard] = None) -> int | float:
+    """Evaluate a token tuple, letting errors propagate."""
+    if len(tokens) == 0:
+        raise ValueError('Empty expression')
+    return normalize_result(value=run(program=compile_expression(tokens=tokens, guard=guard), variables=variables, guard=guard))
+
+
+def evaluate_text(text: str, variables: Optional[Mapping[str, float]] = None, guard: Optional[BudgetGuard] = None) -> int | float:
+    """Evaluate an expression written in calculator syntax, e.g. '2,5*sin(30)+π'."""
+    return evaluate(tokens=tuple(tokenize(text=text)), variables=variables, guard=guard)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from queue import SimpleQueue
+from threading import Condition, Event, Thread
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from src.services.budget import BudgetGuard, EvaluationBudget, EvaluationCancelledError
+
+if TYPE_CHECKING:
+    from src.services.calculator_service import EvaluationTask
+
+
+class EvaluationJob(NamedTuple):
+    id: int
+    task: EvaluationTask
+    cancelled: Event
+
+
+class EvaluationOutcome(NamedTuple):
+    job_id: int
+    outcome: float | Exception
+
+
+class EvaluationWorker:
+    """Runs evaluation tasks one at a time on a daemon thread.
+
+    Submitting a task cancels the one still running and replaces the one still
+    waiting, so only the newest keystroke is evaluated. Outcomes are put on
+    `outcomes` for the UI thread to collect, cancelled jobs produce none.
+    """
+
+    def __init__(self, budget: EvaluationBudget = EvaluationBudget()) -> None:
+        self.budget: EvaluationBudget = budget
+        self.outcomes: SimpleQueue[EvaluationOutcome] = SimpleQueue()
+        self.last_job_id: int = 0
+        self._condition: Condition = Condition()
+        self._pending: Optional[EvaluationJob] = None
+        self._running: Optional[EvaluationJob] = None
+        self._thread: Thread = Thread(target=self._work, name='evaluation-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, task: EvaluationTask) -> int:
+        with self._condition:
+            self.last_job_id += 1
+            if self._running is not None:
+                self._running.cancelled.set()
+            self._pending = EvaluationJob(id=self.last_job_id, task=task, cancelled=Event())
+            self._condition.notify()
+            return self.last_job_id
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                job: EvaluationJob = self._pending
+                self._pending = None
+                self._running = job
+
+            try:
+                outcome: float | Exception = job.task(BudgetGuard(budget=self.budget, cancelled=job.cancelled))
+            except EvaluationCancelledError:
+                continue
+            except Exception as e:
+                outcome = e
+            finally:
+                with self._condition:
+                    self._running = None
+
+            if not job.cancelled.is_set():
+                self.outcomes.put(EvaluationOutcome(job_id=job.id, outcome=outcome))
@@ -0,0 +1,142 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterator
+
+from src.services.incremental_parser import IncrementalParser
+
+
+class ExpressionBuffer:
+    """Token list of the expression being typed, indexed per position.
+
+    Alongside each token it stores the parenthesis depth, the start of the number
+    span it belongs to, whether that number already has a decimal separator and
+    the length of the display text up to it. Appending and popping keep every
+    index in step, so the queries `send_token` needs are O(1).
+    """
+
+    def __init__(self) -> None:
+        self.parser: IncrementalParser = IncrementalParser()
+        self.tokens: list[str] = []
+        self.depths: list[int] = []
+        self.number_starts: list[int] = []
+        self.decimals: list[bool] = []
+        self.offsets: list[int] = []
+        # The text is `_text[:_text_end]` followed by the pending tokens, so
+        # appending and popping never copy the whole string
+        self._text: str = ''
+        self._text_end: int = 0
+        self._pending_text: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __getitem__(self, index: int) -> str:
+        return self.tokens[index]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tokens)
+
+    @property
+    def last_element(self) -> str:
+        return self.tokens[-1] if self.tokens else ''
+
+    @property
+    def depth(self) -> int:
+        return self.depths[-1] if self.depths else 0
+
+    @property
+    def number_start(self) -> int:
+        """Index where the number ending at the last token starts, or -1 if there is none."""
+        return self.number_starts[-1] if self.number_starts else -1
+
+    @property
+    def number_has_decimal(self) -> bool:
+        return self.decimals[-1] if self.decimals else False
+
+    @property
+    def text_length(self) -> int:
+        return self.offsets[-1] if self.offsets else 0
+
+    @property
+    def text(self) -> str:
+        if self._pending_text or self._text_end != len(self._text):
+            self._text = self._text[:self._text_end] + ''.join(self._pending_text)
+            self._text_end = len(self._text)
+            self._pending_text.clear()
+        return self._text
+
+    def text_window(self, stop: int, characters: int) -> str:
+        """The `characters` characters of the text ending at offset `stop`, joined from the tokens they span only."""
+        start: int = max(0, stop - characters)
+        if start >= stop:
+            return ''
+        # Tokens whose text overlaps [start, stop), by the offset where each one ends
+        first: int = bisect_right(self.offsets, start)
+        last: int = bisect_left(self.offsets, stop)
+        base: int = self.offsets[first] - len(self.tokens[first])
+        return ''.join(self.tokens[first:last + 1])[start - base:stop - base]
+
+    def append(self, token: str) -> None:
+        index: int = len(self.tokens)
+        depth: int = self.depth
+
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+
+        if token.isdigit() or token == ',':
+            in_number: bool = self.number_start != -1
+            self.number_starts.append(self.number_start if in_number else index)
+            self.decimals.append(token == ',' or (in_number and self.number_has_decimal))
+        else:
+            self.number_starts.append(-1)
+            self.decimals.append(False)
+
+        self.tokens.append(token)
+        self.depths.append(depth)
+        self._pending_text.append(token)
+        self.offsets.append((self.offsets[-1] if self.offsets else 0) + len(token))
+        self.parser.push(token=token)
+
+    def extend(self, tokens: list[str]) -> None:
+        for token in tokens:
+            self.append(token=token)
+
+    def pop(self) -> str:
+        token: str = self.tokens.pop()
+        self.depths.pop()
+        self.number_starts.pop()
+        self.decimals.pop()
+        self.offsets.pop()
+        if self._pending_text:
+            self._pending_text.pop()
+        else:
+            self._text_end = self.text_length
+        self.parser.pop()
+        return token
+
+    def truncate(self, length: int) -> list[str]:
+        """Drop every token from `length` on and return them."""
+        removed: list[str] = self.tokens[length:]
+        # Tokens before `flushed` are part of `_text`, the others are pending
+        flushed: int = len(self.tokens) - len(self._pending_text)
+        del self.tokens[length:]
+        del self.depths[length:]
+        del self.number_starts[length:]
+        del self.decimals[length:]
+        del self.offsets[length:]
+        if length >= flushed:
+            del self._pending_text[length - flushed:]
+        else:
+            self._pending_text.clear()
+            self._text_end = self.text_length
+        self.parser.truncate(length=length)
+        return removed
+
+    def splice(self, start: int, stop: int, tokens: list[str]) -> None:
+        """Replace the tokens from `start` to `stop` with `tokens`."""
+        tail: list[str] = self.truncate(length=start)
+        self.extend(tokens=tokens + tail[stop - start:])
+
+    def clear(self) -> None:
+        self.truncate(length=0)
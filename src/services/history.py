@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import NamedTuple, Optional
+
+from src.services.engine import Edit
+from src.services.incremental_parser import Stack
+
+DEFAULT_MAX_STEPS: int = 10_000
+
+
+class Version(NamedTuple):
+    """Tokens of an expression state as a persistent stack, last token first, so states share every token before their edits."""
+    tokens: Stack = None
+    length: int = 0
+
+    def tail(self, start: int) -> list[str]:
+        """The tokens from `start` on, in O(length - start)."""
+        tail: list[str] = []
+        tokens: Stack = self.tokens
+        for _ in range(self.length - start):
+            token, tokens = tokens
+            tail.append(token)
+        tail.reverse()
+        return tail
+
+    def splice(self, start: int, stop: int, tokens: list[str]) -> Version:
+        """The version where the tokens from `start` to `stop` are replaced with `tokens`, in O(length - start + len(tokens))."""
+        if start == 0 and stop == self.length:
+            # Replacing every token, as clearing does, shares nothing
+            head: Stack = None
+            kept: list[str] = []
+        else:
+            head = self.tokens
+            # Kept tokens after `stop`, last one first
+            kept = []
+            for i in range(self.length - start):
+                token, head = head
+                if i < self.length - stop:
+                    kept.append(token)
+        for token in tokens:
+            head = (token, head)
+        for token in reversed(kept):
+            head = (token, head)
+        return Version(tokens=head, length=start + len(tokens) + len(kept))
+
+
+class Step(NamedTuple):
+    """A state of the expression to go back to, which has the same tokens as the current one before `start`."""
+    version: Version
+    start: int
+
+
+class EditHistory:
+    """Undo and redo stacks of expression states.
+
+    Edits are made at the end of the expression or a few tokens before it, so
+    keeping states as persistent stacks makes recording an edit cost O(1) time and
+    memory per token it changes rather than a copy of the expression, and a long
+    history of a long expression mostly shares the same pairs. Only the last
+    `max_steps` edits can be undone.
+    """
+
+    def __init__(self, max_steps: int = DEFAULT_MAX_STEPS) -> None:
+        self.version: Version = Version()
+        self.undo_steps: deque[Step] = deque(maxlen=max_steps)
+        self.redo_steps: list[Step] = []
+
+    def record(self, edit: Edit) -> None:
+        self.undo_steps.append(Step(version=self.version, start=edit.start))
+        self.redo_steps.clear()
+        self.version = self.version.splice(start=edit.start, stop=edit.stop, tokens=edit.tokens)
+
+    def undo(self) -> Optional[Step]:
+        """The state before the last edit, or None when there is nothing to undo."""
+        if not self.undo_steps:
+            return None
+        step: Step = self.undo_steps.pop()
+        self.redo_steps.append(Step(version=self.version, start=step.start))
+        self.version = step.version
+        return step
+
+    def redo(self) -> Optional[Step]:
+        """The state after the last undone edit, or None when there is nothing to redo."""
+        if not self.redo_steps:
+            return None
+        step: Step = self.redo_steps.pop()
+        self.undo_steps.append(Step(version=self.version, start=step.start))
+        self.version = step.version
+        return step
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+
+from src.services.operations import apply_function, apply_operator, parse_number
+from src.services.tokens import OPERATORS_TOKENS, SCIENTIFIC_FUNCTIONS, precedence
+
+if TYPE_CHECKING:
+    from src.services.budget import BudgetGuard
+
+# Persistent stacks are stored as nested ``(head, tail)`` pairs, so saving a
+# checkpoint only keeps a reference and rolling back never copies anything.
+Stack = Optional[tuple[Any, 'Stack']]
+
+
+class ParserState(NamedTuple):
+    operators: Stack = None
+    values: Stack = None
+    number: str = ''
+    group_start: bool = True
+    error: Optional[Exception] = None
+
+
+class IncrementalParser:
+    """Shunting-yard parser that evaluates the expression while it is typed.
+
+    Every pushed token runs a single shunting-yard step, applying operators to the
+    value stack as soon as they are popped from the operator stack. The state before
+    each token is kept as a checkpoint, so removing tokens rolls back in O(1).
+    """
+
+    def __init__(self) -> None:
+        self.state: ParserState = ParserState()
+        self.checkpoints: list[ParserState] = []
+
+    def __len__(self) -> int:
+        return len(self.checkpoints)
+
+    def push(self, token: str) -> None:
+        self.checkpoints.append(self.state)
+        if self.state.error is None:
+            try:
+                self.state = self._step(state=self.state, token=token)
+            except Exception as e:
+                # Without its traceback the stored error does not keep the parser frames alive
+                self.state = self.state._replace(error=e.with_traceback(None))
+
+    def pop(self) -> None:
+        if self.checkpoints:
+            self.state = self.checkpoints.pop()
+
+    def truncate(self, length: int) -> None:
+        if length < len(self.checkpoints):
+            self.state = self.checkpoints[length]
+            del self.checkpoints[length:]
+
+    def clear(self) -> None:
+        self.state = ParserState()
+        self.checkpoints = []
+
+    def result(self) -> float:
+        return self.evaluate(state=self.state)
+
+    @classmethod
+    def evaluate(cls, state: ParserState, guard: Optional[BudgetGuard] = None) -> float:
+        """Finish the evaluation of `state`, which is immutable and safe to read from any thread."""
+        if state.error is not None:
+            # Raised again on every preview, so its traceback is reset instead of growing each time
+            raise state.error.with_traceback(None)
+
+        values: Stack = state.values
+        if state.number:
+            values = (parse_number(value=state.number), values)
+
+        operators: Stack = state.operators
+        while operators is not None:
+            if guard is not None:
+                guard.check()
+            operator, operators = operators
+            values = cls._apply(operator=operator, values=values)
+
+        if values is None or values[1] is not None:
+            raise ValueError('Expression does not reduce to a single value')
+        return values[0]
+
+    @classmethod
+    def _step(cls, state: ParserState, token: str) -> ParserState:
+        operators, values, number, group_start, _ = state
+
+        # Combine consecutive digits and commas into a single number
+        if token.isdigit() or (token == ',' and number):
+            return ParserState(operators=operators, values=values, number=number + token, group_start=False)
+        if number:
+            values = (parse_number(value=number), values)
+
+        if token == 'π':
+            values = (parse_number(value=token), values)
+        elif token == 'x':
+            # The preview has no value to bind, the result stays the last one
+            raise NameError(f'Variable {token} has no value')
+        elif token == '(':
+            return ParserState(operators=(token, operators), values=values, group_start=True)
+        elif token in SCIENTIFIC_FUNCTIONS:
+            operators = (token, operators)
+        elif token == ')':
+            while operators[0] != '(':
+                operator, operators = operators
+                values = cls._apply(operator=operator, values=values)
+            operators = operators[1]
+            if operators is not None and operators[0] in SCIENTIFIC_FUNCTIONS:
+                operator, operators = operators
+                values = cls._apply(operator=operator, values=values)
+        elif token in OPERATORS_TOKENS:
+            # A minus opening a group negates its operand, as in (-5)
+            if token == '-' and group_start:
+                values = (0, values)
+            while operators is not None and operators[0] in OPERATORS_TOKENS and precedence(token) <= precedence(operators[0]):
+                operator, operators = operators
+                values = cls._apply(operator=operator, values=values)
+            operators = (token, operators)
+
+        return ParserState(operators=operators, values=values, group_start=False)
+
+    @staticmethod
+    def _apply(operator: str, values: Stack) -> Stack:
+        if operator in SCIENTIFIC_FUNCTIONS:
+            operand, values = values
+            return (apply_function(function=operator, operand=operand), values)
+        if operator in OPERATORS_TOKENS:
+            right, values = values
+            left, values = values
+            return (apply_operator(operator=operator, left=left, right=right), values)
+        # Unclosed parenthesis are dropped, just like the full parser does
+        return values
@@ -0,0 +1,157 @@
+"""Arithmetic on exact numbers, promoted to floats only when it has to.
+
+Integer literals are `int` and decimal ones `Fraction`, and they stay exact
+through +, -, *, / and integer powers. A value is promoted to float by the
+transcendental functions, by a fractional power or square root that is not
+exact, and once it needs more than `max_exact_bits` bits, which bounds the
+cost of every exact operation. Floats past their range raise OverflowError,
+as float arithmetic does.
+"""
+import math
+
+from fractions import Fraction
+from typing import Callable
+
+from src.services.tokens import Token
+
+# Largest power result, in bits, computed without an explicit budget
+DEFAULT_MAX_RESULT_BITS: int = 1 << 16
+# Largest exact value, in bits of its numerator or denominator, before it is promoted to float
+DEFAULT_MAX_EXACT_BITS: int = 1 << 12
+
+Number = int | Fraction | float
+
+
+class BudgetExceededError(ArithmeticError):
+    pass
+
+
+def bounded(value: Number, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS) -> Number:
+    """`value`, as an int when it is integral and promoted to float when it is larger than `max_exact_bits`."""
+    kind: type = type(value)
+    if kind is float:
+        return value
+    if kind is int:
+        return value if value.bit_length() <= max_exact_bits else float(value)
+    if value.denominator == 1:
+        return bounded(value=value.numerator, max_exact_bits=max_exact_bits)
+    if value.numerator.bit_length() > max_exact_bits or value.denominator.bit_length() > max_exact_bits:
+        return float(value)
+    return value
+
+
+def add(left: Number, right: Number, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS) -> Number:
+    result: Number = left + right
+    # Floats and small ints, by far the most common results, are returned without a call to `bounded`
+    if type(result) is float or type(result) is int and result.bit_length() <= max_exact_bits:
+        return result
+    return bounded(value=result, max_exact_bits=max_exact_bits)
+
+
+def subtract(left: Number, right: Number, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS) -> Number:
+    result: Number = left - right
+    if type(result) is float or type(result) is int and result.bit_length() <= max_exact_bits:
+        return result
+    return bounded(value=result, max_exact_bits=max_exact_bits)
+
+
+def multiply(left: Number, right: Number, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS) -> Number:
+    result: Number = left * right
+    if type(result) is float or type(result) is int and result.bit_length() <= max_exact_bits:
+        return result
+    return bounded(value=result, max_exact_bits=max_exact_bits)
+
+
+def divide(left: Number, right: Number, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS) -> Number:
+    if type(left) is float or type(right) is float:
+        return left / right
+    if right == 0:
+        raise ZeroDivisionError('division by zero')
+    return bounded(value=Fraction(left, right), max_exact_bits=max_exact_bits)
+
+
+def power(
+    left: Number, right: Number, max_result_bits: int = DEFAULT_MAX_RESULT_BITS, max_exact_bits: int = DEFAULT_MAX_EXACT_BITS
+) -> Number:
+    # Estimate the size of the result before computing it, so runaway powers are refused upfront
+    if right > 1 and abs(left) > 1 and right * math.log2(abs(left)) > max_result_bits:
+        raise BudgetExceededError(f'Result of {left}^{right} would exceed {max_result_bits} bits')
+
+    if type(right) is int and type(left) is not float:
+        # Bits of the numerator or denominator of the exact result
+        largest: int = max(abs(left.numerator), left.denominator)
+        if largest <= 1 or abs(right) * math.log2(largest) <= max_exact_bits:
+            if right >= 0:
+                return bounded(value=left ** right, max_exact_bits=max_exact_bits)
+            if left == 0:
+                raise ZeroDivisionError('0 cannot be raised to a negative power')
+            return bounded(value=Fraction(left) ** right, max_exact_bits=max_exact_bits)
+    base: float = float(left)
+    exponent: float = float(right)
+    # Python gives a complex number instead
+    if base < 0 and math.isfinite(exponent) and not exponent.is_integer():
+        raise ValueError(f'{left}^{right} is not a real number')
+    return base ** exponent
+
+
+def square_root(operand: Number) -> Number:
+    # Perfect squares keep an exact root
+    if type(operand) is not float and operand >= 0:
+        numerator: int = operand.numerator
+        denominator: int = operand.denominator
+        numerator_root: int = math.isqrt(numerator)
+        denominator_root: int = math.isqrt(denominator)
+        if numerator_root * numerator_root == numerator and denominator_root * denominator_root == denominator:
+            return bounded(value=Fraction(numerator_root, denominator_root))
+    return math.sqrt(operand)
+
+
+FUNCTIONS: dict[str, Callable[[Number], Number]] = {
+    Token.sin: lambda operand: math.sin(math.radians(operand)),
+    Token.cos: lambda operand: math.cos(math.radians(operand)),
+    Token.tan: lambda operand: math.tan(math.radians(operand)),
+    Token.sqrt: square_root,
+    Token.log: math.log10,
+    Token.ln: math.log,
+    Token.exp: math.exp,
+}
+
+OPERATORS: dict[str, Callable[[Number, Number], Number]] = {
+    Token.plus: add,
+    Token.minus: subtract,
+    Token.multiply: multiply,
+    Token.divide: divide,
+    Token.power: power,
+}
+
+
+def parse_number(value: str) -> Number:
+    if value == Token.pi:
+        return math.pi
+    if ',' in value:
+        # Exact decimal, e.g. 2,5 is 5/2
+        return bounded(value=Fraction(value.replace(',', '.')))
+    return int(value)
+
+
+def normalize_number(value: Number) -> int | float:
+    """Exact values as int when integral and as the nearest float otherwise, floats as int when integral."""
+    if type(value) is int:
+        return value
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    return float(value)
+
+
+def apply_function(function: str, operand: float) -> float:
+    try:
+        return FUNCTIONS[function](operand)
+    except KeyError:
+        raise ValueError(f'Unknown function {function!r}') from None
+
+
+def apply_operator(operator: str, left: float, right: float) -> float:
+    try:
+        return OPERATORS[operator](left, right)
+    except KeyError:
+        raise ValueError(f'Unknown operator {operator!r}') from None
@@ -0,0 +1,212 @@
+"""Evaluation of huge expressions with their independent subexpressions spread over a process pool.
+
+The postfix form of an expression lists every subexpression as a contiguous
+span, so it is split into the largest spans no longer than a worker's share of
+the work. Consecutive spans are batched up to that share too, as splitting a
+long chain such as a+b+c+... leaves one small span per term. Workers compile
+and run the spans, the few operations above them are then evaluated here in
+their original order, reading the results of the spans in postfix order, so
+results and errors are the same as with a serial evaluation.
+
+The budget bounds the whole evaluation in wall time: each batch runs within
+what is left of it when it is sent, and the results are waited for until the
+deadline only, the batches still pending are then cancelled.
+"""
+from __future__ import annotations
+
+import time
+
+from concurrent.futures import Executor, Future
+from typing import Callable, Mapping, Optional, Sequence
+
+from src.services.budget import BudgetGuard, EvaluationBudget
+from src.services.bytecode import BINARY_OPCODES, GUARD_CHECK_INTERVAL, OPERATIONS, UNARY_OPCODES, compile_postfix, guarded_operations, run
+from src.services.engine import evaluate, infix_to_postfix, normalize_result
+from src.services.operations import BudgetExceededError, Number, parse_number
+from src.services.tokens import OPERATORS_TOKENS, SCIENTIFIC_FUNCTIONS
+
+# Below this many postfix tokens an expression is evaluated serially, shipping it to workers would cost more
+PARALLEL_MIN_TOKENS: int = 20_000
+# Spans per worker, more than one so a slow span does not leave the other workers idle
+SPANS_PER_WORKER: int = 4
+# Longest wait for a batch between checks for cancellation
+RESULT_POLL_SECONDS: float = 0.05
+
+
+def evaluate_spans(
+    spans: list[list[str]], variables: Optional[Mapping[str, float]], budget: Optional[EvaluationBudget]
+) -> list[Number | Exception]:
+    """Compile and run spans of postfix tokens in a worker process, returning the error of a span instead of its value when it fails.
+
+    The spans share `budget`, those left once it is spent fail with BudgetExceededError.
+    """
+    outcomes: list[Number | Exception] = []
+    guard: Optional[BudgetGuard] = BudgetGuard(budget=budget) if budget is not None else None
+    for span in spans:
+        try:
+            outcomes.append(run(program=compile_postfix(postfix=span, guard=guard), variables=variables, guard=guard))
+        except Exception as e:
+            outcomes.append(e)
+    return outcomes
+
+
+def subexpression_starts(postfix: Sequence[str]) -> list[int]:
+    """Index where the subexpression ending at each postfix token starts, validating the expression like `compile_postfix`."""
+    starts: list[int] = []
+    operands: list[int] = []
+    for i, token in enumerate(postfix):
+        arity: int = 2 if token in OPERATORS_TOKENS else 1 if token in SCIENTIFIC_FUNCTIONS else 0
+        if len(operands) < arity:
+            raise ValueError(f'Missing operand for {token}')
+        if arity:
+            del operands[len(operands) - arity + 1:]
+            starts.append(operands.pop())
+        else:
+            starts.append(i)
+        operands.append(starts[-1])
+    if len(operands) != 1:
+        raise ValueError('Expression does not reduce to a single value')
+    return starts
+
+
+def split(postfix: Sequence[str], max_span: int) -> list[tuple[int, int]]:
+    """The `(start, stop)` spans of the largest subexpressions of at most `max_span` tokens, in postfix order."""
+    starts: list[int] = subexpression_starts(postfix=postfix)
+    spans: list[tuple[int, int]] = []
+    # Ends of the subexpressions still to split, the last one is the root
+    pending: list[int] = [len(postfix) - 1]
+    while pending:
+        end: int = pending.pop()
+        start: int = starts[end]
+        token: str = postfix[end]
+        if end + 1 - start <= max_span or (token not in OPERATORS_TOKENS and token not in SCIENTIFIC_FUNCTIONS):
+            spans.append((start, end + 1))
+        elif token in SCIENTIFIC_FUNCTIONS:
+            pending.append(end - 1)
+        else:
+            right_start: int = starts[end - 1]
+            # Left operand first, once the right one is popped off
+            pending += [end - 1, right_start - 1]
+    return sorted(spans)
+
+
+def evaluate_parallel(
+    tokens: tuple[str, ...],
+    executor: Optional[Executor] = None,
+    workers: int = 1,
+    variables: Optional[Mapping[str, float]] = None,
+    budget: Optional[EvaluationBudget] = None,
+) -> int | float:
+    """Evaluate `tokens` across the `workers` processes of `executor`, serially when it is small or there is no executor.
+
+    A single worker only adds the cost of shipping the spans to it, the expression is evaluated serially then too.
+    """
+    if executor is None or workers < 2 or len(tokens) < PARALLEL_MIN_TOKENS:
+        return evaluate(tokens=tokens, variables=variables, guard=BudgetGuard(budget=budget) if budget is not None else None)
+
+    guard: Optional[BudgetGuard] = BudgetGuard(budget=budget) if budget is not None else None
+    deadline: Optional[float] = time.monotonic() + budget.max_seconds if budget is not None else None
+    postfix: list[str] = infix_to_postfix(infix=tokens, guard=guard)
+
+    max_span: int = max(1, len(postfix) // (workers * SPANS_PER_WORKER))
+    # Spans of a single token are read directly, the others are sent to the workers in batches
+    batches: list[list[tuple[int, int]]] = [[]]
+    batch_tokens: int = 0
+    for start, stop in split(postfix=postfix, max_span=max_span):
+        if stop - start > 1:
+            if batch_tokens + stop - start > max_span and batches[-1]:
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append((start, stop))
+            batch_tokens += stop - start
+
+    futures: list[Future[list[Number | Exception]]] = [
+        executor.submit(
+            evaluate_spans, [postfix[start:stop] for start, stop in batch], variables, _remaining(budget=budget, deadline=deadline)
+        )
+        for batch in batches if batch
+    ]
+    try:
+        outcomes: dict[int, tuple[int, Future[list[Number | Exception]], int]] = {
+            start: (stop, future, index) for batch, future in zip(batches, futures) for index, (start, stop) in enumerate(batch)
+        }
+        value: Number = _combine(postfix=postfix, outcomes=outcomes, variables=variables or {}, guard=guard, deadline=deadline)
+        return normalize_result(value=value)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _remaining(budget: Optional[EvaluationBudget], deadline: Optional[float]) -> Optional[EvaluationBudget]:
+    """`budget` with the time left until `deadline`."""
+    if budget is None or deadline is None:
+        return budget
+    return budget._replace(max_seconds=max(0.0, deadline - time.monotonic()))
+
+
+def _wait(future: Future[list[Number | Exception]], guard: Optional[BudgetGuard], deadline: Optional[float]) -> list[Number | Exception]:
+    """The outcomes of a batch, checking `guard` while waiting for them and raising BudgetExceededError past `deadline`."""
+    if guard is None or deadline is None:
+        return future.result()
+    while True:
+        remaining: float = deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExceededError(f'Evaluation took more than {guard.budget.max_seconds} seconds')
+        try:
+            return future.result(timeout=min(remaining, RESULT_POLL_SECONDS))
+        except TimeoutError:
+            # Time blocked here is not CPU time, only cancellation is caught by the guard
+            guard.check()
+
+
+def _combine(
+    postfix: list[str],
+    outcomes: dict[int, tuple[int, Future[list[Number | Exception]], int]],
+    variables: Mapping[str, float],
+    guard: Optional[BudgetGuard] = None,
+    deadline: Optional[float] = None,
+) -> Number:
+    """Evaluate `postfix` like `run` under `guard`, reading the value of the spans starting at the keys of `outcomes` from their future.
+
+    Futures are waited for until `deadline`, a `time.monotonic` time.
+    """
+    operations: list[Optional[Callable[..., Number]]] = guarded_operations(guard=guard) if guard is not None else OPERATIONS
+    stack: list[Number] = []
+    # Outcomes of each batch, read from its future once
+    batch_outcomes: dict[Future[list[Number | Exception]], list[Number | Exception]] = {}
+    steps: int = 0
+    i: int = 0
+    while i < len(postfix):
+        steps += 1
+        if guard is not None and steps % GUARD_CHECK_INTERVAL == 0:
+            guard.check()
+        if i in outcomes:
+            stop, future, index = outcomes[i]
+            if future not in batch_outcomes:
+                batch_outcomes[future] = _wait(future=future, guard=guard, deadline=deadline)
+            outcome: Number | Exception = batch_outcomes[future][index]
+            if isinstance(outcome, Exception):
+                raise outcome
+            stack.append(outcome)
+            i = stop
+            continue
+
+        token: str = postfix[i]
+        if token in OPERATORS_TOKENS:
+            right: Number = stack.pop()
+            stack[-1] = operations[BINARY_OPCODES[token]](stack[-1], right)
+        elif token in SCIENTIFIC_FUNCTIONS:
+            stack[-1] = operations[UNARY_OPCODES[token]](stack[-1])
+        elif token.isdigit() or token == 'π' or ',' in token:
+            stack.append(parse_number(value=token))
+        elif token.isidentifier():
+            # x, or a named variable such as a column of a data file
+            try:
+                stack.append(variables[token])
+            except KeyError:
+                raise NameError(f'Variable {token} has no value') from None
+        i += 1
+
+    if len(stack) != 1:
+        raise ValueError('Expression does not reduce to a single value')
+    return stack[0]
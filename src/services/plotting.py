@@ -0,0 +1,175 @@
+"""Adaptive sampling of an expression over the variable `x`, for plotting.
+
+Samples sit on a dyadic lattice: a grid whose step is a power of two, and the
+midpoints of its intervals, which are split again where the curve is far from
+straight at the screen's resolution, up to half a pixel. Lattice points are
+exact floats that do not depend on the view, so the samples of one view are
+reused by the next: panning only evaluates the newly exposed intervals, and
+zooming only refines or extends what is already known.
+"""
+from __future__ import annotations
+
+import math
+
+from bisect import bisect_left, bisect_right
+from typing import Iterator, NamedTuple
+
+from src.services.budget import BudgetGuard, EvaluationBudget
+from src.services.bytecode import Program, run
+from src.services.tokens import Token
+
+# Grid intervals across the width of a view, before refinement
+BASE_INTERVALS: int = 64
+# Distance in pixels from a straight line past which an interval is split
+DEFAULT_TOLERANCE_PIXELS: float = 0.5
+# Samples kept between views, those far out of view are dropped past it
+MAX_CACHED_SAMPLES: int = 50_000
+# Each sample runs within about a frame, and is left undefined past it, so a costly point cannot hold up the plot for long
+SAMPLE_BUDGET: EvaluationBudget = EvaluationBudget(max_seconds=0.008)
+# Screen coordinates are clamped this many view heights away, Tk does not draw far larger ones correctly
+CLAMP_VIEW_HEIGHTS: float = 10.0
+
+
+class View(NamedTuple):
+    x_min: float
+    x_max: float
+    y_min: float
+    y_max: float
+    # Size in pixels
+    width: int
+    height: int
+
+    def panned(self, dx: float, dy: float) -> View:
+        return self._replace(x_min=self.x_min + dx, x_max=self.x_max + dx, y_min=self.y_min + dy, y_max=self.y_max + dy)
+
+    def zoomed(self, x: float, y: float, factor: float) -> View:
+        """The view scaled by `factor` around the point (`x`, `y`), which stays in place."""
+        return self._replace(
+            x_min=x + (self.x_min - x) * factor, x_max=x + (self.x_max - x) * factor,
+            y_min=y + (self.y_min - y) * factor, y_max=y + (self.y_max - y) * factor,
+        )
+
+    def grid_step(self) -> float:
+        """Power of two spacing of the grid, so views of nearby sizes share it."""
+        return 2.0 ** math.floor(math.log2((self.x_max - self.x_min) / BASE_INTERVALS))
+
+    def resolution(self) -> float:
+        """Spacing of the finest lattice points the view is sampled at, half a pixel or a little less."""
+        step: float = self.grid_step()
+        return step / 2 ** max(0, math.ceil(math.log2(step * 2 * self.width / (self.x_max - self.x_min))))
+
+
+class Sampler:
+    """Samples of a program over `x`, sorted by `x` and kept across views."""
+
+    def __init__(self, program: Program, budget: EvaluationBudget = SAMPLE_BUDGET) -> None:
+        self.program: Program = program
+        self.budget: EvaluationBudget = budget
+        self.xs: list[float] = []
+        self.ys: list[float] = []
+        # Start of the grid intervals refined for the grid step, resolution and tolerance of `refinement`
+        self.refined: set[float] = set()
+        self.refinement: tuple[float, float, float] = (0.0, 0.0, 0.0)
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def value(self, x: float) -> float:
+        """The value at `x`, nan where the program is not defined or does not run within the budget."""
+        try:
+            return float(run(program=self.program, variables={Token.variable: x}, guard=BudgetGuard(budget=self.budget)))
+        except (ArithmeticError, ValueError):
+            return math.nan
+
+    def evaluate(self, x: float) -> tuple[float, bool]:
+        """The value at `x`, and whether it had to be computed rather than found among the samples."""
+        index: int = bisect_left(self.xs, x)
+        if index < len(self.xs) and self.xs[index] == x:
+            return self.ys[index], False
+        y: float = self.value(x=x)
+        self.xs.insert(index, x)
+        self.ys.insert(index, y)
+        return y, True
+
+    def sample(self, view: View, tolerance_pixels: float = DEFAULT_TOLERANCE_PIXELS) -> Iterator[None]:
+        """Evaluate the samples `view` needs that are missing, yielding after each one so the caller can stop and resume."""
+        self._evict(view=view)
+        step: float = view.grid_step()
+        resolution: float = view.resolution()
+        tolerance: float = tolerance_pixels * (view.y_max - view.y_min) / max(1, view.height)
+        if self.refinement != (step, resolution, tolerance):
+            self.refinement = (step, resolution, tolerance)
+            self.refined.clear()
+
+        # One grid point past each edge, so lines leave the view rather than stop short of it
+        grid: list[float] = [k * step for k in range(math.floor(view.x_min / step) - 1, math.ceil(view.x_max / step) + 2)]
+        for x in grid:
+            if self.evaluate(x=x)[1]:
+                yield
+
+        for a, b in zip(grid, grid[1:]):
+            # Panning only refines the intervals it exposes
+            if a in self.refined:
+                continue
+            intervals: list[tuple[float, float]] = [(a, b)]
+            while intervals:
+                left, right = intervals.pop()
+                if right - left <= resolution:
+                    continue
+                middle: float = (left + right) / 2
+                y_middle, computed = self.evaluate(x=middle)
+                if computed:
+                    yield
+                if _bends(y_left=self.evaluate(x=left)[0], y_middle=y_middle, y_right=self.evaluate(x=right)[0], tolerance=tolerance):
+                    intervals.append((middle, right))
+                    intervals.append((left, middle))
+            self.refined.add(a)
+
+    def polylines(self, view: View) -> list[list[float]]:
+        """Screen coordinates of the curve in `view`, as flat x, y lists broken where it is undefined or has a pole."""
+        resolution: float = view.resolution()
+        x_scale: float = view.width / (view.x_max - view.x_min)
+        y_scale: float = view.height / (view.y_max - view.y_min)
+        y_span: float = view.y_max - view.y_min
+        clamp: float = CLAMP_VIEW_HEIGHTS * view.height
+
+        polylines: list[list[float]] = []
+        line: list[float] = []
+        previous: float = math.nan
+        step: float = view.grid_step()
+        start: int = bisect_left(self.xs, view.x_min - step)
+        stop: int = bisect_right(self.xs, view.x_max + step)
+        for x, y in zip(self.xs[start:stop], self.ys[start:stop]):
+            # Samples finer than the view needs, left from zooming in, are skipped
+            if math.fmod(x, resolution):
+                continue
+            if not math.isfinite(y) or abs(y - previous) > y_span and (y > 0) != (previous > 0):
+                # Undefined, or across a pole: a jump taller than the view between neighbours half a pixel apart
+                if len(line) >= 4:
+                    polylines.append(line)
+                line = []
+            previous = y
+            if math.isfinite(y):
+                line.append((x - view.x_min) * x_scale)
+                line.append(min(clamp, max(-clamp, (view.y_max - y) * y_scale)))
+        if len(line) >= 4:
+            polylines.append(line)
+        return polylines
+
+    def _evict(self, view: View) -> None:
+        if len(self.xs) <= MAX_CACHED_SAMPLES:
+            return
+        span: float = view.x_max - view.x_min
+        start: int = bisect_left(self.xs, view.x_min - span)
+        stop: int = bisect_right(self.xs, view.x_max + span)
+        self.xs = self.xs[start:stop]
+        self.ys = self.ys[start:stop]
+        self.refined.clear()
+
+
+def _bends(y_left: float, y_middle: float, y_right: float, tolerance: float) -> bool:
+    """Whether the curve through three equally spaced samples is too far from straight, or crosses the edge of the domain."""
+    finite: int = math.isfinite(y_left) + math.isfinite(y_middle) + math.isfinite(y_right)
+    if finite < 3:
+        return finite > 0
+    return abs(y_middle - (y_left + y_right) / 2) > tolerance
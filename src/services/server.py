@@ -0,0 +1,190 @@
+"""Calculator engine served as JSON lines over a Unix socket or TCP.
+
+Every request is a JSON object on its own line, with an optional `id` echoed
+in its response, and an `op`:
+
+- `evaluate` evaluates `expression`, written in calculator syntax, in one shot.
+- `send_token`, `backspace_expression`, `clear_expression` and `toggle_mode`
+  edit the expression of `session`, as the calculator keys do, and respond
+  with the resulting `expression`.
+- `evaluate_expression` evaluates the expression of `session`.
+
+Responses carry `result` or `error`. Requests can be pipelined: a connection
+keeps reading while earlier requests are evaluated, and responses are written
+in request order. Once `MAX_PIPELINED_REQUESTS` are pending it stops reading,
+so a client that does not consume its responses is slowed down by the socket
+instead of growing the server memory.
+"""
+import asyncio
+import json
+
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Awaitable, Optional
+
+from src.services.batch_service import available_cores
+from src.services.budget import BudgetGuard, EvaluationBudget
+from src.services.engine import evaluate
+from src.services.parallel import PARALLEL_MIN_TOKENS, evaluate_parallel
+from src.services.session import Session, SessionPool
+from src.services.tokens import Token, tokenize
+
+from src.utils.lazy_logger import LazyLogger
+
+logger: LazyLogger = LazyLogger(name=__name__)
+
+DEFAULT_HOST: str = '127.0.0.1'
+DEFAULT_PORT: int = 8765
+MAX_LINE_BYTES: int = 1 << 20
+MAX_PIPELINED_REQUESTS: int = 64
+# Expressions with fewer tokens are evaluated on the event loop, sending them to a worker would cost more
+INLINE_EVALUATION_TOKENS: int = 256
+
+SESSION_OPERATIONS: dict[str, str] = {
+    'backspace_expression': 'backspace_expression',
+    'clear_expression': 'clear_expression',
+    'toggle_mode': 'toggle_mode',
+}
+
+
+class RequestError(Exception):
+    pass
+
+
+def evaluate_with_budget(tokens: tuple[str, ...], budget: EvaluationBudget) -> int | float:
+    """Evaluate `tokens` within `budget`, in whichever process runs it."""
+    return evaluate(tokens=tokens, guard=BudgetGuard(budget=budget))
+
+
+class CalculatorServer:
+
+    def __init__(
+        self, executor: Executor, workers: int = 1, sessions: Optional[SessionPool] = None, budget: EvaluationBudget = EvaluationBudget()
+    ) -> None:
+        self.executor: Executor = executor
+        self.workers: int = workers
+        self.sessions: SessionPool = sessions if sessions is not None else SessionPool()
+        self.budget: EvaluationBudget = budget
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        responses: asyncio.Queue[Optional[Awaitable[dict[str, Any]]]] = asyncio.Queue(maxsize=MAX_PIPELINED_REQUESTS)
+        sender: asyncio.Task[None] = asyncio.create_task(self._send_responses(responses=responses, writer=writer))
+        try:
+            while True:
+                try:
+                    line: bytes = await reader.readline()
+                except ValueError:
+                    await responses.put(self._completed(response={'error': f'Request longer than {MAX_LINE_BYTES} bytes'}))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    # Blocks once the client has too many requests pending, which stops reading the socket
+                    await responses.put(self.handle_request(line=line))
+        except ConnectionError:
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                # The client went away first, there is nothing left to flush
+                pass
+
+    def handle_request(self, line: bytes) -> Awaitable[dict[str, Any]]:
+        """Apply a request and return an awaitable of its response.
+
+        Session edits are applied right away, so they keep their order, only
+        evaluations are awaited later.
+        """
+        request_id: Any = None
+        try:
+            request: Any = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError('Request must be a JSON object')
+            request_id = request.get('id')
+            result: Any = self._dispatch(request=request)
+        except (RequestError, ValueError) as e:
+            return self._completed(response={'id': request_id, 'error': f'{type(e).__name__}: {e}'})
+
+        if isinstance(result, asyncio.Future):
+            return self._response_of(request_id=request_id, evaluation=result)
+        return self._completed(response={'id': request_id, **result})
+
+    def _dispatch(self, request: dict[str, Any]) -> dict[str, Any] | asyncio.Future[int | float]:
+        operation: Any = request.get('op')
+        if operation == 'evaluate':
+            expression: Any = request.get('expression')
+            if not isinstance(expression, str):
+                raise RequestError('evaluate needs an expression string')
+            return self._evaluate(tokens=tuple(tokenize(text=expression)))
+
+        session_id: Any = request.get('session')
+        if not isinstance(session_id, str):
+            raise RequestError(f'{operation} needs a session id string')
+        session: Session = self.sessions.get(session_id=session_id)
+
+        if operation == 'send_token':
+            session.send_token(token=Token(request.get('token')))
+        elif operation in SESSION_OPERATIONS:
+            getattr(session, SESSION_OPERATIONS[operation])()
+        elif operation == 'evaluate_expression':
+            return self._evaluate(tokens=tuple(session.tokens))
+        else:
+            raise RequestError(f'Unknown operation {operation!r}')
+        return {'expression': session.get_expression(), 'scientific_mode': session.scientific_mode}
+
+    def _evaluate(self, tokens: tuple[str, ...]) -> asyncio.Future[int | float]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if len(tokens) < INLINE_EVALUATION_TOKENS:
+            future: asyncio.Future[int | float] = loop.create_future()
+            try:
+                future.set_result(evaluate_with_budget(tokens=tokens, budget=self.budget))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if len(tokens) >= PARALLEL_MIN_TOKENS:
+            # Split over every worker by a thread of the default executor, which waits for their results
+            return loop.run_in_executor(None, evaluate_parallel, tokens, self.executor, self.workers, None, self.budget)
+        return loop.run_in_executor(self.executor, evaluate_with_budget, tokens, self.budget)
+
+    @staticmethod
+    async def _response_of(request_id: Any, evaluation: asyncio.Future[int | float]) -> dict[str, Any]:
+        try:
+            return {'id': request_id, 'result': await evaluation}
+        except Exception as e:
+            return {'id': request_id, 'error': f'{type(e).__name__}: {e}'}
+
+    @staticmethod
+    async def _completed(response: dict[str, Any]) -> dict[str, Any]:
+        return response
+
+    @staticmethod
+    async def _send_responses(responses: asyncio.Queue[Optional[Awaitable[dict[str, Any]]]], writer: asyncio.StreamWriter) -> None:
+        connected: bool = True
+        while (pending := await responses.get()) is not None:
+            response: dict[str, Any] = await pending
+            if not connected:
+                # Keep consuming so the reading side never blocks on a full queue
+                continue
+            writer.write(json.dumps(response).encode() + b'\n')
+            try:
+                # Returns at once unless the client is not reading its responses
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: Optional[str] = None, workers: Optional[int] = None) -> None:
+    """Serve until cancelled, on the Unix socket at `path` when given and on TCP `host`:`port` otherwise."""
+    workers = workers or available_cores()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        server: CalculatorServer = CalculatorServer(executor=executor, workers=workers)
+        if path is not None:
+            listener: asyncio.AbstractServer = await asyncio.start_unix_server(server.handle_connection, path=path, limit=MAX_LINE_BYTES)
+        else:
+            listener = await asyncio.start_server(server.handle_connection, host=host, port=port, limit=MAX_LINE_BYTES)
+        async with listener:
+            logger.info(msg=f'Serving on {", ".join(str(socket.getsockname()) for socket in listener.sockets)}')
+            await listener.serve_forever()
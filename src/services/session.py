@@ -0,0 +1,175 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Callable, Iterator, Optional, Sequence
+
+from src.services.engine import Edit, edit_for_text, edit_for_token, evaluate, normalize_result, number_start
+from src.services.tokens import Token
+
+from src.utils.lazy_logger import LazyLogger
+
+logger: LazyLogger = LazyLogger(name=__name__)
+
+# Every token an expression can hold, a session stores the index of each one in a byte
+TOKENS: tuple[str, ...] = (
+    *'0123456789', ',', '+', '-', '*', '/', '^', '(', ')', 'π', 'x',
+    Token.sin.value, Token.cos.value, Token.tan.value, Token.sqrt.value, Token.log.value, Token.ln.value, Token.exp.value,
+)
+TOKEN_CODES: dict[str, int] = {token: code for code, token in enumerate(TOKENS)}
+
+DEFAULT_MAX_SESSIONS: int = 100_000
+DEFAULT_IDLE_TIMEOUT_SECONDS: float = 15 * 60
+
+
+class TokenView(Sequence[str]):
+    """Read-only view decoding the token codes of a session on access."""
+
+    __slots__ = ('codes',)
+
+    def __init__(self, codes: array) -> None:
+        self.codes: array = codes
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:  # type: ignore[override]
+        return TOKENS[self.codes[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        return (TOKENS[code] for code in self.codes)
+
+
+class Session:
+    """Per-user calculator state kept as small as possible, for servers holding many users at once.
+
+    The expression is an `array('B')` of token codes and nothing is indexed per
+    token: the parenthesis depth is a counter and the number being typed is found
+    by scanning back from the end. Parsing and evaluation go through the stateless
+    `engine`, so a session holds no parser, cache or metrics of its own.
+
+    An empty session takes about 190 bytes, 320 with its entry in a `SessionPool`,
+    and each token one more byte. A `CalculatorService` takes about 1 KB and 250
+    bytes per token. `benchmarks.engine.benchmark_sessions` measures both.
+    """
+
+    __slots__ = ('codes', 'depth', 'last_result', 'scientific_mode', 'last_used')
+
+    def __init__(self) -> None:
+        self.codes: array = array('B')
+        self.depth: int = 0
+        self.last_result: float = 0.0
+        self.scientific_mode: bool = False
+        self.last_used: float = monotonic()
+
+    @property
+    def tokens(self) -> TokenView:
+        return TokenView(codes=self.codes)
+
+    def send_token(self, token: Token) -> None:
+        tokens: TokenView = self.tokens
+        start: int = number_start(tokens=tokens)
+        edit: Optional[Edit] = edit_for_token(
+            token=token,
+            tokens=tokens,
+            depth=self.depth,
+            number_start=start,
+            number_has_decimal=start != -1 and TOKEN_CODES[','] in self.codes[start:],
+        )
+        if edit is not None:
+            self._splice(edit=edit)
+
+    def insert_text(self, text: str) -> None:
+        """Append an expression written in calculator syntax, raising ValueError when it is not."""
+        self._splice(edit=edit_for_text(text=text, tokens=self.tokens))
+
+    def backspace_expression(self) -> None:
+        if self.codes:
+            self._splice(edit=Edit(start=len(self.codes) - 1, stop=len(self.codes), tokens=[]))
+
+    def clear_expression(self) -> None:
+        del self.codes[:]
+        self.depth = 0
+
+    def toggle_mode(self) -> None:
+        self.scientific_mode = not self.scientific_mode
+
+    def get_expression(self) -> str:
+        return ''.join(self.tokens)
+
+    def evalutate_expression(self) -> int | float:
+        """Evaluate the expression, keeping the last result when it is malformed."""
+        if self.codes:
+            try:
+                self.last_result = evaluate(tokens=tuple(self.tokens))
+            except Exception as e:
+                logger.warning(msg=f'Could not calculate result due to malformed expression. Reason: {e}')
+        return normalize_result(value=self.last_result)
+
+    def _splice(self, edit: Edit) -> None:
+        removed: array = self.codes[edit.start:edit.stop]
+        self.codes[edit.start:edit.stop] = array('B', [TOKEN_CODES[token] for token in edit.tokens])
+        self.depth += edit.tokens.count('(') - edit.tokens.count(')') - removed.count(TOKEN_CODES['(']) + removed.count(TOKEN_CODES[')'])
+
+
+class SessionPool:
+    """Sessions by id, evicting those idle for longer than `idle_timeout` and the least recently used beyond `max_sessions`.
+
+    Sessions are kept in order of last use, so eviction only ever looks at the
+    oldest ones. The pool is thread-safe; a session itself must only be used by
+    one thread at a time.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT_SECONDS,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        if max_sessions < 1:
+            raise ValueError('max_sessions must be a positive number')
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self.clock: Callable[[], float] = clock
+        self.evictions: int = 0
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str) -> Session:
+        """The session with `session_id`, created if it does not exist or was evicted."""
+        now: float = self.clock()
+        with self._lock:
+            session: Optional[Session] = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session()
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            self._evict(now=now)
+            return session
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self) -> int:
+        """Drop the sessions idle for longer than `idle_timeout` and return how many were dropped."""
+        with self._lock:
+            return self._evict(now=self.clock())
+
+    def _evict(self, now: float) -> int:
+        evicted: int = 0
+        while self._sessions:
+            oldest: Session = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+        self.evictions += evicted
+        return evicted
@@ -0,0 +1,103 @@
+from enum import StrEnum
+from typing import Iterable
+
+
+class Token(StrEnum):
+
+    # Digits
+    zero: str = '0'
+    one: str = '1'
+    two: str = '2'
+    three: str = '3'
+    four: str = '4'
+    five: str = '5'
+    six: str = '6'
+    seven: str = '7'
+    eight: str = '8'
+    nine: str = '9'
+
+    # Operators
+    plus: str = '+'
+    minus: str = '-'
+    multiply: str = '*'
+    divide: str = '/'
+    negate: str = '+/-'
+
+    # Other
+    parenthesis: str = '()'
+    decimal: str = ','
+
+    # Scientific functions
+    sin: str = 'sin'
+    cos: str = 'cos'
+    tan: str = 'tan'
+    sqrt: str = '√'
+    power: str = '^'
+    log: str = 'log'
+    ln: str = 'ln'
+    exp: str = 'e^x'
+    pi: str = 'π'
+
+    # Variables
+    variable: str = 'x'
+
+
+DIGIT_TOKENS: set[Token] = {token for token in Token if token.value.isdigit()}
+OPERATORS_TOKENS: set[Token] = {Token.plus, Token.minus, Token.multiply, Token.divide, Token.power}
+SCIENTIFIC_FUNCTIONS: set[Token] = {Token.sin, Token.cos, Token.tan, Token.sqrt, Token.log, Token.ln, Token.exp}
+SYMBOL_TOKENS: set[Token] = {Token.pi, Token.variable}
+
+PRECEDENCE: dict[str, int] = {
+    Token.plus: 1,
+    Token.minus: 1,
+    Token.multiply: 2,
+    Token.divide: 2,
+    Token.power: 3,
+    **{function: 4 for function in SCIENTIFIC_FUNCTIONS},
+}
+
+
+def precedence(operator: str) -> int:
+    return PRECEDENCE.get(operator, 5)
+
+
+SINGLE_CHARACTER_TOKENS: set[str] = set('0123456789,+-*/^()') | {Token.sqrt, Token.pi, Token.variable}
+# Longest names first, so 'e^x' is not read as an unknown 'e'
+FUNCTION_NAMES: list[str] = sorted((function.value for function in SCIENTIFIC_FUNCTIONS if len(function.value) > 1), key=len, reverse=True)
+
+
+def tokenize(text: str, variables: Iterable[str] = ()) -> list[str]:
+    """Split an expression written in calculator syntax, e.g. '2,5*sin(30)+π', into tokens.
+
+    Names in `variables`, such as the columns of a data file, are read as single
+    tokens. They must be identifiers other than the function names. Decimal
+    points may be written '.' as well as ','.
+    """
+    # Variables can start like x or π, so with any of them every name is matched longest first
+    names: list[str] = FUNCTION_NAMES
+    if variables:
+        names = sorted({*FUNCTION_NAMES, *variables, Token.variable.value, Token.pi.value}, key=len, reverse=True)
+    tokens: list[str] = []
+    i: int = 0
+    while i < len(text):
+        character: str = text[i]
+        if character.isspace():
+            i += 1
+            continue
+        if character == '.':
+            # Decimal points as most other programs write them
+            tokens.append(',')
+            i += 1
+            continue
+        if character in SINGLE_CHARACTER_TOKENS and not (variables and character.isalpha()):
+            tokens.append(character)
+            i += 1
+            continue
+        for name in names:
+            if text.startswith(name, i):
+                tokens.append(name)
+                i += len(name)
+                break
+        else:
+            raise ValueError(f'Unexpected character {character!r} at position {i + 1}')
+    return tokens
@@ -0,0 +1,204 @@
+"""Keystroke traces of real sessions and their headless replay.
+
+A trace starts with `MAGIC`, then holds one event per key press:
+
+    delay  u32  microseconds since the previous event
+    key    u8   index of the key in `KEYS`
+
+The outcome of a calculation follows the `=` event it belongs to as a
+`RESULT` event, whose key byte is followed by a u16 length and the outcome
+text, so replaying a trace can check it computes the same results. Text
+pasted into the expression is a `PASTE` event, laid out the same way with the
+pasted text.
+"""
+from __future__ import annotations
+
+import struct
+import time
+
+from typing import BinaryIO, Callable, NamedTuple, Optional
+
+from src.services.budget import BudgetGuard
+from src.services.calculator_service import CalculatorService
+from src.services.tokens import Token
+
+MAGIC: bytes = b'CALCTRC\x01'
+EVENT: struct.Struct = struct.Struct('<IB')
+RESULT_LENGTH: struct.Struct = struct.Struct('<H')
+MAX_DELAY_MICROSECONDS: int = (1 << 32) - 1
+
+# Keys that are not tokens, by the value of the `Action` pressing them, and the service method they call
+ACTIONS: dict[str, str] = {
+    'SCI': 'toggle_mode',
+    'C': 'clear_expression',
+    '⌫': 'backspace_expression',
+    '=': 'evalutate_expression',
+    '↶': 'undo',
+    '↷': 'redo',
+}
+# Every key a trace can hold, new keys go at the end so older traces keep their meaning
+KEYS: tuple[str, ...] = (
+    *'0123456789', '+', '-', '*', '/', '^', '+/-', '()', ',', 'π', 'x',
+    Token.sin.value, Token.cos.value, Token.tan.value, Token.sqrt.value, Token.log.value, Token.ln.value, Token.exp.value,
+    *ACTIONS,
+)
+KEY_CODES: dict[str, int] = {key: code for code, key in enumerate(KEYS)}
+RESULT: int = 255
+PASTE: int = 254
+# Key of paste events, which are not pressed on the keyboard
+PASTE_KEY: str = 'paste'
+
+
+class TraceEvent(NamedTuple):
+    seconds: float
+    key: str
+    # Outcome of a calculation as recorded, for `=` events
+    result: Optional[str] = None
+    # Text pasted, for paste events
+    text: Optional[str] = None
+
+
+class Mismatch(NamedTuple):
+    event: int
+    expression: str
+    recorded: str
+    replayed: str
+
+
+class ReplayReport(NamedTuple):
+    # Seconds taken by each event, by the name of the action it replays
+    latencies: dict[str, list[float]]
+    checked_results: int
+    mismatches: list[Mismatch]
+    seconds: float
+
+
+def outcome_text(outcome: int | float | Exception) -> str:
+    """How a calculation outcome is recorded, errors by their type only."""
+    return f'!{type(outcome).__name__}' if isinstance(outcome, Exception) else str(outcome)
+
+
+class TraceRecorder:
+    """Writes the keys pressed, and the outcome of the calculations, to a binary trace."""
+
+    def __init__(self, file: BinaryIO, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.file: BinaryIO = file
+        self.clock: Callable[[], float] = clock
+        self.last_event: float = clock()
+        file.write(MAGIC)
+
+    def record_key(self, key: str) -> None:
+        now: float = self.clock()
+        delay: int = min(MAX_DELAY_MICROSECONDS, round((now - self.last_event) * 1e6))
+        self.last_event = now
+        self.file.write(EVENT.pack(delay, KEY_CODES[key]))
+
+    def record_result(self, outcome: int | float | Exception) -> None:
+        self.file.write(EVENT.pack(0, RESULT) + _length_prefixed(text=outcome_text(outcome=outcome)))
+        # Calculations are rare, flushing on each one loses little of a session that crashes
+        self.file.flush()
+
+    def record_paste(self, text: str) -> None:
+        now: float = self.clock()
+        delay: int = min(MAX_DELAY_MICROSECONDS, round((now - self.last_event) * 1e6))
+        self.last_event = now
+        self.file.write(EVENT.pack(delay, PASTE) + _length_prefixed(text=text))
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def _length_prefixed(text: str) -> bytes:
+    # Cut at a character boundary when too long for the length
+    data: bytes = text.encode()[:0xFFFF].decode(errors='ignore').encode()
+    return RESULT_LENGTH.pack(len(data)) + data
+
+
+def read_trace(file: BinaryIO) -> list[TraceEvent]:
+    data: bytes = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('Not a keystroke trace')
+    events: list[TraceEvent] = []
+    seconds: float = 0.0
+    offset: int = len(MAGIC)
+    while offset + EVENT.size <= len(data):
+        delay, code = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        seconds += delay / 1e6
+        if code != RESULT and code != PASTE:
+            events.append(TraceEvent(seconds=seconds, key=KEYS[code]))
+            continue
+        (length,) = RESULT_LENGTH.unpack_from(data, offset)
+        offset += RESULT_LENGTH.size
+        text: str = data[offset:offset + length].decode()
+        offset += length
+        if code == PASTE:
+            events.append(TraceEvent(seconds=seconds, key=PASTE_KEY, text=text))
+            continue
+        # The result belongs to the last calculation, keys may have been pressed while it was running
+        for index in range(len(events) - 1, -1, -1):
+            if events[index].key == '=':
+                events[index] = events[index]._replace(result=text)
+                break
+    return events
+
+
+def replay(events: list[TraceEvent], speed: Optional[float] = None, calculator: Optional[CalculatorService] = None) -> ReplayReport:
+    """Drive a calculator with `events` and time each one, as fast as possible or at `speed` times the recorded pacing.
+
+    Every key is followed by what the application does after it: a preview of
+    the result for edits, a full evaluation for `=`, whose outcome is checked
+    against the recorded one. Pasted text is inserted as the application does,
+    text it rejects leaves the expression unchanged.
+    """
+    calculator = calculator if calculator is not None else CalculatorService()
+    latencies: dict[str, list[float]] = {}
+    mismatches: list[Mismatch] = []
+    checked_results: int = 0
+    started: float = time.perf_counter()
+
+    for index, event in enumerate(events):
+        if speed is not None:
+            delay: float = started + event.seconds / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        action: str = 'insert_text' if event.key == PASTE_KEY else ACTIONS.get(event.key, 'send_token')
+        event_started: float = time.perf_counter()
+        if action == 'evalutate_expression':
+            expression: str = calculator.get_expression()
+            outcome: int | float | Exception = calculation_outcome(calculator=calculator)
+        else:
+            if action == 'send_token':
+                calculator.send_token(token=Token(event.key))
+            elif action == 'insert_text':
+                try:
+                    calculator.insert_text(text=event.text or '')
+                except ValueError:
+                    pass
+            else:
+                getattr(calculator, action)()
+            if action != 'toggle_mode':
+                calculator.preview_result()
+        latencies.setdefault(action, []).append(time.perf_counter() - event_started)
+
+        if action == 'evalutate_expression' and event.result is not None:
+            checked_results += 1
+            if outcome_text(outcome=outcome) != event.result:
+                mismatches.append(
+                    Mismatch(event=index, expression=expression, recorded=event.result, replayed=outcome_text(outcome=outcome))
+                )
+
+    return ReplayReport(latencies=latencies, checked_results=checked_results, mismatches=mismatches, seconds=time.perf_counter() - started)
+
+
+def calculation_outcome(calculator: CalculatorService) -> int | float | Exception:
+    """Calculate the expression as the calculate key does, within the same budget.
+
+    Returns the accepted result, or the error that left the expression unchanged.
+    """
+    try:
+        value: float = calculator.evaluation_task()(BudgetGuard())
+    except Exception as e:
+        return e
+    return calculator.accept_result(outcome=value)
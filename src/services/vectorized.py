@@ -0,0 +1,140 @@
+import math
+
+from typing import Callable, Mapping, NamedTuple, Optional
+
+import numpy as np
+
+from src.services.bytecode import (
+    ADD,
+    COS,
+    DIVIDE,
+    EXP,
+    LN,
+    LOAD_CONST,
+    LOAD_SLOT,
+    LOAD_VARIABLE,
+    LOG,
+    MULTIPLY,
+    OPCODE_BITS,
+    OPCODE_MASK,
+    POWER,
+    SIN,
+    SQRT,
+    STORE_SLOT,
+    SUBTRACT,
+    TAN,
+    Program
+)
+from src.services.operations import DEFAULT_MAX_RESULT_BITS
+
+# NumPy counterparts of the bytecode operations, indexed by opcode
+UFUNCS: list[Optional[Callable[..., np.ndarray]]] = [
+    {
+        ADD: np.add,
+        SUBTRACT: np.subtract,
+        MULTIPLY: np.multiply,
+        DIVIDE: np.true_divide,
+        POWER: np.power,
+        SIN: lambda operand: np.sin(np.radians(operand)),
+        COS: lambda operand: np.cos(np.radians(operand)),
+        TAN: lambda operand: np.tan(np.radians(operand)),
+        SQRT: np.sqrt,
+        LOG: np.log10,
+        LN: np.log,
+        EXP: np.exp,
+    }.get(opcode) for opcode in range(LOAD_VARIABLE + 1)
+]
+
+
+def _power_raises(result: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    # Results too large for the default budget are refused upfront, overflows raise and negative bases give complex numbers
+    return (
+        (right > 1) & (np.abs(left) > 1) & (right * np.log2(np.abs(left)) > DEFAULT_MAX_RESULT_BITS)
+        | np.isinf(result) & np.isfinite(left) & np.isfinite(right)
+        | (left < 0) & np.isfinite(right) & (right != np.floor(right))
+    )
+
+
+# Elements where each operation raises in `run`, from its result and operands, indexed by opcode. Float +, - and * go
+# to inf or nan there without raising, they flag nothing
+RAISES: list[Optional[Callable[..., np.ndarray]]] = [
+    {
+        DIVIDE: lambda result, left, right: right == 0,
+        POWER: _power_raises,
+        SIN: lambda result, operand: np.isinf(operand),
+        COS: lambda result, operand: np.isinf(operand),
+        TAN: lambda result, operand: np.isinf(operand),
+        SQRT: lambda result, operand: operand < 0,
+        LOG: lambda result, operand: operand <= 0,
+        LN: lambda result, operand: operand <= 0,
+        EXP: lambda result, operand: np.isinf(result) & np.isfinite(operand),
+    }.get(opcode) for opcode in range(LOAD_VARIABLE + 1)
+]
+
+
+class BatchResult(NamedTuple):
+    values: np.ndarray
+    errors: np.ndarray
+
+
+def run_vectorized(program: Program, variables: Mapping[str, np.ndarray]) -> BatchResult:
+    """Execute `program` once over whole arrays of variable values.
+
+    Domain errors, division by zero and overflow do not raise like in `run`, the
+    affected elements are flagged in `errors` and their value is left as NumPy
+    computed it (nan or inf). Elements are flagged where `run` raises: values
+    that go to inf or nan without raising there, like a float sum past the
+    largest float, are not. Exact constants too large for a float flag every
+    element, as `run` raises once they meet a float.
+    """
+    try:
+        values: list[np.ndarray] = [np.asarray(variables[name], dtype=np.float64) for name in program.variables]
+    except KeyError as e:
+        raise NameError(f'Variable {e.args[0]} has no value') from None
+
+    shape: tuple[int, ...] = np.broadcast_shapes(*(np.shape(value) for value in variables.values()))
+    errors: np.ndarray = np.zeros(shape=shape, dtype=np.bool_)
+    # Exact constants are computed with as floats, like every element
+    constants: list[float] = []
+    for constant in program.constants:
+        try:
+            constants.append(float(constant))
+        except OverflowError:
+            constants.append(math.inf if constant > 0 else -math.inf)
+            errors[...] = True
+    ufuncs: list[Optional[Callable[..., np.ndarray]]] = UFUNCS
+    raises: list[Optional[Callable[..., np.ndarray]]] = RAISES
+    slots: list[np.ndarray | float] = [0.0] * program.slots
+    stack: list[np.ndarray | float] = []
+    push = stack.append
+    pop = stack.pop
+
+    with np.errstate(all='ignore'):
+        for instruction in program.code:
+            opcode: int = instruction & OPCODE_MASK
+            if opcode == LOAD_CONST:
+                push(constants[instruction >> OPCODE_BITS])
+                continue
+            if opcode == LOAD_VARIABLE:
+                push(values[instruction >> OPCODE_BITS])
+                continue
+            if opcode == LOAD_SLOT:
+                push(slots[instruction >> OPCODE_BITS])
+                continue
+            if opcode == STORE_SLOT:
+                slots[instruction >> OPCODE_BITS] = stack[-1]
+                continue
+            check: Optional[Callable[..., np.ndarray]] = raises[opcode]
+            if opcode <= POWER:
+                right: np.ndarray | float = pop()
+                left: np.ndarray | float = stack[-1]
+                stack[-1] = ufuncs[opcode](left, right)
+                if check is not None:
+                    errors |= check(stack[-1], left, right)
+            else:
+                operand: np.ndarray | float = stack[-1]
+                stack[-1] = ufuncs[opcode](operand)
+                if check is not None:
+                    errors |= check(stack[-1], operand)
+
+    return BatchResult(values=np.broadcast_to(stack[0], shape).astype(np.float64, copy=True), errors=errors)
@@ -0,0 +1,18 @@
+from typing import Any
+
+
+class LazyLogger:
+    """Stands for `logging.getLogger(name)`, importing `logging` the first time it is used.
+
+    Importing `logging` costs more than most of the modules that log, so the
+    modules headless uses import hold one of these instead of a `Logger`.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        from logging import getLogger
+
+        return getattr(getLogger(name=self.name), attribute)
@@ -0,0 +1,135 @@
+import json
+
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+# Latency buckets from 1µs to ~8s and length buckets from 1 to ~1M tokens, both doubling
+LATENCY_BUCKETS: list[float] = [1e-6 * 2 ** exponent for exponent in range(24)]
+LENGTH_BUCKETS: list[float] = [float(2 ** exponent) for exponent in range(21)]
+
+
+class Histogram:
+
+    def __init__(self, bounds: list[float]) -> None:
+        self.bounds: list[float] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, `inf` when it overflows the last bucket."""
+        rank: float = q * self.count
+        seen: int = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(q=0.5),
+            'p99': self.quantile(q=0.99),
+            'buckets': [[bound, count] for bound, count in zip([*self.bounds, float('inf')], self.counts) if count],
+        }
+
+
+class Metrics:
+    """Latency histograms and error counts per pipeline stage, plus the distribution of expression lengths.
+
+    Stages are measured by wrapping the callables given to `instrument`, so code
+    that is not instrumented pays nothing at all.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self.expression_lengths: Histogram = Histogram(bounds=LENGTH_BUCKETS)
+        self._lock: Lock = Lock()
+
+    def instrument(self, stage: str, function: Callable[..., Any], length: Optional[Callable[..., int]] = None) -> Callable[..., Any]:
+        """Wrap `function` to time each call as `stage`; `length` extracts the expression length from its arguments."""
+        histogram: Histogram = self.latencies.setdefault(stage, Histogram(bounds=LATENCY_BUCKETS))
+        self.errors.setdefault(stage, 0)
+
+        @wraps(function)
+        def instrumented(*args: Any, **kwargs: Any) -> Any:
+            started: float = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.errors[stage] += 1
+                raise
+            finally:
+                elapsed: float = perf_counter() - started
+                with self._lock:
+                    histogram.observe(value=elapsed)
+                    if length is not None:
+                        self.expression_lengths.observe(value=length(*args, **kwargs))
+
+        return instrumented
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'latency_seconds': {stage: histogram.snapshot() for stage, histogram in self.latencies.items()},
+                'errors': dict(self.errors),
+                'expression_length': self.expression_lengths.snapshot(),
+            }
+
+    def dump(self, format: str = 'json') -> str:
+        if format == 'json':
+            return json.dumps(self.snapshot(), indent=2)
+        if format == 'prometheus':
+            return self._dump_prometheus()
+        raise ValueError(f'Unknown metrics format {format!r}')
+
+    def _dump_prometheus(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            lines += [
+                '# HELP calculator_stage_seconds Latency of each evaluation pipeline stage.',
+                '# TYPE calculator_stage_seconds histogram',
+            ]
+            for stage, histogram in self.latencies.items():
+                lines += self._prometheus_histogram(name='calculator_stage_seconds', labels=[f'stage="{stage}"'], histogram=histogram)
+
+            lines += [
+                '# HELP calculator_stage_errors_total Calls of each stage that raised.',
+                '# TYPE calculator_stage_errors_total counter',
+            ]
+            for stage, errors in self.errors.items():
+                lines.append(f'calculator_stage_errors_total{{stage="{stage}"}} {errors}')
+
+            lines += [
+                '# HELP calculator_expression_length Tokens in the evaluated expressions.',
+                '# TYPE calculator_expression_length histogram',
+            ]
+            lines += self._prometheus_histogram(name='calculator_expression_length', labels=[], histogram=self.expression_lengths)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _prometheus_histogram(name: str, labels: list[str], histogram: Histogram) -> list[str]:
+        lines: list[str] = []
+        cumulative: int = 0
+        for bound, count in zip([*histogram.bounds, float('inf')], histogram.counts):
+            cumulative += count
+            le: str = '+Inf' if bound == float('inf') else repr(bound)
+            bucket_labels: str = ','.join([*labels, f'le="{le}"'])
+            lines.append(f'{name}_bucket{{{bucket_labels}}} {cumulative}')
+        selector: str = f'{{{",".join(labels)}}}' if labels else ''
+        lines.append(f'{name}_sum{selector} {histogram.sum}')
+        lines.append(f'{name}_count{selector} {histogram.count}')
+        return lines
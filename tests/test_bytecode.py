@@ -0,0 +1,105 @@
+import math
+import random
+
+from typing import Optional
+
+import pytest
+
+from src.services.budget import BudgetGuard, EvaluationBudget
+from src.services.bytecode import BINARY_OPCODES, OPERATIONS, UNARY_OPCODES, Program, compile_postfix, guarded_operations, run
+from src.services.engine import evaluate_text, infix_to_postfix
+from src.services.operations import BudgetExceededError, Number, parse_number
+from src.services.tokens import SCIENTIFIC_FUNCTIONS, tokenize
+
+# Budgets the optimized and unoptimized programs are compared under, None runs without a guard
+BUDGETS: list[Optional[EvaluationBudget]] = [
+    None,
+    EvaluationBudget(),
+    EvaluationBudget(max_result_bits=64, max_exact_bits=64),
+    EvaluationBudget(max_result_bits=256, max_exact_bits=16),
+]
+X_VALUES: list[float] = [0.0, 0.5, 3.0, 90.0, -7.25, 1e300]
+NUMBERS: list[str] = ['0', '1', '2', '3', '7', '10', '0,5', '2,25', 'π', '12345678901234567890123', '98765432109876543210987']
+FUNCTIONS: list[str] = sorted(function.value for function in SCIENTIFIC_FUNCTIONS)
+OPERATORS: list[str] = ['+', '-', '*', '/', '^']
+
+
+def expression(generator: random.Random, depth: int) -> str:
+    """Text of a random expression, mostly of constants so that folding has work to do."""
+    choice: float = generator.random()
+    if depth == 0 or choice < 0.3:
+        return generator.choice(NUMBERS + ['x'])
+    if choice < 0.45:
+        return f'{generator.choice(FUNCTIONS)}({expression(generator=generator, depth=depth - 1)})'
+    if choice < 0.5:
+        return f'(-{expression(generator=generator, depth=depth - 1)})'
+    left: str = expression(generator=generator, depth=depth - 1)
+    right: str = expression(generator=generator, depth=depth - 1)
+    return f'({left}{generator.choice(OPERATORS)}{right})'
+
+
+def outcome(program: Program, x: float, budget: Optional[EvaluationBudget]) -> tuple[type, Number] | str:
+    try:
+        value: Number = run(program=program, variables={'x': x}, guard=BudgetGuard(budget=budget) if budget is not None else None)
+    except Exception as e:
+        return type(e).__name__
+    # nan is the only value not equal to itself
+    return type(value), 'nan' if type(value) is float and math.isnan(value) else value
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_optimized_programs_compute_what_unoptimized_ones_do(seed: int) -> None:
+    text: str = expression(generator=random.Random(seed), depth=5)
+    postfix: list[str] = infix_to_postfix(infix=tuple(tokenize(text=text)))
+    unoptimized: Program = compile_postfix(postfix=postfix, optimize=False)
+    for budget in BUDGETS:
+        optimized: Program = compile_postfix(postfix=postfix, guard=BudgetGuard(budget=budget) if budget is not None else None)
+        for x in X_VALUES:
+            assert outcome(program=optimized, x=x, budget=budget) == outcome(program=unoptimized, x=x, budget=budget), (text, budget, x)
+
+
+def test_folding_respects_the_result_size_budget() -> None:
+    with pytest.raises(BudgetExceededError):
+        evaluate_text(text='2^100', guard=BudgetGuard(budget=EvaluationBudget(max_result_bits=64)))
+    assert evaluate_text(text='2^100') == 2 ** 100
+
+
+def test_folding_respects_the_exact_size_budget() -> None:
+    text: str = '12345678901234567890123*98765432109876543210987'
+    budget: EvaluationBudget = EvaluationBudget(max_exact_bits=64)
+    program: Program = compile_postfix(postfix=infix_to_postfix(infix=tuple(tokenize(text=text))), guard=BudgetGuard(budget=budget))
+    assert type(run(program=program, guard=BudgetGuard(budget=budget))) is float
+    assert evaluate_text(text=text) == 12345678901234567890123 * 98765432109876543210987
+
+
+def reference(postfix: list[str], budget: Optional[EvaluationBudget]) -> tuple[type, Number] | str:
+    """Outcome of `postfix` evaluated with the operations alone, as `run` did before it computed small exact values inline."""
+    operations: list = guarded_operations(guard=BudgetGuard(budget=budget)) if budget is not None else OPERATIONS
+    stack: list[Number] = []
+    try:
+        for token in postfix:
+            if token in BINARY_OPCODES:
+                right: Number = stack.pop()
+                stack[-1] = operations[BINARY_OPCODES[token]](stack[-1], right)
+            elif token in UNARY_OPCODES:
+                stack[-1] = operations[UNARY_OPCODES[token]](stack[-1])
+            else:
+                stack.append(parse_number(value=token))
+    except Exception as e:
+        return type(e).__name__
+    return type(stack[0]), stack[0]
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_small_exact_values_are_computed_like_the_operations_do(seed: int) -> None:
+    generator: random.Random = random.Random(seed)
+    # Long chains of small integers and quotients, which the running values outgrow now and then
+    terms: list[str] = [
+        f'{generator.randint(-50, 10 ** generator.randint(1, 12))}{generator.choice(OPERATORS[:4])}{generator.randint(0, 9)}'
+        for _ in range(40)
+    ]
+    text: str = ''.join(f'({term}){generator.choice(OPERATORS[:4])}' for term in terms) + '7'
+    postfix: list[str] = infix_to_postfix(infix=tuple(tokenize(text=text)))
+    program: Program = compile_postfix(postfix=postfix, optimize=False)
+    for budget in BUDGETS:
+        assert outcome(program=program, x=0.0, budget=budget) == reference(postfix=postfix, budget=budget), (text, budget)
@@ -0,0 +1,105 @@
+import os
+
+from pathlib import Path
+
+import pytest
+
+from src.services.calculation_log import MAGIC, RECORD_HEADER, CalculationLog, Record
+
+
+def fill(path: Path, expressions: list[str]) -> None:
+    with CalculationLog(path=str(path)) as log:
+        for i, expression in enumerate(expressions):
+            log.append(expression=expression, result=i, scientific_mode=bool(i % 2), timestamp=float(i))
+
+
+def test_records_are_read_back_after_reopening(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['1+2', '2,5*π', 'sin(30)'])
+    with CalculationLog(path=str(path)) as log:
+        assert len(log) == 3
+        assert log.record(index=1) == Record(expression='2,5*π', result=1, timestamp=1.0, scientific_mode=True)
+        assert [record.expression for record in log.recent(count=2)] == ['sin(30)', '2,5*π']
+        log.append(expression='4/2', result=2.5, scientific_mode=False, timestamp=9.0)
+        assert log.record(index=-1).result == 2.5
+
+
+def test_a_torn_last_record_is_dropped(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['1+2', '3*4'])
+    size: int = os.path.getsize(path)
+    with open(path, 'r+b') as file:
+        file.truncate(size - 2)
+    with CalculationLog(path=str(path)) as log:
+        assert [record.expression for record in log.recent(count=10)] == ['1+2']
+        log.append(expression='5-6', result=-1, scientific_mode=False)
+    with CalculationLog(path=str(path)) as log:
+        assert [record.expression for record in log.recent(count=10)] == ['5-6', '1+2']
+
+
+def test_corruption_before_the_last_record_raises_and_keeps_the_file(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['1+2', '3*4', '5-6'])
+    data: bytearray = bytearray(path.read_bytes())
+    # The length of the first expression, so the records after it no longer line up
+    data[len(MAGIC) + 4] += 1
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        CalculationLog(path=str(path))
+    assert path.read_bytes() == bytes(data)
+
+
+def test_checksums_are_checked(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['1+2', '3*4'])
+    data: bytearray = bytearray(path.read_bytes())
+    # The first character of the first expression
+    data[len(MAGIC) + RECORD_HEADER.size] = ord('7')
+    path.write_bytes(bytes(data))
+    with CalculationLog(path=str(path)) as log:
+        assert log.record(index=1).expression == '3*4'
+        with pytest.raises(ValueError):
+            log.record(index=0)
+    # The last record is checked on opening, it could be torn
+    data[-1] = ord('9')
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        CalculationLog(path=str(path))
+
+
+def test_other_files_are_refused(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    path.write_bytes(b'not a log at all')
+    with pytest.raises(ValueError):
+        CalculationLog(path=str(path))
+
+
+def test_records_appended_by_another_log_are_picked_up_on_append(tmp_path: Path) -> None:
+    path: str = str(tmp_path / 'history')
+    with CalculationLog(path=path) as first, CalculationLog(path=path) as second:
+        first.append(expression='1+1', result=2, scientific_mode=False)
+        first.append(expression='2+2', result=4, scientific_mode=False)
+        second.append(expression='3+3', result=6, scientific_mode=False)
+        assert [record.expression for record in second.recent(count=10)] == ['3+3', '2+2', '1+1']
+        assert second.search(query='2+2') == [second.record(index=1)]
+
+
+def test_search_finds_substrings_and_prefixes_newest_first(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['12*sin(45)', 'sin(45)+1', '2+2', '3*sin(45)', 'si'])
+    with CalculationLog(path=str(path)) as log:
+        assert [record.expression for record in log.search(query='sin(45)')] == ['3*sin(45)', 'sin(45)+1', '12*sin(45)']
+        assert [record.expression for record in log.search(query='sin(45)', prefix=True)] == ['sin(45)+1']
+        assert [record.expression for record in log.search(query='si', limit=2)] == ['si', '3*sin(45)']
+        assert log.search(query='cos') == []
+        # Appends after the index was built are indexed too
+        log.append(expression='1+sin(45)', result=0, scientific_mode=False)
+        assert log.search(query='sin(45)', limit=1)[0].expression == '1+sin(45)'
+
+
+def test_frequent_expressions_count_the_recent_window(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'history'
+    fill(path=path, expressions=['1+1'] * 5 + ['2+2'] * 3 + ['3+3'] * 4)
+    with CalculationLog(path=str(path)) as log:
+        assert log.frequent_expressions(count=2) == ['1+1', '3+3']
+        assert log.frequent_expressions(count=2, window=7) == ['3+3', '2+2']
@@ -0,0 +1,131 @@
+import io
+import math
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pytest
+
+from src.services.bytecode import Program
+from src.services.columnar import (
+    ERROR,
+    Chunk,
+    compile_columns_expression,
+    evaluate_chunks,
+    read_binary_chunks,
+    read_csv_chunks,
+    read_csv_header,
+    write_binary,
+    write_text,
+)
+
+CSV: str = '''"price",qty,"tax",note
+2.5,4,0.2,"a, b"
+10,0,"0.5",c
+
+1e3,2,0,"d"
+-4,3,0.25,e
+8,1,1,"f, g, h"
+'''
+PRICE: list[float] = [2.5, 10.0, 1e3, -4.0, 8.0]
+QTY: list[float] = [4.0, 0.0, 2.0, 3.0, 1.0]
+TAX: list[float] = [0.2, 0.5, 0.0, 0.25, 1.0]
+
+
+def csv_results(text: str, chunk_rows: int) -> list[str]:
+    file: io.StringIO = io.StringIO(CSV)
+    header: list[str] = read_csv_header(file=file)
+    program: Program = compile_columns_expression(text=text, columns=header)
+    chunks: list[Chunk] = list(read_csv_chunks(file=file, header=header, columns=program.variables, chunk_rows=chunk_rows))
+    assert sum(chunk.rows for chunk in chunks) == len(PRICE)
+    output: io.StringIO = io.StringIO()
+    assert write_text(results=evaluate_chunks(program=program, chunks=chunks), output=output) == len(PRICE)
+    return output.getvalue().splitlines()
+
+
+def test_csv_header_names_are_unquoted() -> None:
+    assert read_csv_header(file=io.StringIO(CSV)) == ['price', 'qty', 'tax', 'note']
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 4, 100])
+def test_csv_columns_are_read_across_chunks(chunk_rows: int) -> None:
+    file: io.StringIO = io.StringIO(CSV)
+    header: list[str] = read_csv_header(file=file)
+    chunks: list[Chunk] = list(read_csv_chunks(file=file, header=header, columns=['tax', 'price'], chunk_rows=chunk_rows))
+    assert np.concatenate([chunk.columns['price'] for chunk in chunks]).tolist() == PRICE
+    assert np.concatenate([chunk.columns['tax'] for chunk in chunks]).tolist() == TAX
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 3, 100])
+def test_csv_results_are_written_one_per_line(chunk_rows: int) -> None:
+    expected: list[str] = [repr(p * q * (1 + t)) for p, q, t in zip(PRICE, QTY, TAX)]
+    assert csv_results(text='price*qty*(1+tax)', chunk_rows=chunk_rows) == expected
+    assert csv_results(text='price/qty', chunk_rows=chunk_rows) == [repr(2.5 / 4), ERROR, repr(1e3 / 2), repr(-4 / 3), repr(8.0)]
+
+
+@pytest.mark.parametrize('chunk_rows', [2, 100])
+def test_an_expression_of_no_column_has_a_result_per_row(chunk_rows: int) -> None:
+    assert csv_results(text='1+2', chunk_rows=chunk_rows) == ['3.0'] * len(PRICE)
+
+
+def test_empty_lines_are_not_rows() -> None:
+    file: io.StringIO = io.StringIO('a\n\n\n1\n\n')
+    header: list[str] = read_csv_header(file=file)
+    program: Program = compile_columns_expression(text='a*2', columns=header)
+    output: io.StringIO = io.StringIO()
+    chunks: Iterator[Chunk] = read_csv_chunks(file=file, header=header, columns=program.variables, chunk_rows=2)
+    assert write_text(results=evaluate_chunks(program=program, chunks=chunks), output=output) == 1
+    assert output.getvalue() == '2.0\n'
+
+
+def test_a_value_that_is_not_a_number_is_rejected() -> None:
+    file: io.StringIO = io.StringIO('a,b\n1,2\nx,3\n')
+    header: list[str] = read_csv_header(file=file)
+    with pytest.raises(ValueError):
+        list(read_csv_chunks(file=file, header=header, columns=['a']))
+
+
+def test_an_unknown_column_is_rejected() -> None:
+    with pytest.raises(ValueError, match='No column named x'):
+        compile_columns_expression(text='price*x', columns=['price', 'qty'])
+    with pytest.raises(ValueError):
+        compile_columns_expression(text='price*discount', columns=['price', 'qty'])
+
+
+def write_columns(directory: Path, columns: dict[str, list[float]]) -> dict[str, str]:
+    paths: dict[str, str] = {}
+    for column, values in columns.items():
+        paths[column] = str(directory / f'{column}.f64')
+        np.asarray(values, dtype='<f8').tofile(paths[column])
+    return paths
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 5, 100])
+def test_binary_columns_are_evaluated_across_chunks(tmp_path: Path, chunk_rows: int) -> None:
+    paths: dict[str, str] = write_columns(directory=tmp_path, columns={'price': PRICE, 'qty': QTY})
+    program: Program = compile_columns_expression(text='price/qty', columns=paths)
+    chunks: Iterator[Chunk] = read_binary_chunks(paths={column: paths[column] for column in program.variables}, chunk_rows=chunk_rows)
+    output: io.BytesIO = io.BytesIO()
+    assert write_binary(results=evaluate_chunks(program=program, chunks=chunks), output=output) == len(PRICE)
+    values: list[float] = np.frombuffer(output.getvalue(), dtype='<f8').tolist()
+    assert math.isnan(values[1])
+    assert values[:1] + values[2:] == [2.5 / 4, 1e3 / 2, -4 / 3, 8.0]
+
+
+def test_empty_binary_columns_have_no_rows(tmp_path: Path) -> None:
+    paths: dict[str, str] = write_columns(directory=tmp_path, columns={'x': []})
+    assert list(read_binary_chunks(paths=paths)) == []
+
+
+def test_binary_columns_of_different_lengths_are_rejected(tmp_path: Path) -> None:
+    paths: dict[str, str] = write_columns(directory=tmp_path, columns={'price': PRICE, 'qty': QTY[:-1]})
+    with pytest.raises(ValueError, match='same number of rows'):
+        list(read_binary_chunks(paths=paths))
+
+
+def test_a_file_that_is_not_a_float64_column_is_rejected(tmp_path: Path) -> None:
+    path: Path = tmp_path / 'x.f64'
+    path.write_bytes(bytes(12))
+    with pytest.raises(ValueError, match='not a float64 column'):
+        list(read_binary_chunks(paths={'x': str(path)}))
@@ -0,0 +1,56 @@
+import pytest
+
+from src.services.calculator_service import CalculatorService
+from src.services.engine import Edit, edit_for_text
+
+
+@pytest.mark.parametrize(
+    'text, tokens, inserted',
+    [
+        ('1 + 2', [], ['1', '+', '2']),
+        ('1.5', [], ['1', ',', '5']),
+        ('.5', ['2', '+'], ['0', ',', '5']),
+        (',5', ['2', '*', 'π'], ['*', '0', ',', '5']),
+        ('π', ['2'], ['*', 'π']),
+        ('(2)3', [], ['(', '2', ')', '*', '3']),
+        ('sin(2)', ['3'], ['*', 'sin', '(', '2', ')']),
+        ('(-2)', [], ['(', '-', '2', ')']),
+        ('2)', ['(', '1', '+'], ['2', ')']),
+        ('+1', ['2'], ['+', '1']),
+        ('x^2', [], ['x', '^', '2']),
+        ('(2)', ['3', ','], ['*', '(', '2', ')']),
+        ('π', ['0', ','], ['*', 'π']),
+    ],
+)
+def test_pasted_text_is_appended_as_if_typed(text: str, tokens: list[str], inserted: list[str]) -> None:
+    assert edit_for_text(text=text, tokens=tokens) == Edit(start=len(tokens), stop=len(tokens), tokens=inserted)
+
+
+@pytest.mark.parametrize(
+    'text, tokens',
+    [
+        (')', []),
+        ('(2+)', []),
+        ('2++3', []),
+        ('-2', []),
+        ('*2', ['(']),
+        ('+7', ['(', '-']),
+        ('+2', ['1', '-']),
+        ('1,2,3', []),
+        (',5', ['1', ',', '2']),
+        ('sin 2', []),
+        ('abc', []),
+    ],
+)
+def test_text_that_is_not_in_calculator_syntax_is_rejected(text: str, tokens: list[str]) -> None:
+    with pytest.raises(ValueError):
+        edit_for_text(text=text, tokens=tokens)
+
+
+def test_rejected_text_leaves_the_expression_unchanged() -> None:
+    calculator: CalculatorService = CalculatorService()
+    calculator.insert_text(text='(1+2')
+    with pytest.raises(ValueError):
+        calculator.insert_text(text='*3))')
+    assert calculator.get_expression() == '(1+2'
+    assert calculator.number_of_open_parenthesis == 1
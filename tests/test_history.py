@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from src.services.calculator_service import CalculatorService, Token
+from src.services.engine import Edit
+from src.services.expression_buffer import ExpressionBuffer
+from src.services.history import EditHistory, Version
+
+
+def version_of(tokens: list[str]) -> Version:
+    return Version().splice(start=0, stop=0, tokens=tokens)
+
+
+def test_splice_and_tail_match_a_list() -> None:
+    version: Version = version_of(tokens=['1', '+', '2', '*', '3'])
+    spliced: Version = version.splice(start=2, stop=3, tokens=['4', '5'])
+    assert spliced.tail(start=0) == ['1', '+', '4', '5', '*', '3']
+    assert spliced.tail(start=4) == ['*', '3']
+    assert version.tail(start=0) == ['1', '+', '2', '*', '3']
+
+
+def test_versions_share_the_tokens_before_an_edit() -> None:
+    version: Version = version_of(tokens=['1', '+', '2'])
+    appended: Version = version.splice(start=3, stop=3, tokens=['*'])
+    assert appended.tokens[1] is version.tokens
+    replaced: Version = version.splice(start=2, stop=3, tokens=['7'])
+    assert replaced.tokens[1] is version.tokens[1]
+    cleared: Version = version.splice(start=0, stop=3, tokens=[])
+    assert cleared == Version()
+
+
+def test_only_the_last_max_steps_edits_can_be_undone() -> None:
+    history: EditHistory = EditHistory(max_steps=3)
+    for i in range(5):
+        history.record(edit=Edit(start=i, stop=i, tokens=[str(i)]))
+    steps: int = 0
+    while history.undo() is not None:
+        steps += 1
+    assert steps == 3
+    assert history.version.tail(start=0) == ['0', '1']
+
+
+def test_a_new_edit_drops_the_redo_steps() -> None:
+    history: EditHistory = EditHistory()
+    history.record(edit=Edit(start=0, stop=0, tokens=['1']))
+    history.record(edit=Edit(start=1, stop=1, tokens=['+']))
+    assert history.undo() is not None
+    history.record(edit=Edit(start=1, stop=1, tokens=['*']))
+    assert history.redo() is None
+    assert history.version.tail(start=0) == ['1', '*']
+
+
+def test_undo_and_redo_restore_the_expression() -> None:
+    calculator: CalculatorService = CalculatorService()
+    for token in (Token.one, Token.two, Token.plus, Token.three):
+        calculator.send_token(token=token)
+    calculator.insert_text(text='*(4-5)')
+    assert calculator.get_expression() == '12+3*(4-5)'
+    assert calculator.undo()
+    assert calculator.get_expression() == '12+3'
+    assert calculator.undo()
+    assert calculator.get_expression() == '12+'
+    assert calculator.redo()
+    assert calculator.redo()
+    assert calculator.get_expression() == '12+3*(4-5)'
+    assert not calculator.redo()
+    calculator.backspace_expression()
+    assert calculator.undo()
+    assert calculator.get_expression() == '12+3*(4-5)'
+
+
+def test_an_operator_replaced_with_itself_is_not_an_undo_step() -> None:
+    calculator: CalculatorService = CalculatorService()
+    for token in (Token.one, Token.plus, Token.plus):
+        calculator.send_token(token=token)
+    assert calculator.undo()
+    assert calculator.get_expression() == '1'
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_undo_and_redo_match_the_states_they_go_back_to(seed: int) -> None:
+    rng: random.Random = random.Random(seed)
+    tokens: list[Token] = [Token.one, Token.two, Token.plus, Token.multiply, Token.negate, Token.parenthesis, Token.decimal, Token.sin]
+    calculator: CalculatorService = CalculatorService()
+    states: list[list[str]] = [[]]
+    position: int = 0
+    for _ in range(60):
+        choice: float = rng.random()
+        if choice < 0.2:
+            if calculator.undo():
+                position -= 1
+            else:
+                assert position == 0
+        elif choice < 0.35:
+            if calculator.redo():
+                position += 1
+            else:
+                assert position == len(states) - 1
+        else:
+            before: list[str] = list(calculator.expression)
+            if choice < 0.45:
+                calculator.backspace_expression()
+            else:
+                calculator.send_token(token=rng.choice(tokens))
+            if list(calculator.expression) != before:
+                del states[position + 1:]
+                states.append(list(calculator.expression))
+                position += 1
+        assert list(calculator.expression) == states[position]
+        # The restored buffer keeps the same derived state as one built from its tokens
+        rebuilt: ExpressionBuffer = ExpressionBuffer()
+        rebuilt.extend(tokens=states[position])
+        assert calculator.expression.text == rebuilt.text
+        assert calculator.number_of_open_parenthesis == rebuilt.depth
+        assert calculator.expression.number_start == rebuilt.number_start
+        assert calculator.expression.number_has_decimal == rebuilt.number_has_decimal
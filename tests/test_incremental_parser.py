@@ -0,0 +1,58 @@
+import math
+import random
+
+from typing import Optional
+
+import pytest
+
+from src.services.bytecode import compile_postfix, run
+from src.services.calculator_service import CalculatorService
+from src.services.engine import infix_to_postfix
+from src.services.incremental_parser import IncrementalParser
+from src.services.operations import Number, normalize_number
+from src.services.tokens import DIGIT_TOKENS, Token
+
+# Backspace is not a token, it is represented by None
+BACKSPACE: None = None
+# Digits are typed more often than anything else, as in real expressions
+KEYS: list[Optional[Token]] = [*Token, *DIGIT_TOKENS, *DIGIT_TOKENS, BACKSPACE, BACKSPACE]
+
+
+def outcome(value: Number) -> int | float | str:
+    value = normalize_number(value=value)
+    # nan is the only value not equal to itself
+    return 'nan' if type(value) is float and math.isnan(value) else value
+
+
+def parsed(tokens: tuple[str, ...]) -> int | float | str | Exception:
+    """Outcome of the full parse of `tokens`, the error when it fails."""
+    try:
+        return outcome(value=run(program=compile_postfix(postfix=infix_to_postfix(infix=tokens), optimize=False)))
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_incremental_parser_evaluates_like_a_full_parse(seed: int) -> None:
+    generator: random.Random = random.Random(seed)
+    calculator: CalculatorService = CalculatorService()
+    for _ in range(200):
+        key: Optional[Token] = generator.choice(KEYS)
+        if key is BACKSPACE:
+            calculator.backspace_expression()
+        else:
+            calculator.send_token(token=key)
+        tokens: tuple[str, ...] = tuple(calculator.expression.tokens)
+        if not tokens:
+            continue
+
+        expected: int | float | str | Exception = parsed(tokens=tokens)
+        try:
+            actual: int | float | str | Exception = outcome(value=IncrementalParser.evaluate(state=calculator.expression.parser.state))
+        except Exception as e:
+            actual = e
+        if isinstance(expected, Exception) or isinstance(actual, Exception):
+            # Only whether it fails, the incremental parser evaluates as it goes and stops at an earlier error than a full parse can
+            assert isinstance(actual, Exception) and isinstance(expected, Exception), (''.join(tokens), actual, expected)
+        else:
+            assert actual == expected, ''.join(tokens)
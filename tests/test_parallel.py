@@ -0,0 +1,72 @@
+import random
+import time
+
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import pytest
+
+from src.services import parallel
+from src.services.budget import EvaluationBudget
+from src.services.engine import evaluate, infix_to_postfix
+from src.services.operations import BudgetExceededError
+from src.services.tokens import SCIENTIFIC_FUNCTIONS, tokenize
+
+NUMBERS: list[str] = ['0', '1', '2', '3', '7', '0,5', '2,25', 'π', 'x']
+FUNCTIONS: list[str] = sorted(function.value for function in SCIENTIFIC_FUNCTIONS)
+OPERATORS: list[str] = ['+', '-', '*', '/', '^']
+
+
+def expression(generator: random.Random, depth: int) -> str:
+    choice: float = generator.random()
+    if depth == 0 or choice < 0.2:
+        return generator.choice(NUMBERS)
+    if choice < 0.3:
+        return f'{generator.choice(FUNCTIONS)}({expression(generator=generator, depth=depth - 1)})'
+    left: str = expression(generator=generator, depth=depth - 1)
+    right: str = expression(generator=generator, depth=depth - 1)
+    return f'({left}{generator.choice(OPERATORS)}{right})'
+
+
+def outcome(function: Callable[[], Any]) -> Any:
+    try:
+        return function()
+    except Exception as e:
+        return type(e).__name__
+
+
+class PendingExecutor(Executor):
+    """Accepts work and never runs it, as a pool whose workers are all busy."""
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return Future()
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_split_spans_cover_whole_subexpressions(seed: int) -> None:
+    postfix: list[str] = infix_to_postfix(infix=tuple(tokenize(text=expression(generator=random.Random(seed), depth=7))))
+    starts: list[int] = parallel.subexpression_starts(postfix=postfix)
+    spans: list[tuple[int, int]] = parallel.split(postfix=postfix, max_span=8)
+    assert all(stop - start <= 8 or stop - start == 1 for start, stop in spans)
+    assert all(starts[stop - 1] == start for start, stop in spans)
+    assert all(stop <= start for (_, stop), (start, _) in zip(spans, spans[1:]))
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_parallel_evaluation_computes_what_serial_evaluation_does(seed: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parallel, 'PARALLEL_MIN_TOKENS', 0)
+    tokens: tuple[str, ...] = tuple(tokenize(text=expression(generator=random.Random(seed), depth=7)))
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        for x in [0.0, 2.5, -3.0]:
+            serial: Any = outcome(function=lambda: evaluate(tokens=tokens, variables={'x': x}))
+            spread: Any = outcome(function=lambda: parallel.evaluate_parallel(tokens=tokens, executor=executor, workers=3, variables={'x': x}))
+            assert spread == serial or spread != spread and serial != serial, (tokens, x)
+
+
+def test_parallel_evaluation_gives_up_at_the_deadline(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parallel, 'PARALLEL_MIN_TOKENS', 0)
+    tokens: tuple[str, ...] = tuple(tokenize(text='+'.join(['(1+2*3)'] * 100)))
+    started: float = time.monotonic()
+    with pytest.raises(BudgetExceededError):
+        parallel.evaluate_parallel(tokens=tokens, executor=PendingExecutor(), workers=4, budget=EvaluationBudget(max_seconds=0.2))
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,32 @@
+import math
+
+from src.services.budget import EvaluationBudget
+from src.services.engine import compile_expression
+from src.services.plotting import Sampler, View
+from src.services.tokens import tokenize
+
+
+def sampler(text: str, budget: EvaluationBudget = EvaluationBudget()) -> Sampler:
+    return Sampler(program=compile_expression(tokens=tuple(tokenize(text=text))), budget=budget)
+
+
+def test_samples_are_undefined_where_the_expression_is() -> None:
+    assert sampler(text='x^2').value(x=3.0) == 9.0
+    assert math.isnan(sampler(text='ln(x)').value(x=-1.0))
+
+
+def test_samples_past_the_budget_are_undefined() -> None:
+    # Long enough for the guard to be checked while it runs
+    text: str = '+'.join(['x*x'] * 5000)
+    assert sampler(text=text).value(x=2.0) == 20000.0
+    assert math.isnan(sampler(text=text, budget=EvaluationBudget(max_seconds=0.0)).value(x=2.0))
+
+
+def test_sampling_covers_the_view() -> None:
+    plot: Sampler = sampler(text='x^2')
+    view: View = View(x_min=-4.0, x_max=4.0, y_min=-1.0, y_max=16.0, width=400, height=300)
+    for _ in plot.sample(view=view):
+        pass
+    assert plot.xs[0] < view.x_min and plot.xs[-1] > view.x_max
+    assert plot.xs == sorted(plot.xs) and all(y == x * x for x, y in zip(plot.xs, plot.ys))
+    assert plot.polylines(view=view)
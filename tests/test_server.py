@@ -0,0 +1,104 @@
+import asyncio
+import json
+import socket
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+import pytest
+
+from src.services import server
+from src.services.server import CalculatorServer
+
+# Long enough to be evaluated by the executor rather than on the event loop
+LONG_EXPRESSION: str = '+'.join(['1'] * 200)
+
+
+class GatedExecutor(ThreadPoolExecutor):
+    """Runs its work once `gate` is set, counting what was submitted."""
+
+    def __init__(self) -> None:
+        super().__init__(max_workers=4)
+        self.gate: threading.Event = threading.Event()
+        self.submitted: int = 0
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        self.submitted += 1
+
+        def gated() -> Any:
+            self.gate.wait()
+            return fn(*args, **kwargs)
+
+        return super().submit(gated)
+
+
+async def exchange(calculator: CalculatorServer, requests: list[Any]) -> list[dict[str, Any]]:
+    """Send `requests` in one write over a socket pair, as lines, and read a response per line."""
+    server_socket, client_socket = socket.socketpair()
+    server_reader, server_writer = await asyncio.open_connection(sock=server_socket, limit=server.MAX_LINE_BYTES)
+    handler: asyncio.Task[None] = asyncio.create_task(calculator.handle_connection(reader=server_reader, writer=server_writer))
+    reader, writer = await asyncio.open_connection(sock=client_socket)
+    writer.write(b''.join((request if isinstance(request, bytes) else json.dumps(request).encode()) + b'\n' for request in requests))
+    await writer.drain()
+    responses: list[dict[str, Any]] = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    await handler
+    return responses
+
+
+def run(requests: list[Any]) -> list[dict[str, Any]]:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return asyncio.run(exchange(calculator=CalculatorServer(executor=executor), requests=requests))
+
+
+def test_pipelined_requests_are_answered_in_order() -> None:
+    responses: list[dict[str, Any]] = run(requests=[
+        {'id': 1, 'op': 'evaluate', 'expression': LONG_EXPRESSION},
+        {'id': 2, 'op': 'evaluate', 'expression': '2,5*2'},
+        {'id': 3, 'op': 'send_token', 'session': 's', 'token': '7'},
+        {'id': 4, 'op': 'send_token', 'session': 's', 'token': '+'},
+        {'id': 5, 'op': 'send_token', 'session': 's', 'token': '3'},
+        {'id': 6, 'op': 'evaluate_expression', 'session': 's'},
+        {'id': 7, 'op': 'backspace_expression', 'session': 's'},
+    ])
+    assert [response['id'] for response in responses] == [1, 2, 3, 4, 5, 6, 7]
+    assert responses[0]['result'] == 200 and responses[1]['result'] == 5
+    assert responses[4]['expression'] == '7+3' and responses[5]['result'] == 10 and responses[6]['expression'] == '7+'
+
+
+def test_bad_requests_get_error_replies() -> None:
+    responses: list[dict[str, Any]] = run(requests=[
+        b'{not json',
+        [1, 2],
+        {'id': 'a', 'op': 'unknown', 'session': 's'},
+        {'id': 'b', 'op': 'send_token'},
+        {'id': 'c', 'op': 'evaluate'},
+        {'id': 'd', 'op': 'evaluate', 'expression': '1/0'},
+        {'id': 'e', 'op': 'evaluate', 'expression': '2$'},
+        {'id': 'f', 'op': 'evaluate', 'expression': '1+1'},
+    ])
+    assert all('error' in response for response in responses[:-1]), responses
+    assert [response['id'] for response in responses[2:]] == ['a', 'b', 'c', 'd', 'e', 'f']
+    assert responses[5]['error'].startswith('ZeroDivisionError') and responses[-1]['result'] == 2
+
+
+def test_reading_stops_once_the_pipeline_is_full(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(server, 'MAX_PIPELINED_REQUESTS', 2)
+    executor: GatedExecutor = GatedExecutor()
+
+    async def scenario() -> list[dict[str, Any]]:
+        exchanging: asyncio.Task[list[dict[str, Any]]] = asyncio.create_task(exchange(
+            calculator=CalculatorServer(executor=executor),
+            requests=[{'id': i, 'op': 'evaluate', 'expression': LONG_EXPRESSION} for i in range(8)],
+        ))
+        await asyncio.sleep(0.2)
+        # The one being awaited, those queued, and the one waiting for room in the queue
+        assert executor.submitted == 4
+        executor.gate.set()
+        return await exchanging
+
+    with executor:
+        responses: list[dict[str, Any]] = asyncio.run(scenario())
+    assert [response['result'] for response in responses] == [200] * 8
+    assert executor.submitted == 8
@@ -0,0 +1,83 @@
+import io
+
+from typing import Callable, Iterator
+
+import pytest
+
+from src.services.calculator_service import CalculatorService
+from src.services.tokens import Token
+from src.services.trace import KEY_CODES, MAGIC, PASTE_KEY, ReplayReport, TraceEvent, TraceRecorder, calculation_outcome, read_trace, replay
+
+
+def clock(step: float) -> Callable[[], float]:
+    ticks: Iterator[int] = iter(range(1_000_000))
+    return lambda: next(ticks) * step
+
+
+def record(keys: list[str], calculator: CalculatorService) -> io.BytesIO:
+    """Record a session pressing `keys` on `calculator`, text that is not a key is pasted."""
+    file: io.BytesIO = io.BytesIO()
+    recorder: TraceRecorder = TraceRecorder(file=file, clock=clock(step=0.25))
+    for key in keys:
+        if key == '=':
+            recorder.record_key(key=key)
+            recorder.record_result(outcome=calculation_outcome(calculator=calculator))
+        elif key == '↶':
+            recorder.record_key(key=key)
+            calculator.undo()
+        elif key in KEY_CODES:
+            recorder.record_key(key=key)
+            calculator.send_token(token=Token(key))
+        else:
+            recorder.record_paste(text=key)
+            try:
+                calculator.insert_text(text=key)
+            except ValueError:
+                pass
+    file.seek(0)
+    return file
+
+
+SESSION: list[str] = ['1', '2', '+', '3*(4-1)', '=', '*', '2', '=', '/', '0', '=', '↶', '2++', '5', '=']
+
+
+def test_a_recorded_session_replays_to_the_same_expression_and_results() -> None:
+    recorded: CalculatorService = CalculatorService()
+    events: list[TraceEvent] = read_trace(file=record(keys=SESSION, calculator=recorded))
+
+    assert [event.key for event in events] == [key if key in KEY_CODES else PASTE_KEY for key in SESSION]
+    assert [event.text for event in events if event.key == PASTE_KEY] == ['3*(4-1)', '2++']
+    assert [event.result for event in events if event.key == '='] == ['21', '30', '!ZeroDivisionError', '15.6']
+    assert events[-1].seconds == pytest.approx(0.25 * len(SESSION))
+
+    calculator: CalculatorService = CalculatorService()
+    report: ReplayReport = replay(events=events, calculator=calculator)
+    assert calculator.get_expression() == recorded.get_expression() == '12+3*(4-1)*2/5'
+    assert report.checked_results == 4
+    assert report.mismatches == []
+    assert len(report.latencies['insert_text']) == 2
+    assert len(report.latencies['evalutate_expression']) == 4
+
+
+def test_a_different_result_is_reported() -> None:
+    events: list[TraceEvent] = read_trace(file=record(keys=['1', '+', '2', '='], calculator=CalculatorService()))
+    events[-1] = events[-1]._replace(result='4')
+    report: ReplayReport = replay(events=events)
+    assert report.checked_results == 1
+    assert [(mismatch.expression, mismatch.recorded, mismatch.replayed) for mismatch in report.mismatches] == [('1+2', '4', '3')]
+
+
+def test_a_result_recorded_after_later_keys_belongs_to_the_last_calculation() -> None:
+    file: io.BytesIO = io.BytesIO()
+    recorder: TraceRecorder = TraceRecorder(file=file, clock=clock(step=0.001))
+    for key in ('7', '=', '+'):
+        recorder.record_key(key=key)
+    recorder.record_result(outcome=7)
+    file.seek(0)
+    assert [(event.key, event.result) for event in read_trace(file=file)] == [('7', None), ('=', '7'), ('+', None)]
+
+
+def test_a_file_without_the_magic_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        read_trace(file=io.BytesIO(b'not a trace'))
+    assert read_trace(file=io.BytesIO(MAGIC)) == []
@@ -0,0 +1,66 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from src.services.bytecode import Program, run
+from src.services.engine import compile_expression
+from src.services.tokens import SCIENTIFIC_FUNCTIONS, tokenize
+from src.services.vectorized import BatchResult, run_vectorized
+
+X_VALUES: np.ndarray = np.array([0.0, 0.5, -1.0, 3.0, 90.0, -7.25, 700.0, 1e300, -1e300, math.inf, math.nan])
+NUMBERS: list[str] = ['0', '1', '2', '3', '0,5', '2,25', 'π', '1000', '10^300']
+FUNCTIONS: list[str] = sorted(function.value for function in SCIENTIFIC_FUNCTIONS)
+OPERATORS: list[str] = ['+', '-', '*', '/', '^']
+
+
+def expression(generator: random.Random, depth: int) -> str:
+    """Text of a random expression of x, with values past the range of floats and out of the domain of functions."""
+    choice: float = generator.random()
+    if depth == 0 or choice < 0.3:
+        return generator.choice(NUMBERS + ['x', 'x'])
+    if choice < 0.45:
+        return f'{generator.choice(FUNCTIONS)}({expression(generator=generator, depth=depth - 1)})'
+    if choice < 0.5:
+        return f'(-{expression(generator=generator, depth=depth - 1)})'
+    left: str = expression(generator=generator, depth=depth - 1)
+    right: str = expression(generator=generator, depth=depth - 1)
+    return f'({left}{generator.choice(OPERATORS)}{right})'
+
+
+def program(text: str) -> Program:
+    return compile_expression(tokens=tuple(tokenize(text=text)))
+
+
+def scalar(program: Program, x: float) -> float | None:
+    """The value `run` computes as a float, None when it raises."""
+    try:
+        return float(run(program=program, variables={'x': x}))
+    except (ArithmeticError, ValueError):
+        return None
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_vectorized_programs_fail_and_compute_where_scalar_ones_do(seed: int) -> None:
+    text: str = expression(generator=random.Random(seed), depth=4)
+    compiled: Program = program(text=text)
+    result: BatchResult = run_vectorized(program=compiled, variables={'x': X_VALUES})
+    for x, value, error in zip(X_VALUES.tolist(), result.values.tolist(), result.errors.tolist()):
+        expected: float | None = scalar(program=compiled, x=x)
+        assert error == (expected is None), (text, x, expected, value)
+        if expected is not None:
+            assert value == pytest.approx(expected, rel=1e-9, nan_ok=True) or math.isnan(value) and math.isnan(expected), (text, x)
+
+
+def test_constants_too_large_for_floats_flag_every_element() -> None:
+    result: BatchResult = run_vectorized(program=program(text='x+9^400'), variables={'x': np.array([1.0, 2.0])})
+    assert result.errors.tolist() == [True, True]
+    assert scalar(program=program(text='x+9^400'), x=1.0) is None
+
+
+def test_float_overflow_is_not_an_error_as_in_run() -> None:
+    compiled: Program = program(text='x*10^300*10^300')
+    result: BatchResult = run_vectorized(program=compiled, variables={'x': np.array([1.0, -1.0])})
+    assert result.errors.tolist() == [False, False]
+    assert result.values.tolist() == [math.inf, -math.inf] == [scalar(program=compiled, x=1.0), scalar(program=compiled, x=-1.0)]